@@ -0,0 +1,100 @@
+"""
+视频列表序列化基准测试
+在临时数据库中生成视频数据，比较 ORM + to_dict() + jsonify 的旧路径
+与列元组 + orjson + 流式响应的快速路径的耗时和内存峰值
+
+用法: python benchmark_serialization.py [视频数量]
+"""
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from flask import jsonify
+
+from bilibrother_app.backend.api import create_app
+from bilibrother_app.backend.models import db, Video, Author
+from bilibrother_app.backend.serialization import (
+    iter_video_json, stream_json, orjson, brotli
+)
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def populate(count, author_count=2000):
+    """批量写入测试视频和UP主"""
+    now = datetime.now()
+    db.session.execute(Author.__table__.insert(), [
+        {'mid': str(mid), 'name': f'UP主{mid}', 'follower_count': random.randint(0, 10 ** 6),
+         'historical_likes': random.randint(0, 10 ** 7), 'archive_count': random.randint(1, 500), 'updated_at': now}
+        for mid in range(author_count)
+    ])
+    db.session.execute(Video.__table__.insert(), [
+        {'bvid': f'BV{index:010d}', 'title': f'测试视频标题 {index}', 'link': f'https://www.bilibili.com/video/BV{index:010d}',
+         'view_count': random.randint(0, 10 ** 7), 'danmaku_count': random.randint(0, 10 ** 4),
+         'coin_count': random.randint(0, 10 ** 5), 'like_count': random.randint(0, 10 ** 6),
+         'share_count': random.randint(0, 10 ** 4), 'favorite_count': random.randint(0, 10 ** 5),
+         'tname': random.choice(['知识', '游戏', '音乐', '生活']), 'cover_url': f'https://i0.hdslb.com/{index}.jpg',
+         'duration': random.randint(10, 3600), 'mid': str(random.randrange(author_count)),
+         'pubdate': now - timedelta(hours=random.randint(0, 10000)), 'last_updated': now, 'meta_updated': now}
+        for index in range(count)
+    ])
+    db.session.commit()
+
+
+def response_size(chunks):
+    """消费流式响应（模拟发送给客户端），返回响应体字节数"""
+    return sum(len(block) for block in stream_json(chunks).response)
+
+
+def measure(label, func):
+    """记录耗时、内存峰值和输出大小
+
+    tracemalloc 会显著拖慢执行，耗时和内存分两次运行测量
+    """
+    db.session.expunge_all()
+    started = time.perf_counter()
+    size = func()
+    elapsed = time.perf_counter() - started
+
+    db.session.expunge_all()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    logger.info(f"{label:<28} {elapsed * 1000:9.1f} ms  峰值内存 {peak / 2 ** 20:7.1f} MB  响应 {size / 2 ** 20:6.1f} MB")
+    return elapsed
+
+
+def run_benchmark(count):
+    """执行基准测试"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        app = create_app(os.path.join(temp_dir, 'benchmark.db'), start_background=False)
+        with app.app_context():
+            logger.info(f"写入 {count} 个测试视频...")
+            populate(count)
+            logger.info(f"orjson: {'已安装' if orjson else '未安装'}, brotli: {'已安装' if brotli else '未安装'}")
+
+            with app.test_request_context('/api/videos'):
+                legacy = measure('ORM + to_dict + jsonify', lambda: len(
+                    jsonify([video.to_dict() for video in Video.query.all()]).get_data()))
+                fast = measure('列元组 + 快速JSON', lambda: response_size(iter_video_json()))
+                measure('列式结构 layout=columns', lambda: response_size(iter_video_json(layout='columns')))
+
+            with app.test_request_context('/api/videos', headers={'Accept-Encoding': 'gzip'}):
+                measure('列元组 + 快速JSON + gzip', lambda: response_size(iter_video_json()))
+            if brotli:
+                with app.test_request_context('/api/videos', headers={'Accept-Encoding': 'br'}):
+                    measure('列元组 + 快速JSON + brotli', lambda: response_size(iter_video_json()))
+
+        logger.info(f"快速路径耗时为旧路径的 {fast / legacy:.0%}")
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,112 @@
+"""
+趋势排行基准测试
+在临时数据库中生成视频和计数采样，测量采样窗口的冷加载、启动时的后台预热，
+以及预热后排行查询（增量同步 + 计算）的耗时，排行查询的目标为1秒以内
+
+用法: python benchmark_trending.py [视频数量] [每个视频的采样数]
+"""
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from threading import Thread
+
+import numpy as np
+
+from bilibrother_app.backend.api import create_app
+from bilibrother_app.backend.models import db, Video, StatSample
+from bilibrother_app.backend.trending import RETENTION_SECONDS, SampleWindow, TrendingEngine
+
+# 配置日志
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# 排行查询的目标耗时（秒）
+TARGET_SECONDS = 1.0
+
+_SAMPLE_INSERT = (
+    f"INSERT INTO {StatSample.__table__.name} (video_id, ts, view_count, like_count) VALUES (?, ?, ?, ?)"
+)
+
+
+def populate(video_count, samples_per_video):
+    """批量写入测试视频，以及在保留时长内均匀分布、按时间轮次写入的采样"""
+    db.session.execute(Video.__table__.insert(), [
+        {'id': index + 1, 'bvid': f'BV{index:010d}', 'title': f'测试视频标题 {index}', 'link': '',
+         'tname': random.choice(['知识', '游戏', '音乐', '生活'])}
+        for index in range(video_count)
+    ])
+    now = int(time.time())
+    step = (RETENTION_SECONDS - 3600) // samples_per_video
+    views = [random.randint(0, 10 ** 6) for _ in range(video_count)]
+    connection = db.session.connection()
+    for round_index in range(samples_per_video):
+        ts = now - (samples_per_video - round_index) * step
+        rows = []
+        for video_index in range(video_count):
+            views[video_index] += random.randint(0, 500)
+            rows.append((video_index + 1, ts, views[video_index], views[video_index] // 20))
+        connection.exec_driver_sql(_SAMPLE_INSERT, rows)
+    db.session.commit()
+    return now
+
+
+def legacy_sync():
+    """修改前的冷加载: fetchall 后逐列构造数组"""
+    rows = db.session.connection().exec_driver_sql(
+        "SELECT id, video_id, ts, COALESCE(view_count, 0), COALESCE(like_count, 0) "
+        "FROM stat_sample WHERE id > ? AND ts >= ? ORDER BY id",
+        (0, int(time.time()) - RETENTION_SECONDS)
+    ).fetchall()
+    ids, video_ids, ts, views, likes = (np.array(column, dtype=np.int64) for column in zip(*rows))
+    order = np.lexsort((ts, video_ids))
+    return video_ids[order], ts[order], views[order], likes[order]
+
+
+def timed(label, func):
+    """执行并记录耗时"""
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+    logger.info(f"{label:<32} {elapsed * 1000:9.1f} ms")
+    return elapsed, result
+
+
+def run_benchmark(video_count, samples_per_video):
+    """执行基准测试"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        app = create_app(os.path.join(temp_dir, 'benchmark.db'), start_background=False)
+        with app.app_context():
+            logger.info(f"写入 {video_count} 个视频 x {samples_per_video} 条采样...")
+            now = populate(video_count, samples_per_video)
+
+            timed('冷加载（fetchall，修改前）', legacy_sync)
+            _, arrays = timed('冷加载（fetchmany 流式）', SampleWindow().sync)
+            logger.info(f"窗口中的采样数: {len(arrays[0])}")
+
+            # 启动时的后台预热，期间服务可以正常响应
+            engine = TrendingEngine()
+            warm_up = Thread(target=engine.warm_up, args=(app,))
+            timed('后台预热', lambda: (warm_up.start(), warm_up.join()))
+
+            first, ranked = timed('预热后排行查询', lambda: engine.rank(limit=50))
+
+            # 模拟一轮刷新写入了每个视频的新采样
+            db.session.connection().exec_driver_sql(_SAMPLE_INSERT, [
+                (video_id, now, 10 ** 7 + video_id, 10 ** 5) for video_id in range(1, video_count + 1)
+            ])
+            db.session.commit()
+            after_refresh, _ = timed('一轮刷新后的排行查询', lambda: engine.rank(limit=50))
+
+        slowest = max(first, after_refresh)
+        logger.info(f"排行查询最长 {slowest:.3f}s，目标 {TARGET_SECONDS:.1f}s: {'达到' if slowest <= TARGET_SECONDS else '未达到'}")
+        return ranked
+
+
+if __name__ == "__main__":
+    run_benchmark(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 50000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    )
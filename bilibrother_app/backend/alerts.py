@@ -0,0 +1,393 @@
+"""
+基于规则的告警
+告警引擎按id顺序读取新写入的 StatSample，每条采样即一次抓取结果，只与该视频上一次的
+采样比较，并在内存中为每个视频维护上次的计数和各计数每小时增量的指数移动平均，
+每条采样的判断为 O(匹配的规则数)，不扫描视频表。
+
+处理进度保存在数据库中，与触发记录在同一事务中提交，重启后从上次的位置继续，
+同一条采样不会重复触发；同一规则对同一视频在冷却时间内只触发一次。
+触发记录提交后写入日志或POST到webhook，发送失败的记录在之后的轮询中重试，
+webhook熔断期间没有发出的请求不计入发送次数。
+
+多进程部署时只有持有文件锁的进程运行引擎，其余进程在持有锁的进程退出后接替
+"""
+import logging
+import os
+import threading
+from datetime import datetime
+from urllib.parse import urlsplit
+
+import requests
+from sqlalchemy import func
+
+from .discovery import LOCK_RETRY_SECONDS, try_lock
+from .models import db, Config, Video, StatSample, AlertRule, AlertEvent
+from .resilience import CircuitOpenError, get_upstream, is_retryable_before_send
+
+logger = logging.getLogger(__name__)
+
+# 没有提交通知时轮询新采样的间隔（秒），其他进程写入的采样最多延迟这么久
+POLL_INTERVAL = 2.0
+
+# 每次轮询最多读取的采样数
+POLL_BATCH_SIZE = 2000
+
+# 每小时增量的指数移动平均系数，越大越偏重最近的增量
+EWMA_ALPHA = 0.3
+
+# ratio 规则至少观察到该数量的增量后才开始判断，避免刚开始跟踪时误报
+RATIO_MIN_SAMPLES = 3
+
+# webhook请求超时（秒），以及每条触发记录最多发送的次数
+WEBHOOK_TIMEOUT = 5
+MAX_DELIVERY_ATTEMPTS = 5
+
+# 保存处理进度的配置项
+CURSOR_KEY = 'alert_last_sample_id'
+
+_SAMPLE_SQL = (
+    f"SELECT s.id, s.video_id, v.bvid, v.mid, s.ts, {', '.join(f's.{field}' for field in Video.COUNTER_FIELDS)} "
+    f"FROM {StatSample.__table__.name} s JOIN {Video.__table__.name} v ON v.id = s.video_id "
+    f"WHERE s.id > ? ORDER BY s.id LIMIT ?"
+)
+
+# 视频在某条采样之前的最后一条采样，走 (video_id, ts) 索引
+_PREVIOUS_SQL = (
+    f"SELECT ts, {', '.join(Video.COUNTER_FIELDS)} FROM {StatSample.__table__.name} "
+    f"WHERE video_id = ? AND ts <= ? AND id < ? ORDER BY ts DESC, id DESC LIMIT 1"
+)
+
+_FIELD_INDEX = {field: index for index, field in enumerate(Video.COUNTER_FIELDS)}
+
+
+def validate_rule(data, rule=None):
+    """校验并整理规则参数
+
+    Args:
+        data: 请求中的规则字段
+        rule: 修改已有规则时传入，未提供的字段沿用原值
+
+    Returns:
+        可直接赋给 AlertRule 的字段字典
+
+    Raises:
+        ValueError: 参数无效
+    """
+    current = rule.to_dict() if rule is not None else {
+        'field': 'view_count', 'cooldown_seconds': 3600, 'channel': 'log', 'enabled': True,
+    }
+    values = {key: data[key] if key in data else current.get(key) for key in (
+        'name', 'kind', 'field', 'threshold', 'bvid', 'mid', 'cooldown_seconds', 'channel', 'webhook_url', 'enabled'
+    )}
+    if not values['name']:
+        raise ValueError('缺少规则名称')
+    if values['kind'] not in AlertRule.KINDS:
+        raise ValueError(f"无效的规则类型: {values['kind']}，可选 {', '.join(AlertRule.KINDS)}")
+    if values['field'] not in Video.COUNTER_FIELDS:
+        raise ValueError(f"无效的字段: {values['field']}，可选 {', '.join(Video.COUNTER_FIELDS)}")
+    if values['channel'] not in AlertRule.CHANNELS:
+        raise ValueError(f"无效的发送方式: {values['channel']}，可选 {', '.join(AlertRule.CHANNELS)}")
+    if values['channel'] == 'webhook' and not values['webhook_url']:
+        raise ValueError('webhook发送方式需要提供 webhook_url')
+    try:
+        values['threshold'] = float(values['threshold'])
+        values['cooldown_seconds'] = max(int(values['cooldown_seconds']), 0)
+    except (TypeError, ValueError):
+        raise ValueError('threshold 和 cooldown_seconds 必须是数字') from None
+    values['name'] = str(values['name'])[:100]
+    values['bvid'] = values['bvid'] or None
+    values['mid'] = str(values['mid']) if values['mid'] else None
+    values['enabled'] = bool(values['enabled'])
+    return values
+
+
+class _VideoState:
+    """一个视频上次的采样和增量统计"""
+    __slots__ = ('ts', 'counts', 'rates', 'observed', 'last_fired')
+
+    def __init__(self, ts, counts):
+        self.ts = ts
+        self.counts = counts
+        # 每个计数每小时增量的指数移动平均
+        self.rates = [0.0] * len(counts)
+        self.observed = 0
+        # 规则id -> 上次触发的采样时间
+        self.last_fired = {}
+
+    def advance(self, ts, counts):
+        """记录新的采样，更新增量的移动平均"""
+        elapsed = ts - self.ts
+        if elapsed > 0:
+            for index, (previous, count) in enumerate(zip(self.counts, counts)):
+                rate = (count - previous) * 3600 / elapsed
+                self.rates[index] = rate if not self.observed else (
+                    EWMA_ALPHA * rate + (1 - EWMA_ALPHA) * self.rates[index])
+            self.observed += 1
+        self.ts = ts
+        self.counts = counts
+
+
+def evaluate(rule, state, ts, counts):
+    """判断一条采样是否触发规则，state 为该视频上一次采样时的状态
+
+    Returns:
+        触发时返回 (值, 说明)，否则返回None
+    """
+    index = _FIELD_INDEX[rule.field]
+    previous, count = state.counts[index], counts[index]
+    if rule.kind == 'threshold':
+        if previous < rule.threshold <= count:
+            return count, f"{rule.field} 达到 {rule.threshold:g}（当前 {count}）"
+        return None
+
+    elapsed = ts - state.ts
+    if elapsed <= 0:
+        return None
+    rate = (count - previous) * 3600 / elapsed
+    if rule.kind == 'delta':
+        if rate >= rule.threshold:
+            return rate, f"{rule.field} 每小时增加 {rate:.0f}，超过 {rule.threshold:g}"
+        return None
+
+    baseline = state.rates[index]
+    if state.observed < RATIO_MIN_SAMPLES or baseline <= 0:
+        return None
+    ratio = rate / baseline
+    if ratio >= rule.threshold:
+        return ratio, f"{rule.field} 每小时增加 {rate:.0f}，是此前平均的 {ratio:.1f} 倍"
+    return None
+
+
+class AlertEngine:
+    """进程内的告警引擎，start 之后在后台线程中运行"""
+
+    def __init__(self, app, poll_interval=POLL_INTERVAL):
+        """
+        Args:
+            app: Flask应用实例，引擎线程在其应用上下文中读写数据库
+            poll_interval: 轮询间隔（秒）
+        """
+        self.app = app
+        self.poll_interval = poll_interval
+        self.wakeup = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.lock_path = None
+        self.lock_file = None
+        # 视频id -> _VideoState，只保存有匹配规则的视频
+        self.states = {}
+        self.rules = ()
+        self.processed = 0
+        self.fired = 0
+        self.delivered = 0
+        self.failed = 0
+
+    def notify(self):
+        """本进程提交了新的采样，立即唤醒引擎线程"""
+        self.wakeup.set()
+
+    def start(self, lock_path=None):
+        """启动引擎线程
+
+        Args:
+            lock_path: 进程间锁文件路径，为None时不加锁
+        """
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.lock_path = lock_path
+
+        def acquire():
+            if self.lock_file is None:
+                self.lock_file = try_lock(lock_path)
+                if self.lock_file is not None:
+                    logger.info(f"进程 {os.getpid()} 负责告警判断")
+            return self.lock_file is not None
+
+        def run():
+            while not self.stop_event.is_set():
+                leader = not lock_path or acquire()
+                self.wakeup.wait(self.poll_interval if leader else LOCK_RETRY_SECONDS)
+                self.wakeup.clear()
+                if self.stop_event.is_set() or not leader:
+                    continue
+                try:
+                    with self.app.app_context():
+                        self.poll()
+                except Exception as e:
+                    # 未提交的批次会重新处理，内存中已前进的状态需要从数据库重新恢复
+                    self.states.clear()
+                    logger.error(f"告警判断出错: {str(e)}")
+
+        self.thread = threading.Thread(target=run, name='alert-engine', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """停止引擎线程"""
+        self.stop_event.set()
+        self.wakeup.set()
+
+    def is_leader(self):
+        """当前进程是否在运行告警判断"""
+        return bool(self.thread and self.thread.is_alive() and (not self.lock_path or self.lock_file is not None))
+
+    def _load_rules(self):
+        """读取启用的规则，按视频、UP主和全部视频分组"""
+        by_bvid, by_mid, general = {}, {}, []
+        for rule in AlertRule.query.filter_by(enabled=True).all():
+            db.session.expunge(rule)
+            if rule.bvid:
+                by_bvid.setdefault(rule.bvid, []).append(rule)
+            elif rule.mid:
+                by_mid.setdefault(rule.mid, []).append(rule)
+            else:
+                general.append(rule)
+        self.rules = (by_bvid, by_mid, general)
+
+    def _matching_rules(self, bvid, mid):
+        by_bvid, by_mid, general = self.rules
+        return by_bvid.get(bvid, []) + by_mid.get(mid, []) + general
+
+    def _cursor(self):
+        """读取处理进度，第一次运行时从当前最新的采样开始，不对历史采样告警"""
+        config = Config.query.filter_by(key=CURSOR_KEY).first()
+        if config is None:
+            latest = db.session.query(func.coalesce(func.max(StatSample.id), 0)).scalar()
+            config = Config(key=CURSOR_KEY, value=str(latest), description='告警引擎已处理的最后一条采样id（自动维护）')
+            db.session.add(config)
+            db.session.commit()
+        return config
+
+    def _seed(self, connection, video_id, sample_id, ts):
+        """视频第一次出现时从数据库恢复上一次的采样和各规则上次触发的时间
+
+        Returns:
+            _VideoState，没有更早的采样时为None
+        """
+        row = connection.exec_driver_sql(_PREVIOUS_SQL, (video_id, ts, sample_id)).first()
+        if row is None:
+            return None
+        state = _VideoState(row[0], tuple(row[1:]))
+        state.last_fired = dict(
+            db.session.query(AlertEvent.rule_id, func.max(AlertEvent.ts))
+            .filter(AlertEvent.video_id == video_id).group_by(AlertEvent.rule_id).all()
+        )
+        return state
+
+    def poll(self):
+        """处理新的采样并发送触发记录，需要在应用上下文中调用
+
+        Returns:
+            本次处理的采样数
+        """
+        cursor = self._cursor()
+        last_id = int(cursor.value or 0)
+        self._load_rules()
+        connection = db.session.connection()
+        rows = connection.exec_driver_sql(_SAMPLE_SQL, (last_id, POLL_BATCH_SIZE)).fetchall()
+
+        events = []
+        for sample_id, video_id, bvid, mid, ts, *counts in rows:
+            rules = self._matching_rules(bvid, mid)
+            state = self.states.get(video_id)
+            if not rules:
+                # 没有规则的视频不保存状态，之后添加规则时再从数据库恢复
+                if state is not None:
+                    del self.states[video_id]
+                continue
+            counts = tuple(count or 0 for count in counts)
+            if state is None:
+                state = self._seed(connection, video_id, sample_id, ts)
+                if state is None:
+                    self.states[video_id] = _VideoState(ts, counts)
+                    continue
+                self.states[video_id] = state
+
+            for rule in rules:
+                fired = evaluate(rule, state, ts, counts)
+                if fired is None:
+                    continue
+                last_fired = state.last_fired.get(rule.id)
+                if last_fired is not None and ts - last_fired < rule.cooldown_seconds:
+                    continue
+                state.last_fired[rule.id] = ts
+                value, message = fired
+                events.append(AlertEvent(
+                    rule_id=rule.id, video_id=video_id, bvid=bvid, sample_id=sample_id, ts=ts,
+                    value=value, message=f"[{rule.name}] {bvid} {message}"[:300]
+                ))
+            state.advance(ts, counts)
+
+        if rows:
+            # 触发记录与处理进度一起提交，重启后不会重复触发
+            db.session.add_all(events)
+            cursor.value = str(rows[-1][0])
+            db.session.commit()
+            self.processed += len(rows)
+            self.fired += len(events)
+        self.deliver()
+        if len(rows) == POLL_BATCH_SIZE:
+            # 还有积压，立即处理下一批
+            self.wakeup.set()
+        return len(rows)
+
+    def deliver(self):
+        """发送尚未发送成功的触发记录"""
+        pending = AlertEvent.query.filter(
+            AlertEvent.delivered_at.is_(None), AlertEvent.attempts < MAX_DELIVERY_ATTEMPTS
+        ).order_by(AlertEvent.id).limit(POLL_BATCH_SIZE).all()
+        if not pending:
+            return
+        rules = {rule.id: rule for rule in AlertRule.query.filter(
+            AlertRule.id.in_({event.rule_id for event in pending})).all()}
+        for event in pending:
+            rule = rules.get(event.rule_id)
+            try:
+                if rule is not None and rule.channel == 'webhook':
+                    self._post(rule, event)
+                else:
+                    # 规则已删除时也写入日志，不丢弃已触发的告警
+                    logger.warning(f"告警: {event.message}")
+            except CircuitOpenError as e:
+                # 该webhook熔断中，请求没有发出，不计入发送次数，之后的轮询中再发送
+                event.error = str(e)[:500]
+                continue
+            except Exception as e:
+                event.attempts += 1
+                event.error = str(e)[:500]
+                self.failed += 1
+                logger.error(f"发送告警{event.id}失败（第{event.attempts}次）: {str(e)}")
+                continue
+            event.attempts += 1
+            event.delivered_at = datetime.now()
+            event.error = None
+            self.delivered += 1
+        db.session.commit()
+
+    @staticmethod
+    def _post(rule, event):
+        """POST触发记录到规则的webhook，接收方可按 event.id 去重
+
+        每个webhook主机使用独立的熔断器，一个不可用的地址不影响其他规则；
+        只重试请求未送达的错误，读取超时时接收方可能已处理，不重复发送
+        """
+        payload = {'rule': rule.to_dict(), 'event': event.to_dict()}
+
+        def send(timeout):
+            response = requests.post(rule.webhook_url, json=payload, timeout=timeout)
+            response.raise_for_status()
+            return response
+
+        upstream = get_upstream(f'alert-webhook:{urlsplit(rule.webhook_url).netloc}', timeout=WEBHOOK_TIMEOUT)
+        upstream.call(send, retryable=is_retryable_before_send)
+
+    def stats(self):
+        """引擎状态，供健康检查使用"""
+        return {
+            'running': bool(self.thread and self.thread.is_alive()),
+            'leader': self.is_leader(),
+            'tracked_videos': len(self.states),
+            'processed': self.processed,
+            'fired': self.fired,
+            'delivered': self.delivered,
+            'failed': self.failed,
+        }
@@ -0,0 +1,195 @@
+"""
+视频数据统计分析
+一次查询取出计数列快照，用NumPy按分区、UP主或发布时间分组计算统计量，
+结果缓存到下一次数据写入为止
+"""
+import logging
+from threading import Lock
+
+import numpy as np
+
+from .models import db, Video, Author, VideoChange
+
+logger = logging.getLogger(__name__)
+
+# 参与统计的计数列
+METRICS = ('view_count', 'like_count', 'coin_count', 'favorite_count', 'share_count', 'danmaku_count')
+
+# 播放量分位数
+PERCENTILES = (25, 50, 75, 90)
+
+# 发布时间分组粒度对应的numpy日期单位
+COHORT_UNITS = {'year': 'Y', 'month': 'M', 'week': 'W', 'day': 'D'}
+
+
+def data_fingerprint():
+    """返回能反映视频表和UP主表是否被写入过的指纹
+
+    新增和删除会改变行数或最大id，刷新只有在字段确实变化时才写入变化记录，
+    没有变化的刷新不会使缓存失效；在多进程下同样有效
+    """
+    video_row = db.session.query(db.func.count(Video.id), db.func.max(Video.id)).one()
+    change_id = db.session.query(db.func.max(VideoChange.id)).scalar()
+    author_row = db.session.query(db.func.count(Author.mid), db.func.max(Author.updated_at)).one()
+    return tuple(video_row) + (change_id,) + tuple(author_row)
+
+
+def load_snapshot():
+    """一次查询读取统计所需的列
+
+    直接使用DBAPI游标读取原始元组，跳过ORM和DateTime的逐行解析
+
+    Returns:
+        列名到numpy数组的字典
+    """
+    # 空值在SQL中补齐，避免逐个元素判断
+    metric_columns = ', '.join(f'COALESCE({name}, 0)' for name in METRICS)
+    rows = db.session.connection().exec_driver_sql(
+        f"SELECT COALESCE(tname, '未知分区'), COALESCE(mid, ''), "
+        f"COALESCE(CAST(strftime('%s', pubdate) AS INTEGER), -1), {metric_columns} FROM video"
+    ).fetchall()
+    columns = list(zip(*rows)) if rows else [()] * (3 + len(METRICS))
+
+    # 缺失的发布时间用NaT表示
+    pubdate = np.array(columns[2], dtype=np.int64).astype('datetime64[s]')
+    pubdate[pubdate == np.datetime64(-1, 's')] = np.datetime64('NaT')
+
+    snapshot = {
+        'tname': np.array(columns[0], dtype=object),
+        'mid': np.array(columns[1], dtype=object),
+        'pubdate': pubdate,
+    }
+    for index, name in enumerate(METRICS, start=3):
+        snapshot[name] = np.array(columns[index], dtype=np.float64)
+    return snapshot
+
+
+def _group_percentiles(codes, values, group_count, percentiles):
+    """按组计算分位数（线性插值），全部向量化
+
+    Returns:
+        形状为 (len(percentiles), group_count) 的数组
+    """
+    order = np.lexsort((values, codes))
+    sorted_values = values[order]
+    counts = np.bincount(codes, minlength=group_count)
+    starts = np.cumsum(counts) - counts
+
+    result = np.empty((len(percentiles), group_count))
+    for row, percentile in enumerate(percentiles):
+        position = starts + (counts - 1) * (percentile / 100.0)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.ceil(position).astype(np.int64)
+        fraction = position - lower
+        result[row] = sorted_values[lower] * (1 - fraction) + sorted_values[upper] * fraction
+    return result
+
+
+def _safe_ratio(numerator, denominator):
+    """逐元素相除，分母为0时结果为0"""
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator, dtype=np.float64), where=denominator > 0)
+
+
+def group_keys(snapshot, group_by, cohort='month'):
+    """计算每个视频的分组键
+
+    Args:
+        snapshot: load_snapshot 返回的列快照
+        group_by: 'tname'、'mid'、'cohort' 或 'all'
+        cohort: 按发布时间分组时的粒度，year/month/week/day
+
+    Returns:
+        分组键数组
+    """
+    size = len(snapshot['view_count'])
+    if group_by == 'all':
+        return np.full(size, 'all', dtype=object)
+    if group_by == 'cohort':
+        unit = COHORT_UNITS[cohort]
+        keys = np.datetime_as_string(snapshot['pubdate'].astype(f'datetime64[{unit}]')).astype(object)
+        keys[np.isnat(snapshot['pubdate'])] = 'unknown'
+        return keys
+    return snapshot[group_by]
+
+
+def group_stats(snapshot, keys):
+    """按分组键计算统计量
+
+    Args:
+        snapshot: load_snapshot 返回的列快照
+        keys: 与快照等长的分组键数组
+
+    Returns:
+        每组一个字典的列表，按视频数降序排列
+    """
+    if len(keys) == 0:
+        return []
+
+    labels, codes = np.unique(keys.astype(str), return_inverse=True)
+    group_count = len(labels)
+    counts = np.bincount(codes, minlength=group_count)
+    totals = {name: np.bincount(codes, weights=snapshot[name], minlength=group_count) for name in METRICS}
+
+    views = snapshot['view_count']
+    view_percentiles = _group_percentiles(codes, views, group_count, PERCENTILES)
+    like_rate_median = _group_percentiles(codes, _safe_ratio(snapshot['like_count'], views), group_count, (50,))[0]
+
+    like_rate = _safe_ratio(totals['like_count'], totals['view_count'])
+    coin_rate = _safe_ratio(totals['coin_count'], totals['view_count'])
+    favorite_rate = _safe_ratio(totals['favorite_count'], totals['view_count'])
+
+    groups = []
+    for index in np.argsort(-counts, kind='stable'):
+        group = {'key': str(labels[index]), 'video_count': int(counts[index])}
+        for name in METRICS:
+            group[f'total_{name}'] = int(totals[name][index])
+        for row, percentile in enumerate(PERCENTILES):
+            group[f'view_p{percentile}'] = float(view_percentiles[row][index])
+        group['median_view_count'] = group['view_p50']
+        group['like_rate'] = float(like_rate[index])
+        group['coin_rate'] = float(coin_rate[index])
+        group['favorite_rate'] = float(favorite_rate[index])
+        group['median_like_rate'] = float(like_rate_median[index])
+        groups.append(group)
+    return groups
+
+
+class AnalyticsCache:
+    """统计结果缓存，数据指纹变化（即有新的写入）时失效"""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._fingerprint = None
+        self._results = {}
+
+    def get(self, group_by, cohort='month'):
+        """获取分组统计，需要在应用上下文中调用
+
+        Args:
+            group_by: 'tname'、'mid'、'cohort' 或 'all'
+            cohort: 按发布时间分组时的粒度
+
+        Returns:
+            group_stats 的结果列表
+        """
+        fingerprint = data_fingerprint()
+        cache_key = (group_by, cohort if group_by == 'cohort' else None)
+
+        with self._lock:
+            if fingerprint != self._fingerprint:
+                self._fingerprint = fingerprint
+                self._results = {}
+            if cache_key in self._results:
+                return self._results[cache_key]
+
+        snapshot = load_snapshot()
+        groups = group_stats(snapshot, group_keys(snapshot, group_by, cohort))
+        if group_by == 'mid':
+            names = dict(db.session.query(Author.mid, Author.name).all())
+            for group in groups:
+                group['author_name'] = names.get(group['key'])
+
+        with self._lock:
+            if fingerprint == self._fingerprint:
+                self._results[cache_key] = groups
+        return groups
@@ -3,25 +3,149 @@
 提供RESTful API接口用于前端交互
 """
 import requests
-from flask import Flask, request, jsonify, send_from_directory, make_response
+from flask import Flask, Response, g, request, jsonify, make_response, url_for
 from flask_cors import CORS
 import os
 import json
-from datetime import datetime
+import time
+import importlib
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from threading import Lock, Thread
+from types import SimpleNamespace
 
-from .models import db, Video, Config
+from sqlalchemy import text
+
+from .models import (
+    db, Video, Author, Config, PredictionComparison, PredictionJob, VideoChange, ChangeSummary, AlertRule, AlertEvent,
+    VideoCheck, AuthorCheck,
+    upgrade_schema,
+    save_authors, save_video_results, save_video_stats, delete_samples, schema_fingerprint,
+    read_schema_stamp, write_schema_stamp
+)
 from .crawler import BiliCrawler
+from .shared_cache import SharedCache
 from .viewsight_client import ViewSightClient
+from .staleness import DEFAULT_STALE_SECONDS, parse_stale_tiers, stale_condition
+from .discovery import discover_new_uploads, start_discovery_poller
+from .search import ensure_search_index, search_index_ready, search_videos
+from .serialization import (
+    VIDEO_FIELDS, video_rows, video_records, videos_by_bvid, iter_video_json, stream_json, json_response
+)
+from .static_assets import StaticManifest
+from .live import StatBroadcaster, notify_on_commit
+from .prediction_jobs import SOURCES as PREDICTION_SOURCES, PredictionWorkerPool, submit_job
+from .alerts import AlertEngine, validate_rule
+from .archive import open_archive
+from .crawl_queue import enqueue as enqueue_crawl, queue_stats as crawl_queue_stats
+from .resilience import TransientError, get_upstream, reset_deadline, set_deadline, upstream_stats
+from .scheduler import BULK, INTERACTIVE, reset_lane, scheduler_stats, set_lane
+
+# 应用首次启动时写入的默认配置: (key, value, description)
+DEFAULT_CONFIGS = [
+    ('bilibili_cookie', '', 'B站登录Cookie，用于获取视频数据'),
+    ('refresh_stale_seconds', str(DEFAULT_STALE_SECONDS), '增量刷新时的过期阈值（秒）'),
+    ('refresh_stale_tiers', '', '按发布天数分档的过期阈值JSON，如 [[7, 3600], [null, 604800]]，留空使用默认分档'),
+    ('refresh_meta_seconds', str(7 * 24 * 3600), '只刷新计数时，标题、封面等元数据的重新抓取周期（秒）'),
+    ('refresh_author_seconds', str(24 * 3600), '只刷新计数时，UP主信息的重新抓取周期（秒）'),
+    ('discover_interval_seconds', '3600', '自动检查已跟踪UP主新投稿的间隔（秒），0为关闭'),
+    ('raw_archive_dir', '', '保存上游原始响应的归档目录，相对路径相对于数据目录，留空不保存'),
+]
+
+# 批量导入时从列表类接口最多读取的视频数
+BULK_IMPORT_LIMIT = 1000
+
+# 多进程部署时各worker从数据库同步Cookie的间隔（秒）
+COOKIE_SYNC_SECONDS = 30
+
+# SQLite写锁的等待时间（秒），多个worker同时写入时排队而不是立即报错
+SQLITE_BUSY_TIMEOUT = 30
+
+# 客户端通过该请求头指定本次请求的截止时间（秒），传递给所有上游调用
+DEADLINE_HEADER = 'X-Request-Timeout'
+
+# 刷新不超过该数量的视频时按用户操作优先调度，更多的视频按批量任务调度
+INTERACTIVE_BATCH_LIMIT = 5
+
+
+def _config_float(key, default):
+    """读取数值型配置项，缺失或无效时返回默认值"""
+    config = Config.query.filter_by(key=key).first()
+    try:
+        return float(config.value) if config and config.value else default
+    except ValueError:
+        return default
+
+
+@contextmanager
+def _timed(timings, name):
+    """记录代码块耗时（毫秒）到 timings[name]"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = round((time.perf_counter() - started) * 1000, 1)
+
+
+def _lazy(module, name, *args):
+    """返回一个函数，首次调用时才导入 module 并创建 name(*args)，之后返回同一个对象
+
+    统计、趋势和预测模块依赖NumPy，延迟到第一次使用时再导入
+    """
+    lock = Lock()
+    holder = []
+    
+    def get():
+        if not holder:
+            with lock:
+                if not holder:
+                    holder.append(getattr(importlib.import_module(module, __package__), name)(*args))
+        return holder[0]
+    
+    get.created = lambda: bool(holder)
+    return get
+
+
+def bootstrap_database():
+    """建表、迁移、建立全文索引并写入默认配置，需要在应用上下文中调用
+
+    数据库中记录的结构指纹与当前模型一致时跳过这些步骤
+    
+    Returns:
+        全文索引是否可用
+    """
+    # WAL模式下读请求不会被刷新写入阻塞，设置会保存在数据库文件中
+    db.session.execute(text('PRAGMA journal_mode=WAL'))
+    fingerprint = schema_fingerprint(*(key for key, _, _ in DEFAULT_CONFIGS))
+    if read_schema_stamp() == fingerprint:
+        return search_index_ready()
+    
+    db.create_all()
+    upgrade_schema()
+    fts_enabled = ensure_search_index()
+    # 初始化默认配置
+    existing_keys = {config.key for config in Config.query.all()}
+    for key, value, description in DEFAULT_CONFIGS:
+        if key not in existing_keys:
+            db.session.add(Config(key=key, value=value, description=description))
+    db.session.commit()
+    write_schema_stamp(fingerprint)
+    return fts_enabled
+
 
-def create_app(db_path=None):
+def create_app(db_path=None, start_background=True):
     """创建Flask应用实例
     
     Args:
         db_path: 数据库文件路径
+        start_background: 是否立即启动后台任务；多进程部署时为False，
+            由每个worker在fork之后调用 app.extensions['bilibrother'].start_background_tasks()
         
     Returns:
         Flask应用实例
     """
+    timings = {}
+    started = time.perf_counter()
     app = Flask(__name__, static_folder='../frontend/build')
     CORS(app)  # 允许跨域请求
     
@@ -35,38 +159,232 @@ def create_app(db_path=None):
     
     app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': SQLITE_BUSY_TIMEOUT}}
     
     # 初始化数据库
     db.init_app(app)
     
-    with app.app_context():
-        db.create_all()
-        # 初始化默认配置
-        if Config.query.filter_by(key='bilibili_cookie').first() is None:
-            default_config = Config(
-                key='bilibili_cookie', 
-                value='', 
-                description='B站登录Cookie，用于获取视频数据'
-            )
-            db.session.add(default_config)
-            db.session.commit()
+    with app.app_context(), _timed(timings, 'database'):
+        fts_enabled = bootstrap_database()
+    
+    # 创建爬虫实例，WBI参数和上游响应缓存在进程间共享
+    with _timed(timings, 'crawler'):
+        crawler = BiliCrawler(cache=SharedCache(os.path.join(os.path.dirname(db_path), 'shared_cache.db')))
     
-    # 创建爬虫实例
-    crawler = BiliCrawler()
+    # 以下组件在第一次使用时才创建
+    # 统计结果缓存，有新的写入时自动失效
+    analytics_cache = _lazy('.analytics', 'AnalyticsCache')
+    # 增长趋势引擎，在内存中增量维护计数采样
+    trending_engine = _lazy('.trending', 'TrendingEngine')
+    # 计数曲线的降采样结果缓存
+    series_cache = _lazy('.timeseries', 'SeriesCache')
+    # 本地播放量预测模型，与数据库放在同一目录
+    predictor_path = os.path.join(os.path.dirname(db_path), 'local_predictor.npz')
+    predictor_store = _lazy('.predictor', 'PredictorStore', predictor_path)
     
     # 加载Cookie
-    with app.app_context():
+    with app.app_context(), _timed(timings, 'config'):
         cookie_config = Config.query.filter_by(key='bilibili_cookie').first()
         if cookie_config and cookie_config.value:
             crawler.set_cookie(cookie_config.value)
+        discover_interval = _config_float('discover_interval_seconds', 0)
+        archive_config = Config.query.filter_by(key='raw_archive_dir').first()
+        crawler.archive = open_archive(archive_config.value if archive_config else '', os.path.dirname(db_path))
+    
+    # 前端构建文件清单，请求时不再访问文件系统
+    with _timed(timings, 'static'):
+        static_manifest = StaticManifest(app.static_folder)
+    
+    # 计数实时推送，本进程提交采样后立即广播
+    stat_broadcaster = StatBroadcaster(app)
+    # 告警引擎，对每条新的计数采样判断告警规则
+    alert_engine = AlertEngine(app)
+    notify_on_commit(app, stat_broadcaster, alert_engine)
+    
+    # 远程预测在后台任务队列中执行，请求只负责提交和查询
+    prediction_pool = PredictionWorkerPool(app, lambda bvid, source: _run_prediction(bvid, source))
+    
+    # 每个进程各自的运行状态，多进程部署时在worker中fork之后启动后台任务
+    timings['create_app'] = round((time.perf_counter() - started) * 1000, 1)
+    state = SimpleNamespace(
+        started_at=time.time(),
+        startup_timings=timings,
+        crawler=crawler,
+        discovery_thread=None,
+        cookie_synced_at=time.monotonic(),
+    )
+    
+    def start_background_tasks():
+        """启动后台任务: 定时检查已跟踪UP主的新投稿、执行预测任务、判断告警规则、预热趋势窗口"""
+        lock_path = os.path.join(os.path.dirname(db_path), 'discovery.lock')
+        state.discovery_thread = start_discovery_poller(app, crawler, discover_interval, lock_path)
+        prediction_pool.start()
+        alert_engine.start(os.path.join(os.path.dirname(db_path), 'alerts.lock'))
+        # 趋势窗口的首次加载耗时较长，在后台完成，NumPy也在后台线程中导入
+        Thread(target=lambda: trending_engine().warm_up(app), name='trending-warm-up', daemon=True).start()
+    
+    state.start_background_tasks = start_background_tasks
+    app.extensions['bilibrother'] = state
+    if start_background:
+        start_background_tasks()
+    
+    @app.before_request
+    def sync_worker_state():
+        """其他worker进程可能修改了Cookie，定期从数据库同步到本进程的爬虫"""
+        now = time.monotonic()
+        if now - state.cookie_synced_at < COOKIE_SYNC_SECONDS:
+            return
+        state.cookie_synced_at = now
+        cookie_config = Config.query.filter_by(key='bilibili_cookie').first()
+        if cookie_config and cookie_config.value and cookie_config.value != crawler.cookie:
+            crawler.set_cookie(cookie_config.value)
+    
+    @app.before_request
+    def apply_request_deadline():
+        """按请求头设置截止时间，请求内的上游调用不会超过它"""
+        value = request.headers.get(DEADLINE_HEADER)
+        if not value:
+            return
+        try:
+            seconds = float(value)
+        except ValueError:
+            return jsonify({'error': f'{DEADLINE_HEADER} 无效'}), 400
+        g.deadline_token = set_deadline(seconds)
+    
+    @app.teardown_request
+    def clear_request_deadline(error=None):
+        token = g.pop('deadline_token', None)
+        if token is not None:
+            reset_deadline(token)
+    
+    @app.before_request
+    def apply_request_lane():
+        """请求内的上游调用默认走用户操作通道，批量接口在处理函数中改为批量通道"""
+        g.lane_token = set_lane(INTERACTIVE)
+    
+    @app.teardown_request
+    def clear_request_lane(error=None):
+        token = g.pop('lane_token', None)
+        if token is not None:
+            reset_lane(token)
+    
+    @app.route('/api/health', methods=['GET'])
+    def health():
+        """健康检查，供负载均衡和启动脚本探测服务是否可用"""
+        try:
+            db.session.execute(text('SELECT 1'))
+            database = 'ok'
+        except Exception as e:
+            database = f'error: {str(e)}'
+        discovery = state.discovery_thread
+        return jsonify({
+            'status': 'ok' if database == 'ok' else 'error',
+            'pid': os.getpid(),
+            'uptime_seconds': round(time.time() - state.started_at, 1),
+            'database': database,
+            'search_index': fts_enabled,
+            'local_predictor': os.path.exists(predictor_path),
+            'discovery_leader': bool(discovery and discovery.is_alive() and discovery.is_leader()),
+            'shared_cache': crawler.cache.stats(),
+            'static_assets': static_manifest.stats(),
+            'live': stat_broadcaster.stats(),
+            'upstreams': upstream_stats(),
+            'prediction_jobs': prediction_pool.stats(),
+            'request_lanes': scheduler_stats(),
+            'crawl_queue': crawl_queue_stats(),
+            'raw_archive': crawler.archive.stats() if crawler.archive is not None else None,
+            'alerts': alert_engine.stats(),
+            'startup_ms': state.startup_timings,
+        }), 200 if database == 'ok' else 503
     
     # API路由
     
     @app.route('/api/videos', methods=['GET'])
     def get_videos():
-        """获取所有已保存的视频数据"""
-        videos = Video.query.all()
-        return jsonify([video.to_dict() for video in videos])
+        """获取所有已保存的视频数据
+        
+        查询参数:
+            layout: 为 'columns' 时返回 {fields, rows} 列式结构，体积更小
+        """
+        layout = 'columns' if request.args.get('layout') == 'columns' else 'records'
+        return stream_json(iter_video_json(layout=layout))
+    
+    @app.route('/api/videos/live', methods=['GET'])
+    def live_stats():
+        """以Server-Sent Events推送视频计数变化
+        
+        查询参数:
+            bvid: 只推送这些视频，逗号分隔或重复传入
+            mid: 只推送这些UP主的视频，逗号分隔或重复传入
+        
+        断线重连时浏览器会带上 Last-Event-ID，补发断线期间的更新
+        """
+        def split_values(name):
+            return [value.strip() for item in request.args.getlist(name) for value in item.split(',') if value.strip()]
+        
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+        try:
+            last_event_id = int(last_event_id) if last_event_id else None
+        except ValueError:
+            return jsonify({'error': 'Last-Event-ID 无效'}), 400
+        
+        subscription = stat_broadcaster.subscribe(split_values('bvid'), split_values('mid'), last_event_id)
+        if subscription is None:
+            return jsonify({'error': '实时推送连接数已满，请稍后重试'}), 503
+        
+        response = Response(stat_broadcaster.stream(subscription), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        # 禁止反向代理缓冲推送内容
+        response.headers['X-Accel-Buffering'] = 'no'
+        # 客户端在第一次读取前断开时生成器不会执行，在这里也注销订阅
+        response.call_on_close(lambda: stat_broadcaster.unsubscribe(subscription))
+        return response
+
+    @app.route('/api/videos/changes', methods=['GET'])
+    def get_video_changes():
+        """按id顺序读取视频字段的变化记录，供下游增量同步
+
+        查询参数:
+            since_id: 只返回id大于该值的记录，默认0
+            limit: 最多返回的记录数，默认1000，最大10000
+
+        返回的 next_since_id 用作下一次请求的 since_id
+        """
+        since_id = request.args.get('since_id', 0, type=int)
+        limit = min(max(request.args.get('limit', 1000, type=int), 1), 10000)
+        rows = db.session.query(VideoChange.id, Video.bvid, VideoChange.ts, VideoChange.fields).join(
+            Video, Video.id == VideoChange.video_id
+        ).filter(VideoChange.id > since_id).order_by(VideoChange.id).limit(limit).all()
+        return json_response({
+            'changes': [
+                {'id': row.id, 'bvid': row.bvid, 'ts': row.ts, 'fields': VideoChange.field_names(row.fields)}
+                for row in rows
+            ],
+            'next_since_id': rows[-1].id if rows else since_id,
+        })
+
+    @app.route('/api/videos/search', methods=['GET'])
+    def search():
+        """全文搜索视频标题、UP主名称和分区
+        
+        查询参数:
+            q: 搜索词，多个词以空格分隔
+            page: 页码，从1开始
+            per_page: 每页数量，默认20，最大200
+        """
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'error': '缺少搜索词'}), 400
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = min(max(request.args.get('per_page', 20, type=int), 1), 200)
+        
+        total, videos = search_videos(query, page, per_page, use_fts=fts_enabled)
+        return jsonify({
+            'total': total,
+            'page': page,
+            'per_page': per_page,
+            'videos': [video.to_dict() for video in videos]
+        })
     
     @app.route('/api/videos', methods=['POST'])
     def add_video():
@@ -87,30 +405,10 @@ def create_app(db_path=None):
         if not video_data:
             return jsonify({'error': f'获取视频 {bvid} 信息失败'}), 500
             
-        # 创建新记录
-        new_video = Video(
-            bvid=video_data['bvid'],
-            title=video_data['title'],
-            link=video_data['link'],
-            view_count=video_data['view_count'],
-            danmaku_count=video_data['danmaku_count'],
-            coin_count=video_data['coin_count'],
-            like_count=video_data['like_count'],
-            share_count=video_data['share_count'],
-            favorite_count=video_data['favorite_count'],
-            tname=video_data['tname'],
-            cover_url=video_data['cover_url'],
-            duration=video_data['duration'],
-            follower_count=video_data['follower_count'],
-            historical_likes=video_data['historical_likes'],
-            archive_count=video_data['archive_count'],
-            mid=video_data['mid'],
-            author_name=video_data['author_name'],
-            last_updated=datetime.now()
-        )
-        
-        db.session.add(new_video)
+        # 创建新记录，与刷新走同一写入路径，记录变化和抓取时间
+        save_video_results([video_data])
         db.session.commit()
+        new_video = Video.query.filter_by(bvid=bvid).one()
         
         return jsonify(new_video.to_dict()), 201
     
@@ -121,79 +419,479 @@ def create_app(db_path=None):
         if not video:
             return jsonify({'error': f'视频 {bvid} 不存在'}), 404
             
+        delete_samples([video.id])
         db.session.delete(video)
         db.session.commit()
         
         return jsonify({'message': f'视频 {bvid} 已删除'}), 200
     
+    @app.route('/api/videos/bulk', methods=['POST'])
+    def bulk_add_videos():
+        """批量添加视频
+        
+        请求体参数（四选一）:
+            bvids: BV号列表
+            mid: UP主ID，导入其全部投稿
+            fav_id: 收藏夹ID
+            ranking: 'popular' 为综合热门，其它值视为排行榜分区ID
+            limit: 最多读取的视频数，默认 BULK_IMPORT_LIMIT
+        """
+        data = request.json or {}
+        # 批量导入不占用用户操作的请求配额，通道在请求结束时恢复
+        set_lane(BULK)
+        try:
+            limit = int(data.get('limit') or BULK_IMPORT_LIMIT)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'limit 必须是整数'}), 400
+        
+        # 列表接口都是生成器，读够 limit 条后不会再请求后续页
+        if data.get('bvids'):
+            source = iter(data['bvids'])
+        elif data.get('mid'):
+            source = (item.get('bvid') for item in crawler.iter_user_uploads(data['mid']))
+        elif data.get('fav_id'):
+            source = (item.get('bvid') for item in crawler.iter_favorite_folder(data['fav_id']))
+        elif data.get('ranking') == 'popular':
+            source = (item.get('bvid') for item in crawler.iter_popular())
+        elif data.get('ranking') is not None:
+            source = (item.get('bvid') for item in crawler.iter_ranking(data['ranking']))
+        else:
+            return jsonify({'error': '需要提供 bvids、mid、fav_id 或 ranking 之一'}), 400
+        
+        candidates = []
+        seen = set()
+        for bvid in source:
+            if bvid and bvid not in seen:
+                seen.add(bvid)
+                candidates.append(bvid)
+                if len(candidates) >= limit:
+                    break
+        
+        # 一次查询排除已存在的视频
+        existing = {row.bvid for row in db.session.query(Video.bvid).filter(Video.bvid.in_(candidates)).all()} if candidates else set()
+        to_add = [bvid for bvid in candidates if bvid not in existing]
+        
+        video_data_list = crawler.batch_process_videos(to_add) if to_add else []
+        save_video_results(video_data_list)
+        db.session.commit()
+        
+        added = [video_data.bvid for video_data in video_data_list]
+        added_set = set(added)
+        failed = [bvid for bvid in to_add if bvid not in added_set]
+        
+        return jsonify({
+            'message': f'成功添加 {len(added)} 个视频，{len(existing)} 个已存在，{len(failed)} 个失败',
+            'added': added,
+            'existing': len(existing),
+            'failed': failed
+        }), 201 if added else 200
+    
+    @app.route('/api/videos/bulk', methods=['DELETE'])
+    def bulk_delete_videos():
+        """批量删除视频
+        
+        请求体参数（二选一）:
+            bvids: BV号列表
+            mid: UP主ID，删除其全部视频
+        """
+        data = request.json or {}
+        if data.get('bvids'):
+            query = Video.query.filter(Video.bvid.in_(data['bvids']))
+        elif data.get('mid'):
+            query = Video.query.filter(Video.mid == str(data['mid']))
+        else:
+            return jsonify({'error': '需要提供 bvids 或 mid'}), 400
+        
+        delete_samples(query.with_entities(Video.id).scalar_subquery())
+        deleted = query.delete(synchronize_session=False)
+        db.session.commit()
+        
+        return jsonify({'message': f'已删除 {deleted} 个视频', 'deleted': deleted}), 200
+    
     @app.route('/api/videos/refresh', methods=['POST'])
     def refresh_videos():
-        """刷新所有视频数据"""
+        """刷新视频数据
+        
+        请求体参数:
+            bvids: 要刷新的BV号列表，为空时刷新所有视频
+            only_stale: 为真时跳过距上次抓取未超过过期阈值的视频
+            stale_after: 覆盖配置中的过期阈值（秒）
+            tiered: 是否按视频发布时长分档使用不同阈值，默认读取配置是否设置了分档
+            mode: 为 'stats' 时只刷新计数，元数据和UP主信息按较慢的周期刷新
+            queue: 为真时加入分布式抓取队列后立即返回202，由抓取工作进程完成刷新
+        """
         data = request.json or {}
         videos_to_refresh = data.get('bvids', [])
+        requested_count = len(videos_to_refresh)
+        skipped_count = 0
         
-        if not videos_to_refresh:
+        if data.get('only_stale'):
+            # 只刷新已过期的视频，过滤在数据库中完成
+            tiers_config = Config.query.filter_by(key='refresh_stale_tiers').first()
+            # 显式传入0表示全部视为过期，不能按假值回退到配置
+            stale_after = data.get('stale_after')
+            if stale_after is None:
+                stale_after = _config_float('refresh_stale_seconds', DEFAULT_STALE_SECONDS)
+            try:
+                stale_after = float(stale_after)
+            except (TypeError, ValueError):
+                return jsonify({'error': 'stale_after 必须是数字'}), 400
+            if not stale_after >= 0:
+                return jsonify({'error': 'stale_after 不能为负数'}), 400
+            tiered = data.get('tiered', bool(tiers_config and tiers_config.value))
+            tiers = parse_stale_tiers(tiers_config.value if tiers_config else None) if tiered else None
+            
+            query = db.session.query(Video.bvid)
+            if videos_to_refresh:
+                query = query.filter(Video.bvid.in_(videos_to_refresh))
+            else:
+                requested_count = Video.query.count()
+            stale_bvids = {row.bvid for row in query.filter(stale_condition(stale_after, tiers)).all()}
+            
+            if videos_to_refresh:
+                # 数据库中不存在的BV号视为需要抓取
+                known_bvids = {row.bvid for row in db.session.query(Video.bvid).filter(Video.bvid.in_(videos_to_refresh)).all()}
+                videos_to_refresh = [bvid for bvid in videos_to_refresh if bvid in stale_bvids or bvid not in known_bvids]
+            else:
+                videos_to_refresh = list(stale_bvids)
+            skipped_count = requested_count - len(videos_to_refresh)
+        elif not videos_to_refresh:
             # 如果未指定，刷新所有视频
             videos = Video.query.all()
             videos_to_refresh = [video.bvid for video in videos]
+            requested_count = len(videos_to_refresh)
         
         if not videos_to_refresh:
-            return jsonify({'message': '没有需要刷新的视频'}), 200
+            return jsonify({
+                'message': '没有需要刷新的视频',
+                'skipped': skipped_count,
+                'fetched': 0,
+                'videos': []
+            }), 200
             
+        if data.get('queue'):
+            queued = enqueue_crawl(videos_to_refresh)
+            return jsonify({
+                'message': f'已将 {queued} 个视频加入抓取队列',
+                'skipped': skipped_count,
+                'queued': queued,
+                'queue': crawl_queue_stats()
+            }), 202
+        
+        if len(videos_to_refresh) > INTERACTIVE_BATCH_LIMIT:
+            set_lane(BULK)
+        
+        if data.get('mode') == 'stats':
+            return _refresh_stats(videos_to_refresh, skipped_count)
+        
         # 批量抓取最新数据
-        updated_videos = []
         video_data_list = crawler.batch_process_videos(videos_to_refresh)
+        summary = ChangeSummary()
+        updated_bvids = save_video_results(video_data_list, summary=summary)
+        db.session.commit()
+        updated_videos = videos_by_bvid(updated_bvids)
         
-        for video_data in video_data_list:
-            bvid = video_data['bvid']
-            video = Video.query.filter_by(bvid=bvid).first()
-            
-            if video:
-                # 更新现有记录
-                video.title = video_data['title']
-                video.view_count = video_data['view_count']
-                video.danmaku_count = video_data['danmaku_count']
-                video.coin_count = video_data['coin_count']
-                video.like_count = video_data['like_count']
-                video.share_count = video_data['share_count']
-                video.favorite_count = video_data['favorite_count']
-                video.follower_count = video_data['follower_count']
-                video.historical_likes = video_data['historical_likes']
-                video.archive_count = video_data['archive_count']
-                video.author_name = video_data['author_name']
-                video.last_updated = datetime.now()
-                updated_videos.append(video.to_dict())
-            else:
-                # 创建新记录
-                new_video = Video(
-                    bvid=video_data['bvid'],
-                    title=video_data['title'],
-                    link=video_data['link'],
-                    view_count=video_data['view_count'],
-                    danmaku_count=video_data['danmaku_count'],
-                    coin_count=video_data['coin_count'],
-                    like_count=video_data['like_count'],
-                    share_count=video_data['share_count'],
-                    favorite_count=video_data['favorite_count'],
-                    tname=video_data['tname'],
-                    cover_url=video_data['cover_url'],
-                    duration=video_data['duration'],
-                    follower_count=video_data['follower_count'],
-                    historical_likes=video_data['historical_likes'],
-                    archive_count=video_data['archive_count'],
-                    mid=video_data['mid'],
-                    last_updated=datetime.now()
-                )
-                db.session.add(new_video)
-                updated_videos.append(new_video.to_dict())
+        return json_response({
+            'message': f'成功刷新 {len(updated_videos)}/{len(videos_to_refresh)} 个视频',
+            'skipped': skipped_count,
+            'fetched': len(videos_to_refresh),
+            **summary.to_dict(),
+            'videos': updated_videos
+        })
+    
+    def _refresh_stats(bvids, skipped_count):
+        """只刷新计数的轻量刷新
+        
+        元数据超过 refresh_meta_seconds 未完整抓取或尚未入库的视频走完整抓取；
+        其余视频只请求archive/stat并只写计数列，UP主名片超过
+        refresh_author_seconds 才重新抓取，且每个UP主只抓一次。
+        抓取时间取自 video_check/author_check，没有记录时使用 video/author 表中的更新时间。
+        """
+        now = datetime.now()
+        meta_cutoff = now - timedelta(seconds=_config_float('refresh_meta_seconds', 7 * 24 * 3600))
+        author_cutoff = now - timedelta(seconds=_config_float('refresh_author_seconds', 24 * 3600))
+        
+        rows = db.session.query(
+            Video.id, Video.bvid, Video.mid,
+            db.func.coalesce(VideoCheck.meta_checked_at, Video.meta_updated).label('meta_updated'),
+            db.func.coalesce(AuthorCheck.checked_at, Author.updated_at).label('author_updated')
+        ).outerjoin(VideoCheck, VideoCheck.video_id == Video.id) \
+            .outerjoin(Author, Author.mid == Video.mid) \
+            .outerjoin(AuthorCheck, AuthorCheck.mid == Video.mid) \
+            .filter(Video.bvid.in_(bvids)).all()
+        known = {row.bvid: row for row in rows}
         
+        full_bvids = [bvid for bvid in bvids
+                      if bvid not in known or not known[bvid].meta_updated or known[bvid].meta_updated < meta_cutoff]
+        full_set = set(full_bvids)
+        stats_rows = [known[bvid] for bvid in bvids if bvid not in full_set]
+        stale_mids = {row.mid for row in stats_rows
+                      if row.mid and (not row.author_updated or row.author_updated < author_cutoff)}
+        
+        summary = ChangeSummary()
+        updated_bvids = []
+        if full_bvids:
+            updated_bvids = save_video_results(crawler.batch_process_videos(full_bvids), now, summary)
+        
+        stats, authors = crawler.batch_process_stats([row.bvid for row in stats_rows], stale_mids)
+        
+        # 计数只写有变化的计数列，按主键批量更新
+        updated_bvids.extend(save_video_stats(stats, now, summary))
+        # UP主信息每个UP主只写一行
+        save_authors(authors.values(), now)
         db.session.commit()
         
-        return jsonify({
-            'message': f'成功刷新 {len(updated_videos)}/{len(videos_to_refresh)} 个视频',
+        updated_videos = videos_by_bvid(updated_bvids)
+        
+        return json_response({
+            'message': f'成功刷新 {len(updated_videos)}/{len(bvids)} 个视频',
+            'skipped': skipped_count,
+            'fetched': len(bvids),
+            'full_refreshed': len(full_bvids),
+            'stats_refreshed': len(stats),
+            'authors_refreshed': len(authors),
+            **summary.to_dict(),
             'videos': updated_videos
         })
     
+    @app.route('/api/crawl-queue', methods=['GET'])
+    def get_crawl_queue():
+        """查看分布式抓取队列各状态的任务数"""
+        return jsonify(crawl_queue_stats())
+    
+    @app.route('/api/crawl-queue', methods=['POST'])
+    def add_to_crawl_queue():
+        """把视频加入分布式抓取队列，已在队列中的视频不重复加入
+        
+        请求体参数:
+            bvids: BV号列表
+        """
+        bvids = (request.json or {}).get('bvids')
+        if not bvids or not isinstance(bvids, list):
+            return jsonify({'error': '需要提供 bvids 列表'}), 400
+        queued = enqueue_crawl(bvids)
+        return jsonify({'message': f'已将 {queued} 个视频加入抓取队列', 'queued': queued}), 202
+    
+    @app.route('/api/authors', methods=['GET'])
+    def get_authors():
+        """分页获取UP主列表及其视频统计
+        
+        查询参数:
+            page: 页码，从1开始
+            per_page: 每页数量，默认50，最大500
+            sort: 排序字段，follower_count/video_count/total_views/updated_at，默认follower_count
+        """
+        page = max(request.args.get('page', 1, type=int), 1)
+        per_page = min(max(request.args.get('per_page', 50, type=int), 1), 500)
+        
+        # 按UP主聚合视频数和总播放量，走 video.mid 索引
+        video_stats = db.session.query(
+            Video.mid.label('mid'),
+            db.func.count(Video.id).label('video_count'),
+            db.func.sum(Video.view_count).label('total_views')
+        ).group_by(Video.mid).subquery()
+        
+        sort_columns = {
+            'follower_count': Author.follower_count,
+            'video_count': video_stats.c.video_count,
+            'total_views': video_stats.c.total_views,
+            'updated_at': Author.updated_at,
+        }
+        sort_column = sort_columns.get(request.args.get('sort', 'follower_count'), Author.follower_count)
+        
+        query = db.session.query(Author, video_stats.c.video_count, video_stats.c.total_views) \
+            .join(video_stats, video_stats.c.mid == Author.mid)
+        total = query.count()
+        rows = query.order_by(sort_column.desc(), Author.mid).offset((page - 1) * per_page).limit(per_page).all()
+        
+        return jsonify({
+            'total': total,
+            'page': page,
+            'per_page': per_page,
+            'authors': [dict(author.to_dict(), video_count=video_count, total_views=total_views or 0)
+                        for author, video_count, total_views in rows]
+        })
+    
+    @app.route('/api/authors/<mid>/videos', methods=['GET'])
+    def get_author_videos(mid):
+        """获取指定UP主的所有视频"""
+        author = Author.query.filter_by(mid=mid).first()
+        if not author:
+            return jsonify({'error': f'UP主 {mid} 不存在'}), 404
+        
+        return json_response({
+            'author': author.to_dict(),
+            'videos': video_records('video.mid = ?', (mid,), order_by='video.pubdate DESC')
+        })
+    
+    @app.route('/api/authors/discover', methods=['POST'])
+    def discover_uploads():
+        """立即检查已跟踪UP主的新投稿
+        
+        请求体参数:
+            mids: 只检查这些UP主，为空时检查所有已跟踪UP主
+        """
+        data = request.json or {}
+        result = discover_new_uploads(crawler, mids=data.get('mids') or None)
+        return jsonify({
+            'message': f'检查了 {result["authors"]} 个UP主，新增 {len(result["added"])} 个视频',
+            **result
+        })
+    
+    @app.route('/api/analytics/<group_by>', methods=['GET'])
+    def get_analytics(group_by):
+        """分组统计视频数据
+        
+        Args:
+            group_by: all(全部)、tname(分区)、mid(UP主)、cohort(发布时间)
+        
+        查询参数:
+            cohort: group_by为cohort时的粒度，year/month/week/day，默认month
+            sort: 排序字段，如 total_view_count、median_view_count、like_rate，默认按视频数
+            limit: 最多返回的分组数
+        """
+        if group_by not in ('all', 'tname', 'mid', 'cohort'):
+            return jsonify({'error': f'不支持的分组方式: {group_by}'}), 400
+        cohort = request.args.get('cohort', 'month')
+        from .analytics import COHORT_UNITS
+        if cohort not in COHORT_UNITS:
+            return jsonify({'error': f'不支持的时间粒度: {cohort}'}), 400
+        
+        groups = analytics_cache().get(group_by, cohort)
+        
+        sort = request.args.get('sort')
+        if sort:
+            if groups and sort not in groups[0]:
+                return jsonify({'error': f'不支持的排序字段: {sort}'}), 400
+            groups = sorted(groups, key=lambda group: group[sort], reverse=True)
+        limit = request.args.get('limit', type=int)
+        if limit:
+            groups = groups[:limit]
+        
+        return jsonify({'group_by': group_by, 'groups': groups})
+    
+    @app.route('/api/trending', methods=['GET'])
+    def get_trending():
+        """增长趋势排行
+        
+        查询参数:
+            sort: 排序字段，view_delta_1h/24h/7d、like_delta_*、view_rate_24h、acceleration、z_score，默认view_delta_24h
+            limit: 返回数量，默认50，最大1000
+            tname: 只看指定分区
+        """
+        sort = request.args.get('sort', 'view_delta_24h')
+        limit = min(request.args.get('limit', 50, type=int), 1000)
+        try:
+            ranked = trending_engine().rank(sort=sort, limit=limit, tname=request.args.get('tname'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify({'sort': sort, 'videos': ranked})
+    
+    @app.route('/api/videos/timeseries', methods=['GET'])
+    def get_timeseries():
+        """计数历史曲线，在服务端降采样后返回，供前端绘图
+        
+        查询参数:
+            bvids: BV号，逗号分隔，最多20个
+            fields: 计数字段，逗号分隔，默认view_count
+            start: 起始时间（Unix时间戳），默认不限
+            end: 结束时间（Unix时间戳），默认到最新的采样
+            points: 每条曲线的目标点数，默认500，最大5000
+            method: 降采样方法，lttb（默认）或 minmax
+        """
+        from .timeseries import DEFAULT_POINTS, MAX_POINTS, MAX_VIDEOS
+        bvids = [bvid.strip() for bvid in request.args.get('bvids', '').split(',') if bvid.strip()]
+        if not bvids:
+            return jsonify({'error': '缺少BV号'}), 400
+        if len(bvids) > MAX_VIDEOS:
+            return jsonify({'error': f'一次最多查询{MAX_VIDEOS}个视频'}), 400
+        fields = [field.strip() for field in request.args.get('fields', 'view_count').split(',') if field.strip()]
+        points = min(max(request.args.get('points', DEFAULT_POINTS, type=int), 3), MAX_POINTS)
+        try:
+            result = series_cache().query(
+                list(dict.fromkeys(bvids)), fields,
+                start=request.args.get('start', type=int),
+                end=request.args.get('end', type=int),
+                points=points,
+                method=request.args.get('method', 'lttb'),
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return json_response({'points': points, **result})
+    
+    @app.route('/api/alerts/rules', methods=['GET'])
+    def get_alert_rules():
+        """获取所有告警规则"""
+        return jsonify([rule.to_dict() for rule in AlertRule.query.order_by(AlertRule.id).all()])
+    
+    @app.route('/api/alerts/rules', methods=['POST'])
+    def create_alert_rule():
+        """添加告警规则
+        
+        请求体:
+            name: 规则名称
+            kind: threshold（计数达到阈值）、delta（每小时增量超过阈值）或 ratio（每小时增量是此前平均的倍数）
+            field: 计数字段，默认view_count
+            threshold: 阈值
+            bvid / mid: 只检查指定视频或UP主的视频，都不指定时检查所有视频
+            cooldown_seconds: 同一视频两次触发的最短间隔，默认3600
+            channel: log（默认）或 webhook
+            webhook_url: channel为webhook时POST告警的地址
+        """
+        try:
+            rule = AlertRule(**validate_rule(request.json or {}))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        db.session.add(rule)
+        db.session.commit()
+        return jsonify(rule.to_dict()), 201
+    
+    @app.route('/api/alerts/rules/<int:rule_id>', methods=['PUT'])
+    def update_alert_rule(rule_id):
+        """修改告警规则，未提供的字段保持不变"""
+        rule = db.session.get(AlertRule, rule_id)
+        if not rule:
+            return jsonify({'error': '规则不存在'}), 404
+        try:
+            values = validate_rule(request.json or {}, rule)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        for key, value in values.items():
+            setattr(rule, key, value)
+        db.session.commit()
+        return jsonify(rule.to_dict())
+    
+    @app.route('/api/alerts/rules/<int:rule_id>', methods=['DELETE'])
+    def delete_alert_rule(rule_id):
+        """删除告警规则，已触发的记录保留"""
+        rule = db.session.get(AlertRule, rule_id)
+        if not rule:
+            return jsonify({'error': '规则不存在'}), 404
+        db.session.delete(rule)
+        db.session.commit()
+        return jsonify({'message': '规则已删除'})
+    
+    @app.route('/api/alerts/events', methods=['GET'])
+    def get_alert_events():
+        """按id顺序读取告警触发记录
+        
+        查询参数:
+            since_id: 只返回id大于该值的记录，默认0
+            limit: 最多返回的记录数，默认100，最大1000
+            rule_id: 只返回指定规则的记录
+        """
+        since_id = request.args.get('since_id', 0, type=int)
+        limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+        query = AlertEvent.query.filter(AlertEvent.id > since_id)
+        rule_id = request.args.get('rule_id', type=int)
+        if rule_id:
+            query = query.filter(AlertEvent.rule_id == rule_id)
+        events = query.order_by(AlertEvent.id).limit(limit).all()
+        return jsonify({
+            'events': [event.to_dict() for event in events],
+            'next_since_id': events[-1].id if events else since_id,
+        })
+    
     @app.route('/api/config', methods=['GET'])
     def get_config():
         """获取配置信息"""
@@ -227,9 +925,6 @@ def create_app(db_path=None):
     @app.route('/api/export', methods=['GET'])
     def export_data():
         """导出所有数据为JSON或CSV"""
-        videos = Video.query.all()
-        data = [video.to_dict() for video in videos]
-        
         # 检查是否要求CSV格式
         format_type = request.args.get('format', 'json')
         
@@ -241,14 +936,11 @@ def create_app(db_path=None):
             si = StringIO()
             csv_writer = csv.writer(si)
             
-            # 写入表头
-            if data:
-                headers = data[0].keys()
-                csv_writer.writerow(headers)
-                
-                # 写入数据行
-                for video in data:
-                    csv_writer.writerow(video.values())
+            # 写入表头和数据行，直接使用列元组
+            rows = video_rows()
+            if rows:
+                csv_writer.writerow(VIDEO_FIELDS)
+                csv_writer.writerows(rows)
             
             output = si.getvalue()
             
@@ -261,7 +953,7 @@ def create_app(db_path=None):
             )
         
         # 默认返回JSON
-        return jsonify(data)
+        return stream_json(iter_video_json())
 
     @app.route('/api/image-proxy', methods=['GET'])
     def image_proxy():
@@ -279,11 +971,16 @@ def create_app(db_path=None):
                 # 'Cookie': 'your_cookie_here'
             }
 
-            # 请求原始图片
-            resp = requests.get(image_url, headers=headers, stream=True)
+            # 请求原始图片，带超时、重试和熔断
+            def send(timeout):
+                resp = requests.get(image_url, headers=headers, timeout=timeout)
+                if resp.status_code >= 500 or resp.status_code == 429:
+                    raise TransientError(f"HTTP {resp.status_code}", resp.status_code)
+                return resp
+            resp = get_upstream('image', timeout=10).call(send)
 
             # 创建响应
-            response = make_response(resp.raw.read())
+            response = make_response(resp.content)
             response.headers['Content-Type'] = resp.headers['Content-Type']
 
             # 设置缓存头（可选）
@@ -296,6 +993,81 @@ def create_app(db_path=None):
             return jsonify({'error': '图片加载失败'}), 500
     
     # ViewSight视频播放量预测相关路由
+    def _local_prediction(bvid):
+        """用本地模型预测，模型未训练或取不到视频数据时返回None"""
+        model = predictor_store().model
+        if model is None:
+            return None
+        video = Video.query.filter_by(bvid=bvid).first()
+        video_data = video.to_dict() if video else crawler.process_video(bvid)
+        return model.predict_video(video_data) if video_data else None
+    
+    def _run_prediction(bvid, source):
+        """按指定来源预测播放量
+        
+        Args:
+            bvid: 视频BV号
+            source: auto(优先ViewSight，失败时用本地模型)、local 或 viewsight
+        
+        Returns:
+            预测结果字典
+        """
+        if source == 'local':
+            result = _local_prediction(bvid)
+            if result is None:
+                raise Exception('本地预测模型尚未训练或无法获取视频数据')
+            return result
+        
+        try:
+            result = ViewSightClient().predict_video_views(bvid)
+        except Exception as e:
+            if source == 'viewsight':
+                raise
+            local_result = _local_prediction(bvid)
+            if local_result is None:
+                raise
+            local_result['viewsight_error'] = str(e)
+            return local_result
+        
+        result['source'] = 'viewsight'
+        local_result = _local_prediction(bvid)
+        if local_result:
+            # 附带本地估计并记录，用于评估本地模型
+            result['local_estimate'] = local_result['predicted_play_count']
+            db.session.add(PredictionComparison(
+                bvid=bvid,
+                local_prediction=local_result['predicted_play_count'],
+                viewsight_prediction=int(result.get('predicted_play_count') or 0)
+            ))
+            db.session.commit()
+        return result
+    
+    def _prediction_response(bvid, source, callback_url=None, force=False):
+        """提交预测并立即返回
+        
+        本地模型预测很快，直接返回结果；其他来源提交到任务队列，
+        已有完成的结果时返回200和结果，否则返回202和任务信息，
+        客户端轮询 Location 指向的任务接口或等待回调
+        """
+        if source not in PREDICTION_SOURCES:
+            return jsonify({'error': f"无效的预测来源: {source}，可选 {', '.join(PREDICTION_SOURCES)}"}), 400
+        
+        if source == 'local':
+            return jsonify(_run_prediction(bvid, source))
+        
+        if callback_url and not callback_url.startswith(('http://', 'https://')):
+            return jsonify({'error': 'callback_url 必须是 http(s) 地址'}), 400
+        
+        job = submit_job(bvid, source, callback_url, force)
+        if job.status == PredictionJob.DONE:
+            return jsonify(dict(json.loads(job.result), job_id=job.id))
+        
+        prediction_pool.notify()
+        response = jsonify({'message': '预测任务已提交，请稍后查询结果', 'job': job.to_dict()})
+        response.status_code = 202
+        response.headers['Location'] = url_for('get_prediction_job', job_id=job.id)
+        return response
+    
     @app.route('/api/predict/<bvid>', methods=['GET'])
     def predict_video(bvid):
         """预测视频播放量
@@ -303,19 +1075,70 @@ def create_app(db_path=None):
         Args:
             bvid: 视频BV号
         
+        查询参数:
+            source: auto(默认)、local 或 viewsight
+            callback_url: 任务结束后POST任务信息的地址
+            force: 为1时不复用最近的预测结果
+        
         Returns:
-            预测结果
+            预测结果(200)，或已排队的预测任务(202)
         """
         try:
-            # 初始化ViewSight客户端
-            viewsight_client = ViewSightClient()
-            
-            # 预测视频播放量
-            prediction_result = viewsight_client.predict_video_views(bvid)
-            
-            return jsonify(prediction_result)
+            return _prediction_response(bvid, request.args.get('source', 'auto'),
+                                        request.args.get('callback_url'), request.args.get('force') == '1')
         except Exception as e:
             return jsonify({'error': str(e)}), 500
+    
+    @app.route('/api/predict/jobs', methods=['POST'])
+    def create_prediction_job():
+        """提交预测任务
+        
+        请求体:
+            bvid: 视频BV号
+            source: auto(默认)、local 或 viewsight
+            callback_url: 任务结束后POST任务信息的地址
+            force: 为true时不复用最近的预测结果
+        """
+        data = request.json or {}
+        bvid = data.get('bvid')
+        if not bvid:
+            return jsonify({'error': '缺少 bvid'}), 400
+        try:
+            return _prediction_response(bvid, data.get('source', 'auto'), data.get('callback_url'), bool(data.get('force')))
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+    
+    @app.route('/api/predict/jobs/<int:job_id>', methods=['GET'])
+    def get_prediction_job(job_id):
+        """查询预测任务状态，完成后包含预测结果"""
+        job = db.session.get(PredictionJob, job_id)
+        if not job:
+            return jsonify({'error': f'预测任务 {job_id} 不存在'}), 404
+        return jsonify(job.to_dict())
+
+    @app.route('/api/predictor', methods=['GET'])
+    def get_predictor():
+        """获取本地预测模型信息及与ViewSight的对比准确度"""
+        from .predictor import comparison_accuracy
+        model = predictor_store().model
+        comparisons = db.session.query(
+            PredictionComparison.local_prediction, PredictionComparison.viewsight_prediction
+        ).filter(PredictionComparison.viewsight_prediction > 0).all()
+        
+        return jsonify({
+            'trained': model is not None,
+            'metrics': model.metrics if model else None,
+            'accuracy_vs_viewsight': comparison_accuracy(comparisons)
+        })
+
+    @app.route('/api/predictor/train', methods=['POST'])
+    def train_predictor():
+        """用已跟踪视频的计数采样重新训练本地预测模型"""
+        try:
+            model = predictor_store().train()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify({'message': '本地预测模型训练完成', 'metrics': model.metrics})
 
     @app.route('/api/config/viewsight', methods=['GET'])
     def get_viewsight_config():
@@ -342,7 +1165,9 @@ def create_app(db_path=None):
                     Config(key='viewsight_token', value='', 
                            description='ViewSight API令牌'),
                     Config(key='viewsight_model', value='', 
-                           description='ViewSight分析模型名称')
+                           description='ViewSight分析模型名称'),
+                    Config(key='viewsight_timeout_seconds', value='60',
+                           description='ViewSight预测请求的超时（秒），请求头 X-Request-Timeout 更短时以其为准')
                 ]
                 
                 for config in default_configs:
@@ -392,22 +1217,23 @@ def create_app(db_path=None):
         Args:
             bvid: 视频BV号
         
+        查询参数:
+            source: auto(默认)、local 或 viewsight
+            callback_url: 任务结束后POST任务信息的地址
+            force: 为1时不复用最近的预测结果
+        
         Returns:
-            该视频的播放量预测结果
+            该视频的播放量预测结果(200)，或已排队的预测任务(202)
         """
         try:
-            # 初始化ViewSight客户端
-            viewsight_client = ViewSightClient()
-            
             # 检查视频是否存在
             video = Video.query.filter_by(bvid=bvid).first()
             if not video:
                 return jsonify({'error': f'未找到视频 {bvid}'}), 404
                 
             # 预测视频播放量
-            prediction_result = viewsight_client.predict_video_views(bvid)
-            
-            return jsonify(prediction_result)
+            return _prediction_response(bvid, request.args.get('source', 'auto'),
+                                        request.args.get('callback_url'), request.args.get('force') == '1')
         except Exception as e:
             return jsonify({'error': str(e)}), 500
 
@@ -415,10 +1241,10 @@ def create_app(db_path=None):
     @app.route('/', defaults={'path': ''})
     @app.route('/<path:path>')
     def serve(path):
-        """服务前端静态文件"""
-        if path != "" and os.path.exists(os.path.join(app.static_folder, path)):
-            return send_from_directory(app.static_folder, path)
-        else:
-            return send_from_directory(app.static_folder, 'index.html')
+        """服务前端静态文件，未知路径返回 index.html 交给前端路由"""
+        response = static_manifest.response(path)
+        if response is None:
+            return jsonify({'error': '前端尚未构建，请先在 frontend 目录执行 npm run build'}), 404
+        return response
     
     return app
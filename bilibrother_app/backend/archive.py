@@ -0,0 +1,403 @@
+"""
+上游原始响应归档
+爬虫每次实际请求 wbi/view 和 card 接口后，把完整的响应数据逐条压缩追加到分段文件，
+并在独立的SQLite索引中记录 (类型, BV号或UP主ID, 抓取时间, 分段, 偏移, 长度)。
+需要新字段（如发布时间、标签、荣誉）时，用 reprocess 命令从归档重新提取并写入
+video 表，按文件顺序读取，不发出网络请求。
+
+优先使用zstd压缩（需要安装 zstandard），未安装时退回zlib；编码记录在分段文件的
+扩展名中，两种分段可以共存。每个进程写入自己的分段文件，多个worker可以共用一个归档目录。
+
+用法:
+    python -m bilibrother_app.backend.archive stats
+    python -m bilibrother_app.backend.archive show BV1xx411c7mD
+    python -m bilibrother_app.backend.archive reprocess --fields pubdate,duration
+"""
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from datetime import datetime
+
+from .crawler import video_record_from_response
+from .models import db, Video, ChangeSummary, record_changes
+
+try:
+    import orjson
+except ImportError:  # 未安装时退回标准库json
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:  # 未安装时使用zlib
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# 归档的响应类型
+VIEW = 'view'
+CARD = 'card'
+
+# 单个分段文件的大小上限（字节），超过后新建分段
+SEGMENT_BYTES = 64 * 1024 * 1024
+
+# 压缩级别
+ZSTD_LEVEL = 6
+ZLIB_LEVEL = 6
+
+# 重新提取时每批写入数据库的视频数
+REPROCESS_BATCH_SIZE = 500
+
+# 重新提取默认写入的列: 元数据列。归档中的计数通常比数据库中的旧，需要时用 fields 指定
+REPROCESS_FIELDS = tuple(field for field in Video.TRACKED_FIELDS if field not in Video.COUNTER_FIELDS)
+
+_INDEX_NAME = 'index.db'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS response (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    segment TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL
+)
+"""
+
+# 每个键最新的一条响应，按文件位置排序以便顺序读取
+_LATEST_SQL = """
+SELECT key, fetched_at, segment, offset, length FROM response
+WHERE id IN (SELECT max(id) FROM response WHERE kind = ? {where} GROUP BY key)
+ORDER BY segment, offset
+"""
+
+
+def _encode(payload):
+    return orjson.dumps(payload) if orjson is not None else json.dumps(payload, ensure_ascii=False).encode('utf-8')
+
+
+def _decode(data):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+class _ZstdCodec:
+    extension = '.zst'
+
+    def __init__(self):
+        self.compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL) if zstandard is not None else None
+        self.decompressor = zstandard.ZstdDecompressor() if zstandard is not None else None
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def decompress(self, data):
+        if self.decompressor is None:
+            raise RuntimeError('读取 .zst 分段需要安装 zstandard')
+        return self.decompressor.decompress(data)
+
+
+class _ZlibCodec:
+    extension = '.zlib'
+
+    def compress(self, data):
+        return zlib.compress(data, ZLIB_LEVEL)
+
+    def decompress(self, data):
+        return zlib.decompress(data)
+
+
+_CODECS = {codec.extension: codec for codec in (_ZstdCodec(), _ZlibCodec())}
+
+
+class ResponseArchive:
+    """原始响应的追加写归档，线程安全，fork之后在子进程中自动使用新的分段和连接"""
+
+    def __init__(self, directory, segment_bytes=SEGMENT_BYTES):
+        """
+        Args:
+            directory: 归档目录，包含分段文件和索引数据库
+            segment_bytes: 单个分段文件的大小上限（字节）
+        """
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.codec = _CODECS['.zst' if zstandard is not None else '.zlib']
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._segment = None
+        self._segment_pid = None
+        self._sequence = 0
+        self.written = 0
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(_SCHEMA)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_response_key ON response (kind, key, fetched_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_response_fetched_at ON response (fetched_at)")
+
+    def _connect(self):
+        """当前线程的索引连接，fork之后重新建立"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(os.path.join(self.directory, _INDEX_NAME), timeout=30,
+                                   isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _open_segment(self):
+        """当前进程正在写入的分段，超过大小上限或fork之后新建（调用方持有锁）"""
+        pid = os.getpid()
+        if self._segment is not None and self._segment_pid == pid and self._segment.tell() < self.segment_bytes:
+            return self._segment
+        if self._segment is not None and self._segment_pid == pid:
+            self._segment.close()
+        # 文件名包含时间、进程号和序号，多个进程写入各自的分段，已存在的文件不会被追加
+        self._sequence = self._sequence + 1 if self._segment_pid == pid else 1
+        name = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{pid}-{self._sequence}{self.codec.extension}"
+        self._segment = open(os.path.join(self.directory, name), 'xb')
+        self._segment_pid = pid
+        return self._segment
+
+    def append(self, kind, key, payload, fetched_at=None):
+        """追加一条响应，写入失败只记录日志，不影响抓取
+
+        Args:
+            kind: 响应类型，VIEW 或 CARD
+            key: BV号或UP主ID
+            payload: 响应中的 data 字段
+            fetched_at: 抓取时间（Unix时间戳），默认当前时间
+        """
+        fetched_at = fetched_at or time.time()
+        try:
+            frame = self.codec.compress(_encode(payload))
+            with self._lock:
+                segment = self._open_segment()
+                offset = segment.tell()
+                segment.write(frame)
+                # 先写入数据再写索引，进程崩溃时最多留下没有索引的数据
+                segment.flush()
+                self._connect().execute(
+                    "INSERT INTO response (kind, key, fetched_at, segment, offset, length) VALUES (?, ?, ?, ?, ?, ?)",
+                    (kind, str(key), fetched_at, os.path.basename(segment.name), offset, len(frame))
+                )
+                self.written += 1
+        except Exception as e:
+            logger.error(f"归档{kind}响应{key}时出错: {str(e)}")
+
+    def _read_entries(self, entries):
+        """按索引行读取并解码响应
+
+        Args:
+            entries: (键, 抓取时间, 分段, 偏移, 长度) 序列，按分段和偏移排序时顺序读取每个文件
+
+        Yields:
+            (键, 抓取时间, 响应数据)
+        """
+        current, handle = None, None
+        try:
+            for key, fetched_at, segment, offset, length in entries:
+                if segment != current:
+                    if handle is not None:
+                        handle.close()
+                    current, handle = segment, open(os.path.join(self.directory, segment), 'rb')
+                if handle.tell() != offset:
+                    handle.seek(offset)
+                codec = _CODECS[os.path.splitext(segment)[1]]
+                yield key, fetched_at, _decode(codec.decompress(handle.read(length)))
+        finally:
+            if handle is not None:
+                handle.close()
+
+    def history(self, kind, key, since=None):
+        """某个视频或UP主的所有归档响应
+
+        Returns:
+            [(抓取时间, 响应数据)]，按时间排序
+        """
+        rows = self._connect().execute(
+            "SELECT key, fetched_at, segment, offset, length FROM response "
+            "WHERE kind = ? AND key = ? AND fetched_at >= ? ORDER BY fetched_at",
+            (kind, str(key), since or 0)
+        ).fetchall()
+        return [(fetched_at, payload) for _, fetched_at, payload in self._read_entries(rows)]
+
+    def iter_latest(self, kind, keys=None, since=None):
+        """每个键最新的一条响应，按文件顺序读取
+
+        Args:
+            kind: 响应类型
+            keys: 只读取这些键，默认全部
+            since: 只读取该时间（Unix时间戳）之后抓取的响应
+
+        Yields:
+            (键, 抓取时间, 响应数据)
+        """
+        where, params = '', [kind]
+        if since:
+            where += ' AND fetched_at >= ?'
+            params.append(since)
+        if keys is not None:
+            keys = [str(key) for key in keys]
+            if not keys:
+                return
+            where += f" AND key IN ({', '.join('?' * len(keys))})"
+            params.extend(keys)
+        rows = self._connect().execute(_LATEST_SQL.format(where=where), params)
+        yield from self._read_entries(rows)
+
+    def stats(self):
+        """归档的响应数、分段数和磁盘占用"""
+        counts = dict(self._connect().execute("SELECT kind, count(*) FROM response GROUP BY kind").fetchall())
+        segments = [name for name in os.listdir(self.directory) if os.path.splitext(name)[1] in _CODECS]
+        return {
+            'directory': self.directory,
+            'codec': self.codec.extension.lstrip('.'),
+            'responses': counts,
+            'segments': len(segments),
+            'bytes': sum(os.path.getsize(os.path.join(self.directory, name)) for name in segments),
+            'written': self.written,
+        }
+
+    def close(self):
+        """关闭当前进程的分段文件"""
+        with self._lock:
+            if self._segment is not None and self._segment_pid == os.getpid():
+                self._segment.close()
+            self._segment = None
+
+
+def _apply_records(records, fields, missing_only, summary):
+    """把一批重新提取的记录写入已存在的视频（不提交）
+
+    Returns:
+        数据库中不存在的视频数
+    """
+    existing = {video.bvid: video for video in Video.query.filter(Video.bvid.in_(list(records))).all()}
+    changes = []
+    for bvid, record in records.items():
+        video = existing.get(bvid)
+        if video is None:
+            continue
+        values = {field: value for field, value in Video.tracked_values(record).items() if field in fields}
+        if missing_only:
+            values = {field: value for field, value in values.items() if getattr(video, field) in (None, '', 0)}
+        mask = video.apply_changes(values)
+        changes.append((video.id, mask))
+        summary.add(mask)
+    record_changes(changes)
+    return len(records) - len(existing)
+
+
+def reprocess(archive, fields=REPROCESS_FIELDS, bvids=None, since=None, missing_only=False,
+              batch_size=REPROCESS_BATCH_SIZE):
+    """从归档的 wbi/view 响应重新提取视频列并写入数据库（逐批提交）
+
+    只更新数据库中已存在的视频，使用每个视频最新的归档响应；有变化的列记入 video_change，
+    不写入计数采样，也不修改 last_updated
+
+    Args:
+        archive: ResponseArchive
+        fields: 要写入的列，取自 Video.TRACKED_FIELDS
+        bvids: 只处理这些视频，默认全部
+        since: 只使用该时间（Unix时间戳）之后抓取的响应
+        missing_only: 只填充当前为空或0的列
+        batch_size: 每批提交的视频数
+
+    Returns:
+        ChangeSummary.to_dict() 加上 read（读取的响应数）和 missing（数据库中不存在的视频数）
+    """
+    summary = ChangeSummary()
+    read = missing = 0
+    batch = {}
+    for bvid, fetched_at, payload in archive.iter_latest(VIEW, keys=bvids, since=since):
+        read += 1
+        # 与抓取时一样跳过没有UP主的响应
+        if not payload.get('owner', {}).get('mid'):
+            continue
+        # 只写入视频列，不需要读取UP主的 card 响应
+        batch[bvid] = video_record_from_response(bvid, payload, {}, fetched_at)
+        if len(batch) >= batch_size:
+            missing += _apply_records(batch, fields, missing_only, summary)
+            db.session.commit()
+            batch = {}
+    if batch:
+        missing += _apply_records(batch, fields, missing_only, summary)
+        db.session.commit()
+    return {**summary.to_dict(), 'read': read, 'missing': missing}
+
+
+def open_archive(directory, base_dir=None):
+    """按配置的目录打开归档，目录为空时不启用
+
+    Args:
+        directory: 归档目录，相对路径相对于 base_dir
+        base_dir: 数据目录
+
+    Returns:
+        ResponseArchive，未启用时为None
+    """
+    if not directory:
+        return None
+    if base_dir and not os.path.isabs(directory):
+        directory = os.path.join(base_dir, directory)
+    return ResponseArchive(directory)
+
+
+def main(argv=None):
+    """命令行入口: stats 查看归档、show 输出某个视频的历史响应、reprocess 从归档重新提取视频列"""
+    parser = argparse.ArgumentParser(prog='python -m bilibrother_app.backend.archive',
+                                     description='上游原始响应归档')
+    parser.add_argument('--db', help='数据库文件路径，默认使用应用的数据库')
+    parser.add_argument('--archive', help='归档目录，默认使用应用配置的 raw_archive_dir')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('stats', help='查看归档状态')
+    show_parser = commands.add_parser('show', help='以NDJSON输出某个视频（或 --card 时某个UP主）的历史响应')
+    show_parser.add_argument('key', help='BV号或UP主ID')
+    show_parser.add_argument('--card', action='store_true', help='输出UP主的card响应')
+    reprocess_parser = commands.add_parser('reprocess', help='从归档重新提取视频列写入数据库')
+    reprocess_parser.add_argument('bvids', nargs='*', help='只处理这些视频，默认全部')
+    reprocess_parser.add_argument('--fields', default=','.join(REPROCESS_FIELDS),
+                                  help=f"要写入的列，逗号分隔，可选 {','.join(Video.TRACKED_FIELDS)}")
+    reprocess_parser.add_argument('--since', type=float, help='只使用该Unix时间之后抓取的响应')
+    reprocess_parser.add_argument('--missing-only', action='store_true', help='只填充当前为空或0的列')
+    reprocess_parser.add_argument('--batch-size', type=int, default=REPROCESS_BATCH_SIZE, help='每批提交的视频数')
+    args = parser.parse_args(argv)
+    if args.command == 'reprocess':
+        fields = tuple(field.strip() for field in args.fields.split(',') if field.strip())
+        unknown = [field for field in fields if field not in Video.TRACKED_FIELDS]
+        if unknown:
+            print(f"未知的列: {', '.join(unknown)}", file=sys.stderr)
+            return 2
+
+    from .api import create_app
+
+    app = create_app(args.db, start_background=False)
+    archive = ResponseArchive(args.archive) if args.archive else app.extensions['bilibrother'].crawler.archive
+    if archive is None:
+        print("未配置归档目录，请使用 --archive 或设置 raw_archive_dir", file=sys.stderr)
+        return 2
+
+    if args.command == 'stats':
+        print(archive.stats())
+    elif args.command == 'show':
+        for fetched_at, payload in archive.history(CARD if args.card else VIEW, args.key):
+            print(json.dumps({'fetched_at': fetched_at, 'data': payload}, ensure_ascii=False))
+    else:
+        started = time.perf_counter()
+        with app.app_context():
+            result = reprocess(archive, fields, args.bvids or None, args.since, args.missing_only,
+                               max(args.batch_size, 1))
+        result['seconds'] = round(time.perf_counter() - started, 2)
+        print(json.dumps(result, ensure_ascii=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,293 @@
+"""
+基于租约的分布式抓取队列
+待抓取的视频写入 crawl_task 表，任意数量的工作进程（同一台机器，或通过共享的数据库
+文件在多台机器上）用单条UPDATE原子地批量领取任务并持有租约，后台线程定期续约，
+抓取结果写回 video 表。进程退出或崩溃后租约过期，任务自动回到队列由其他进程领取。
+
+SQLite依赖文件锁保证领取的原子性，多台机器共享时需要文件系统支持可靠的锁。
+
+用法:
+    python -m bilibrother_app.backend.crawl_queue enqueue bvids.txt
+    python -m bilibrother_app.backend.crawl_queue worker --threads 2
+    python -m bilibrother_app.backend.crawl_queue stats
+"""
+import argparse
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from sqlalchemy import func, text
+from sqlalchemy.exc import IntegrityError
+
+from .models import db, CrawlTask, save_video_results
+
+logger = logging.getLogger(__name__)
+
+# 租约时长（秒），续约间隔为其三分之一
+LEASE_SECONDS = 120
+
+# 每次领取的任务数
+BATCH_SIZE = 20
+
+# 单个视频最多尝试次数，失败后按指数退避重新排队
+MAX_ATTEMPTS = 5
+RETRY_BASE_SECONDS = 60
+
+# 队列为空时的等待间隔（秒）
+IDLE_SECONDS = 5
+
+_CLAIM_SQL = text(f"""
+    UPDATE crawl_task
+    SET status = '{CrawlTask.LEASED}', lease_owner = :owner, lease_until = :lease_until, attempts = attempts + 1
+    WHERE id IN (
+        SELECT id FROM crawl_task
+        WHERE (status = '{CrawlTask.QUEUED}' AND available_at <= :now)
+           OR (status = '{CrawlTask.LEASED}' AND lease_until <= :now)
+        ORDER BY available_at, id LIMIT :limit
+    )
+""")
+
+# 已完成或失败的任务重新入队，排队中和租约中的任务保持不变
+_ENQUEUE_SQL = text(f"""
+    INSERT INTO crawl_task (bvid, status, attempts, available_at, enqueued_at)
+    VALUES (:bvid, '{CrawlTask.QUEUED}', 0, 0, :now)
+    ON CONFLICT (bvid) DO UPDATE SET
+        status = '{CrawlTask.QUEUED}', attempts = 0, available_at = 0, last_error = NULL,
+        enqueued_at = excluded.enqueued_at, finished_at = NULL
+    WHERE crawl_task.status IN ('{CrawlTask.DONE}', '{CrawlTask.FAILED}')
+""")
+
+
+def enqueue(bvids):
+    """把视频加入抓取队列（提交）
+
+    Args:
+        bvids: BV号序列
+
+    Returns:
+        新入队或重新入队的视频数
+    """
+    rows = [{'bvid': bvid, 'now': datetime.now()} for bvid in dict.fromkeys(bvids)]
+    if not rows:
+        return 0
+    result = db.session.execute(_ENQUEUE_SQL, rows)
+    db.session.commit()
+    return result.rowcount
+
+
+def queue_stats():
+    """按状态统计任务数，以及租约已过期等待重新领取的任务数"""
+    counts = dict(db.session.query(CrawlTask.status, func.count()).group_by(CrawlTask.status).all())
+    counts['expired_leases'] = CrawlTask.query.filter(
+        CrawlTask.status == CrawlTask.LEASED, CrawlTask.lease_until <= int(time.time())
+    ).count()
+    return counts
+
+
+def claim(owner, limit=BATCH_SIZE):
+    """原子地领取一批可抓取的任务（提交）
+
+    Args:
+        owner: 工作进程标识
+        limit: 最多领取的任务数
+
+    Returns:
+        领取到的BV号列表
+    """
+    now = int(time.time())
+    db.session.execute(_CLAIM_SQL, {'owner': owner, 'lease_until': now + LEASE_SECONDS, 'now': now, 'limit': limit})
+    db.session.commit()
+    return [row.bvid for row in db.session.query(CrawlTask.bvid).filter_by(
+        status=CrawlTask.LEASED, lease_owner=owner).all()]
+
+
+def renew(owner):
+    """延长该工作进程持有的所有租约（提交）"""
+    updated = CrawlTask.query.filter_by(status=CrawlTask.LEASED, lease_owner=owner).update(
+        {'lease_until': int(time.time()) + LEASE_SECONDS}, synchronize_session=False)
+    db.session.commit()
+    return updated
+
+
+def complete(owner, done, failed, error=None):
+    """记录一批任务的结果（提交），租约已被其他进程接管的任务不修改
+
+    失败的任务按指数退避重新排队，超过 MAX_ATTEMPTS 后标记为失败
+
+    Args:
+        owner: 工作进程标识
+        done: 成功的BV号列表
+        failed: 失败的BV号列表
+        error: 失败原因
+    """
+    now = datetime.now()
+    owned = (CrawlTask.status == CrawlTask.LEASED, CrawlTask.lease_owner == owner)
+    if done:
+        CrawlTask.query.filter(CrawlTask.bvid.in_(done), *owned).update({
+            'status': CrawlTask.DONE, 'lease_owner': None, 'lease_until': None,
+            'last_error': None, 'finished_at': now,
+        }, synchronize_session=False)
+    if failed:
+        tasks = CrawlTask.query.filter(CrawlTask.bvid.in_(failed), *owned).all()
+        for task in tasks:
+            task.lease_owner = None
+            task.lease_until = None
+            task.last_error = error
+            if task.attempts >= MAX_ATTEMPTS:
+                task.status = CrawlTask.FAILED
+                task.finished_at = now
+            else:
+                task.status = CrawlTask.QUEUED
+                task.available_at = int(time.time()) + RETRY_BASE_SECONDS * 2 ** (task.attempts - 1)
+    db.session.commit()
+
+
+def release(owner):
+    """退出前把持有的任务放回队列（提交），不计入尝试次数"""
+    CrawlTask.query.filter_by(status=CrawlTask.LEASED, lease_owner=owner).update({
+        'status': CrawlTask.QUEUED, 'lease_owner': None, 'lease_until': None,
+        'attempts': CrawlTask.attempts - 1,
+    }, synchronize_session=False)
+    db.session.commit()
+
+
+class CrawlWorker:
+    """抓取队列的工作进程: 领取一批、抓取、写回，循环执行"""
+
+    def __init__(self, app, crawler, batch_size=BATCH_SIZE, threads=2):
+        """
+        Args:
+            app: Flask应用实例，提供数据库连接
+            crawler: BiliCrawler 实例
+            batch_size: 每次领取的任务数
+            threads: 抓取一批时的并发线程数
+        """
+        self.app = app
+        self.crawler = crawler
+        self.batch_size = batch_size
+        self.threads = threads
+        self.owner = f'{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self.stop_event = threading.Event()
+        self.succeeded = 0
+        self.failed = 0
+
+    def _heartbeat(self):
+        """后台续约线程"""
+        while not self.stop_event.wait(LEASE_SECONDS / 3):
+            try:
+                with self.app.app_context():
+                    renew(self.owner)
+            except Exception as e:
+                logger.error(f"续约失败: {str(e)}")
+
+    def _save(self, results):
+        """写入抓取结果（提交），其他进程同时新建了同一UP主或视频时重试一次"""
+        try:
+            saved = save_video_results(results)
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            saved = save_video_results(results)
+            db.session.commit()
+        return saved
+
+    def run_batch(self):
+        """领取并处理一批任务
+
+        抓取或写入出错时整批按失败记录（计入尝试次数并退避），再抛出异常
+
+        Returns:
+            本批处理的任务数，队列为空时为0
+        """
+        with self.app.app_context():
+            bvids = claim(self.owner, self.batch_size)
+            if not bvids:
+                return 0
+            try:
+                results = self.crawler.batch_process_videos(bvids, max_workers=self.threads)
+                saved = set(self._save(results))
+            except Exception as e:
+                db.session.rollback()
+                complete(self.owner, [], bvids, str(e))
+                self.failed += len(bvids)
+                raise
+            failed = [bvid for bvid in bvids if bvid not in saved]
+            complete(self.owner, list(saved), failed, '抓取失败' if failed else None)
+        self.succeeded += len(saved)
+        self.failed += len(failed)
+        return len(bvids)
+
+    def run(self, once=False):
+        """循环处理任务，直到 stop() 或（once 为真时）队列为空
+
+        Args:
+            once: 队列为空时退出，而不是等待新任务
+        """
+        heartbeat = threading.Thread(target=self._heartbeat, name='crawl-lease-heartbeat', daemon=True)
+        heartbeat.start()
+        logger.info(f"抓取工作进程 {self.owner} 启动")
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    if self.run_batch():
+                        continue
+                except Exception as e:
+                    # 本批任务已在 run_batch 中按失败退避，不能在这里放回队列，
+                    # 否则每次出错的批次都不计入尝试次数，会被立即重新领取
+                    logger.error(f"处理抓取任务出错: {str(e)}")
+                if once:
+                    break
+                self.stop_event.wait(IDLE_SECONDS)
+        finally:
+            self.stop_event.set()
+            with self.app.app_context():
+                release(self.owner)
+            logger.info(f"抓取工作进程 {self.owner} 退出: 成功 {self.succeeded}, 失败 {self.failed}")
+
+    def stop(self):
+        """处理完当前批次后退出"""
+        self.stop_event.set()
+
+
+def main(argv=None):
+    """命令行入口: enqueue 入队、worker 运行工作进程、stats 查看队列"""
+    parser = argparse.ArgumentParser(prog='python -m bilibrother_app.backend.crawl_queue',
+                                     description='分布式抓取队列')
+    parser.add_argument('--db', help='数据库文件路径，默认使用应用的数据库')
+    commands = parser.add_subparsers(dest='command', required=True)
+    enqueue_parser = commands.add_parser('enqueue', help='把BV号加入队列')
+    enqueue_parser.add_argument('input', nargs='?', default='-', help='BV号列表文件，- 表示标准输入')
+    worker_parser = commands.add_parser('worker', help='运行抓取工作进程')
+    worker_parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='每次领取的任务数')
+    worker_parser.add_argument('--threads', type=int, default=2, help='每批的并发线程数')
+    worker_parser.add_argument('--once', action='store_true', help='队列为空时退出')
+    commands.add_parser('stats', help='查看队列状态')
+    args = parser.parse_args(argv)
+
+    from .api import create_app
+    from .crawler import read_bvids
+
+    app = create_app(args.db, start_background=False)
+    if args.command == 'enqueue':
+        source = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8')
+        with source, app.app_context():
+            print(f"入队 {enqueue(read_bvids(source))} 个视频")
+    elif args.command == 'stats':
+        with app.app_context():
+            print(queue_stats())
+    else:
+        worker = CrawlWorker(app, app.extensions['bilibrother'].crawler, args.batch_size, args.threads)
+        try:
+            worker.run(once=args.once)
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
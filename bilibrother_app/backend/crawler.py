@@ -1,14 +1,26 @@
 """
 B站视频数据爬虫模块，基于原始的bilibrother.py重构
+
+也可以脱离Flask应用在命令行中批量抓取:
+    python -m bilibrother_app.backend.crawler bvids.txt -o videos.ndjson
 """
 import requests
 import time
 import json
 import hashlib
 import logging
-from datetime import datetime
-from threading import Lock
-from concurrent.futures import ThreadPoolExecutor
+import argparse
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from .shared_cache import MemoryCache
+from .records import AuthorRecord, StatRecord, VideoRecord
+from .resilience import (
+    RETRYABLE_STATUS, TransientError, get_upstream, is_retryable, submit_with_context, timeout_for
+)
+from .scheduler import LANES, REQUEST_RATE, get_scheduler
 
 # 配置日志系统
 logging.basicConfig(
@@ -27,23 +39,92 @@ DEFAULT_HEADERS = {
     'Referer': 'https://www.bilibili.com/'  # Referer 用于告诉服务器请求来源
 }
 
-# 缓存 WBI 参数，避免频繁请求
-_wbi_cache = {
-    "params": None,
-    "expiry": 0,
-    "lock": Lock()
-}
+# 上游响应的缓存时间（秒）: WBI参数、视频详情、视频计数、UP主名片
+WBI_CACHE_TTL = 1800
+VIEW_CACHE_TTL = 60
+STAT_CACHE_TTL = 60
+CARD_CACHE_TTL = 600
+
+# 未指定共享缓存的爬虫实例共用的进程内缓存
+_default_cache = MemoryCache()
+
+# 单次请求的超时（秒）
+REQUEST_TIMEOUT = 10
+
+# B站表示请求过于频繁或服务繁忙的HTTP状态码和业务码，退避后重试
+BILIBILI_RETRYABLE_STATUS = RETRYABLE_STATUS
+BILIBILI_TRANSIENT_CODES = frozenset({-509, -799})
+
+# B站风控拦截的HTTP状态码和业务码: 计入熔断器使后续请求暂停，但不重试，短时间内重试只会延长拦截
+BILIBILI_BLOCKED_STATUS = 412
+BILIBILI_BLOCKED_CODE = -412
+
+
+class RequestBlocked(TransientError):
+    """请求被B站风控拦截（HTTP 412 或业务码 -412）"""
+
+
+def _is_retryable(error):
+    """B站请求的可重试判断: 被风控拦截时不重试，其余同默认判断"""
+    return is_retryable(error) and not isinstance(error, RequestBlocked)
+
+
+def video_record_from_response(bvid, video_data, user_data, fetched_at):
+    """从wbi/view和card接口的响应数据提取视频记录，抓取和从归档重新提取共用
+
+    Args:
+        bvid: B站视频的BV号
+        video_data: wbi/view 响应的 data 字段
+        user_data: card 响应的 data 字段，没有时传入空字典，UP主字段取默认值
+        fetched_at: 抓取时间（Unix时间戳）
+
+    Returns:
+        VideoRecord
+    """
+    stat = video_data.get('stat', {})
+    card_data = user_data.get('card', {})
+    return VideoRecord(
+        bvid=bvid,
+        title=video_data.get('title', '未知标题'),
+        view_count=stat.get('view', 0),
+        danmaku_count=stat.get('danmaku', 0),
+        coin_count=stat.get('coin', 0),
+        like_count=stat.get('like', 0),
+        share_count=stat.get('share', 0),
+        favorite_count=stat.get('favorite', 0),
+        tname=video_data.get('tname', '未知分区'),
+        cover_url=video_data.get('pic', ''),
+        duration=video_data.get('duration', 0),
+        pubdate=video_data.get('pubdate', 0),
+        follower_count=card_data.get('fans', 0),
+        # 从user_data获取点赞和稿件数
+        historical_likes=user_data.get('like_num', 0),
+        archive_count=user_data.get('archive_count', 0),
+        mid=video_data.get('owner', {}).get('mid', ''),
+        author_name=card_data.get('name', '未知UP主'),
+        fetched_at=fetched_at
+    )
+
 
 class BiliCrawler:
     """B站视频数据爬虫类"""
     
-    def __init__(self, cookie=None):
+    def __init__(self, cookie=None, cache=None, archive=None):
         """初始化爬虫实例
         
         Args:
             cookie: B站登录Cookie
+            cache: WBI参数和上游响应的缓存，传入 SharedCache 时多个进程共享，
+                默认使用进程内缓存
+            archive: 传入 ResponseArchive 时保存视频详情和UP主信息的原始响应
         """
         self.cookie = cookie
+        self.cache = cache if cache is not None else _default_cache
+        self.archive = archive
+        # 所有B站接口共用一个熔断器，进程内的爬虫实例共享
+        self.upstream = get_upstream('bilibili', timeout=REQUEST_TIMEOUT)
+        # 所有B站请求共享速率预算，按调用方的优先级通道排队，避免频繁请求被封IP
+        self.scheduler = get_scheduler('bilibili', rate=REQUEST_RATE)
         self.headers = DEFAULT_HEADERS.copy()
         if cookie:
             self.headers['Cookie'] = cookie
@@ -63,35 +144,64 @@ class BiliCrawler:
         Returns:
             包含img_key、sub_key和时间戳的字典，失败返回None
         """
-        # 检查缓存是否有效
-        current_time = time.time()
-        with _wbi_cache["lock"]:
-            if _wbi_cache["params"] and current_time < _wbi_cache["expiry"]:
-                return _wbi_cache["params"]
+        # 缓存有效期30分钟，多个进程共享缓存时只有一个进程发起请求
+        return self.cache.get_or_compute('wbi_params', self._fetch_wbi_params, WBI_CACHE_TTL)
+
+    def _fetch_wbi_params(self):
+        """请求nav接口获取WBI参数，失败返回None"""
+        url = 'https://api.bilibili.com/x/web-interface/nav'
+        
+        try:
+            data = self._request_json(url, paced=False)
+            if data['code'] != 0:
+                logger.error(f"获取WBI参数失败: code={data['code']}, message={data.get('message', '未知错误')}")
+                return None
+
+            wbi_img = data['data']['wbi_img']
+            img_key = wbi_img['img_url'].split('/')[-1].split('.')[0]
+            sub_key = wbi_img['sub_url'].split('/')[-1].split('.')[0]
+            logger.info(f"成功获取WBI参数: img_key={img_key}, sub_key={sub_key}")
             
-            url = 'https://api.bilibili.com/x/web-interface/nav'
+            return {'img_key': img_key, 'sub_key': sub_key, 'wts': int(time.time())}
+        except Exception as e:
+            logger.error(f"获取WBI参数出错: {str(e)}")
+            return None
+
+    def _request_json(self, url, params=None, paced=True):
+        """带重试、熔断、截止时间和优先级调度的GET请求
+        
+        网络错误、限流和网关错误按指数退避加抖动重试，GET请求可以安全重试；
+        被风控拦截（412/-412）时不重试，只计入熔断器；
+        每次尝试都按当前上下文的优先级通道等待请求配额
+        
+        Args:
+            url: 接口地址
+            params: 请求参数
+            paced: 是否计入速率预算
             
-            try:
-                response = requests.get(url, headers=self.headers, timeout=10)
-                data = response.json()
-                if data['code'] != 0:
-                    logger.error(f"获取WBI参数失败: code={data['code']}, message={data.get('message', '未知错误')}")
-                    return None
-
-                wbi_img = data['data']['wbi_img']
-                img_key = wbi_img['img_url'].split('/')[-1].split('.')[0]
-                sub_key = wbi_img['sub_url'].split('/')[-1].split('.')[0]
-                logger.info(f"成功获取WBI参数: img_key={img_key}, sub_key={sub_key}")
-                
-                # 缓存参数，有效期30分钟
-                params = {'img_key': img_key, 'sub_key': sub_key, 'wts': int(current_time)}
-                _wbi_cache["params"] = params
-                _wbi_cache["expiry"] = current_time + 1800  # 30分钟
-                
-                return params
-            except Exception as e:
-                logger.error(f"获取WBI参数出错: {str(e)}")
-                return None
+        Returns:
+            解析后的JSON
+            
+        Raises:
+            请求最终失败时抛出最后一次的异常，熔断器打开时抛出 CircuitOpenError
+        """
+        def send(timeout):
+            with self.scheduler.slot(paced=paced):
+                # 排队期间可能已到截止时间
+                timeout = timeout_for(timeout)
+                response = requests.get(url, headers=self.headers, params=params, timeout=timeout)
+            if response.status_code == BILIBILI_BLOCKED_STATUS:
+                raise RequestBlocked(f"HTTP {response.status_code}", response.status_code)
+            if response.status_code in BILIBILI_RETRYABLE_STATUS:
+                raise TransientError(f"HTTP {response.status_code}", response.status_code)
+            data = response.json()
+            if data.get('code') == BILIBILI_BLOCKED_CODE:
+                raise RequestBlocked(f"code={data['code']}, message={data.get('message', '未知错误')}")
+            if data.get('code') in BILIBILI_TRANSIENT_CODES:
+                raise TransientError(f"code={data['code']}, message={data.get('message', '未知错误')}")
+            return data
+        
+        return self.upstream.call(send, retryable=_is_retryable)
 
     def generate_w_rid(self, params, img_key, sub_key):
         """生成WBI签名(w_rid)
@@ -127,7 +237,8 @@ class BiliCrawler:
     def get_video_info(self, bvid):
         """获取视频详细信息
         
-        使用wbi/view API获取视频的详细信息，包括标题、播放量、点赞数等
+        使用wbi/view API获取视频的详细信息，包括标题、播放量、点赞数等，
+        结果缓存 VIEW_CACHE_TTL 秒
         
         Args:
             bvid: B站视频的BV号
@@ -135,6 +246,10 @@ class BiliCrawler:
         Returns:
             包含视频信息的字典，失败返回None
         """
+        return self.cache.get_or_compute(f'view:{bvid}', lambda: self._fetch_video_info(bvid), VIEW_CACHE_TTL)
+
+    def _fetch_video_info(self, bvid):
+        """请求wbi/view接口，失败返回None"""
         wbi_params = self.get_wbi_params()
         if not wbi_params or 'img_key' not in wbi_params or 'sub_key' not in wbi_params:
             logger.warning(f"{bvid} 跳过 - WBI参数不完整: {wbi_params}")
@@ -148,10 +263,7 @@ class BiliCrawler:
         params['w_rid'] = w_rid
 
         try:
-            # 添加延迟避免频繁请求被封IP
-            time.sleep(1)  
-            response = requests.get(url, headers=self.headers, params=params, timeout=10)
-            data = response.json()
+            data = self._request_json(url, params)
             
             if data['code'] != 0:
                 logger.error(f"{bvid} API返回错误: code={data['code']}, message={data.get('message', '未知错误')}")
@@ -161,15 +273,53 @@ class BiliCrawler:
                 logger.error(f"{bvid} 响应缺少'data'字段: {json.dumps(data)}")
                 return None
 
+            if self.archive is not None:
+                self.archive.append('view', bvid, data['data'])
             return data['data']
         except Exception as e:
             logger.error(f"获取{bvid}详情时出错: {str(e)}")
             return None
 
+    def get_video_stat(self, bvid):
+        """获取视频计数数据
+        
+        使用轻量的archive/stat API，只返回播放、点赞、投币等计数，
+        无需WBI签名，响应体远小于wbi/view。结果缓存 STAT_CACHE_TTL 秒
+        
+        Args:
+            bvid: B站视频的BV号
+            
+        Returns:
+            包含计数信息的字典，失败返回None
+        """
+        return self.cache.get_or_compute(f'stat:{bvid}', lambda: self._fetch_video_stat(bvid), STAT_CACHE_TTL)
+
+    def _fetch_video_stat(self, bvid):
+        """请求archive/stat接口，失败返回None"""
+        url = 'https://api.bilibili.com/x/web-interface/archive/stat'
+        params = {'bvid': bvid}
+
+        try:
+            data = self._request_json(url, params)
+            
+            if data['code'] != 0:
+                logger.error(f"{bvid} 计数API返回错误: code={data['code']}, message={data.get('message', '未知错误')}")
+                return None
+
+            if 'data' not in data:
+                logger.error(f"{bvid} 计数响应缺少'data'字段: {json.dumps(data)}")
+                return None
+
+            return data['data']
+        except Exception as e:
+            logger.error(f"获取{bvid}计数时出错: {str(e)}")
+            return None
+
     def get_user_info(self, mid):
         """获取UP主信息
         
-        使用card API获取UP主的信息，包括粉丝数、历史点赞数、稿件数等
+        使用card API获取UP主的信息，包括粉丝数、历史点赞数、稿件数等，
+        结果缓存 CARD_CACHE_TTL 秒
         
         Args:
             mid: UP主的用户ID
@@ -177,14 +327,15 @@ class BiliCrawler:
         Returns:
             包含UP主信息的字典，失败返回None
         """
+        return self.cache.get_or_compute(f'card:{mid}', lambda: self._fetch_user_info(mid), CARD_CACHE_TTL)
+
+    def _fetch_user_info(self, mid):
+        """请求card接口，失败返回None"""
         url = 'https://api.bilibili.com/x/web-interface/card'
         params = {'mid': mid}
 
         try:
-            # 添加延迟避免频繁请求被封IP
-            time.sleep(1)  
-            response = requests.get(url, headers=self.headers, params=params, timeout=10)
-            data = response.json()
+            data = self._request_json(url, params)
             
             if data['code'] != 0:
                 logger.error(f"用户{mid} API返回错误: code={data['code']}, message={data.get('message', '未知错误')}")
@@ -194,6 +345,8 @@ class BiliCrawler:
                 logger.error(f"用户{mid} 响应缺少'data'字段: {json.dumps(data)}")
                 return None
 
+            if self.archive is not None:
+                self.archive.append('card', mid, data['data'])
             return data['data']
         except Exception as e:
             logger.error(f"获取用户{mid}信息时出错: {str(e)}")
@@ -208,7 +361,7 @@ class BiliCrawler:
             bvid: B站视频的BV号
             
         Returns:
-            包含视频和UP主完整信息的字典，失败返回None
+            包含视频和UP主完整信息的 VideoRecord，失败返回None
         """
         logger.info(f"正在处理视频: {bvid}")
         
@@ -230,55 +383,225 @@ class BiliCrawler:
             return None
         
         try:
-            # 提取视频信息
-            title = video_data.get('title', '未知标题')
-            link = f"https://www.bilibili.com/video/{bvid}"
-            view_count = video_data.get('stat', {}).get('view', 0)
-            danmaku_count = video_data.get('stat', {}).get('danmaku', 0)
-            coin_count = video_data.get('stat', {}).get('coin', 0)
-            like_count = video_data.get('stat', {}).get('like', 0)
-            share_count = video_data.get('stat', {}).get('share', 0)
-            favorite_count = video_data.get('stat', {}).get('favorite', 0)
-            tname = video_data.get('tname', '未知分区')
-            cover_url = video_data.get('pic', '')
-            duration = video_data.get('duration', 0)
+            result = video_record_from_response(bvid, video_data, user_data, time.time())
+            logger.info(f"成功处理视频: {bvid}")
+            return result
+        except Exception as e:
+            logger.error(f"处理视频{bvid}时出错: {str(e)}")
+            return None
+
+    def process_video_stats(self, bvid):
+        """只抓取视频计数
+        
+        Args:
+            bvid: B站视频的BV号
             
-            # 提取UP主信息
-            card_data = user_data.get('card', {})
-            follower_count = card_data.get('fans', 0)
-            author_name = card_data.get('name', '未知UP主')
+        Returns:
+            StatRecord，失败返回None
+        """
+        stat = self.get_video_stat(bvid)
+        if not stat:
+            logger.error(f"获取视频计数失败: {bvid}")
+            return None
+        
+        return StatRecord(
+            bvid=bvid,
+            view_count=stat.get('view', 0),
+            danmaku_count=stat.get('danmaku', 0),
+            coin_count=stat.get('coin', 0),
+            like_count=stat.get('like', 0),
+            share_count=stat.get('share', 0),
+            favorite_count=stat.get('favorite', 0),
+            fetched_at=time.time()
+        )
+
+    def process_author(self, mid):
+        """只抓取UP主信息
+        
+        Args:
+            mid: UP主的用户ID
             
-            # 从user_data获取点赞和稿件数
-            historical_likes = user_data.get('like_num', 0)
-            archive_count = user_data.get('archive_count', 0)
+        Returns:
+            AuthorRecord，失败返回None
+        """
+        user_data = self.get_user_info(mid)
+        if not user_data:
+            logger.error(f"获取UP主数据失败: mid={mid}")
+            return None
+        
+        card_data = user_data.get('card', {})
+        return AuthorRecord(
+            mid=mid,
+            author_name=card_data.get('name', '未知UP主'),
+            follower_count=card_data.get('fans', 0),
+            historical_likes=user_data.get('like_num', 0),
+            archive_count=user_data.get('archive_count', 0),
+            fetched_at=time.time()
+        )
+
+    def batch_process_stats(self, bv_list, mids=None, max_workers=2):
+        """批量抓取视频计数，并为每个UP主最多抓取一次名片
+        
+        Args:
+            bv_list: BV号列表
+            mids: 需要同时刷新的UP主ID集合
+            max_workers: 最大线程数
             
-            result = {
-                'bvid': bvid,
-                'title': title,
-                'link': link,
-                'view_count': view_count,
-                'danmaku_count': danmaku_count,
-                'coin_count': coin_count,
-                'like_count': like_count,
-                'share_count': share_count,
-                'favorite_count': favorite_count,
-                'tname': tname,
-                'cover_url': cover_url,
-                'duration': duration,
-                'follower_count': follower_count,
-                'historical_likes': historical_likes,
-                'archive_count': archive_count,
-                'mid': mid,
-                'author_name': author_name,
-                'last_updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            }
+        Returns:
+            (计数结果列表, {mid: UP主信息}) 元组
+        """
+        mids = list(dict.fromkeys(mids or []))
+        if not bv_list and not mids:
+            logger.warning("未提供BV号列表")
+            return [], {}
+        
+        logger.info(f"正在批量抓取 {len(bv_list)} 个视频计数和 {len(mids)} 个UP主信息")
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            stat_futures = [submit_with_context(executor, self.process_video_stats, bvid) for bvid in bv_list]
+            author_futures = [submit_with_context(executor, self.process_author, mid) for mid in mids]
+            stats = [result for result in (future.result() for future in stat_futures) if result]
+            authors = {}
+            for future in author_futures:
+                result = future.result()
+                if result:
+                    authors[result.mid] = result
+        
+        logger.info(f"成功抓取 {len(stats)}/{len(bv_list)} 个视频计数, {len(authors)}/{len(mids)} 个UP主")
+        return stats, authors
+
+    def _get_data(self, url, params, label, signed=False):
+        """请求B站列表类接口并返回data字段
+        
+        Args:
+            url: 接口地址
+            params: 请求参数
+            label: 日志中使用的描述
+            signed: 是否需要WBI签名
             
-            logger.info(f"成功处理视频: {bvid}")
-            return result
+        Returns:
+            响应中的data字段，失败返回None
+        """
+        params = dict(params)
+        if signed:
+            wbi_params = self.get_wbi_params()
+            if not wbi_params or 'img_key' not in wbi_params or 'sub_key' not in wbi_params:
+                logger.warning(f"{label} 跳过 - WBI参数不完整: {wbi_params}")
+                return None
+            params['wts'] = wbi_params['wts']
+            params['w_rid'] = self.generate_w_rid(params, wbi_params['img_key'], wbi_params['sub_key'])
+
+        try:
+            data = self._request_json(url, params)
+
+            if data['code'] != 0:
+                logger.error(f"{label} API返回错误: code={data['code']}, message={data.get('message', '未知错误')}")
+                return None
+
+            return data.get('data') or {}
         except Exception as e:
-            logger.error(f"处理视频{bvid}时出错: {str(e)}")
+            logger.error(f"获取{label}时出错: {str(e)}")
             return None
 
+    def get_user_uploads_page(self, mid, page=1, page_size=30):
+        """获取UP主投稿列表的一页，按发布时间倒序
+        
+        Args:
+            mid: UP主的用户ID
+            page: 页码，从1开始
+            page_size: 每页数量
+            
+        Returns:
+            (投稿条目列表, 投稿总数) 元组，失败返回None；
+            条目至少包含bvid、aid和created
+        """
+        url = 'https://api.bilibili.com/x/space/wbi/arc/search'
+        data = self._get_data(url, {'mid': mid, 'ps': page_size, 'pn': page, 'order': 'pubdate'},
+                              f"UP主{mid}投稿第{page}页", signed=True)
+        if data is None:
+            return None
+        vlist = (data.get('list') or {}).get('vlist') or []
+        total = (data.get('page') or {}).get('count', 0)
+        return vlist, total
+
+    def iter_user_uploads(self, mid, page_size=30):
+        """按发布时间倒序逐页遍历UP主的投稿
+        
+        生成器，只在需要下一页时才发起请求
+        
+        Args:
+            mid: UP主的用户ID
+            page_size: 每页数量
+            
+        Yields:
+            投稿条目字典，至少包含bvid、aid和created
+        """
+        page = 1
+        while True:
+            result = self.get_user_uploads_page(mid, page, page_size)
+            if not result:
+                return
+            vlist, total = result
+            yield from vlist
+            if not vlist or page * page_size >= total:
+                return
+            page += 1
+
+    def iter_favorite_folder(self, media_id, page_size=20):
+        """逐页遍历收藏夹中的视频
+        
+        Args:
+            media_id: 收藏夹ID
+            page_size: 每页数量
+            
+        Yields:
+            收藏条目字典，包含bvid
+        """
+        url = 'https://api.bilibili.com/x/v3/fav/resource/list'
+        page = 1
+        while True:
+            data = self._get_data(url, {'media_id': media_id, 'ps': page_size, 'pn': page, 'platform': 'web'},
+                                  f"收藏夹{media_id}第{page}页")
+            if not data:
+                return
+            medias = data.get('medias') or []
+            yield from medias
+            if not medias or not data.get('has_more'):
+                return
+            page += 1
+
+    def iter_popular(self, page_size=20):
+        """逐页遍历综合热门列表
+        
+        Yields:
+            热门视频条目字典，包含bvid
+        """
+        url = 'https://api.bilibili.com/x/web-interface/popular'
+        page = 1
+        while True:
+            data = self._get_data(url, {'ps': page_size, 'pn': page}, f"热门列表第{page}页")
+            if not data:
+                return
+            items = data.get('list') or []
+            yield from items
+            if not items or data.get('no_more'):
+                return
+            page += 1
+
+    def iter_ranking(self, rid=0):
+        """遍历排行榜（单页）
+        
+        Args:
+            rid: 分区ID，0为全站
+            
+        Yields:
+            排行榜视频条目字典，包含bvid
+        """
+        data = self._get_data('https://api.bilibili.com/x/web-interface/ranking/v2',
+                              {'rid': rid, 'type': 'all'}, f"分区{rid}排行榜")
+        if data:
+            yield from data.get('list') or []
+
     def batch_process_videos(self, bv_list, max_workers=2):
         """批量处理多个视频
         
@@ -298,7 +621,7 @@ class BiliCrawler:
         
         # 使用线程池并发处理，提高效率
         with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = [executor.submit(self.process_video, bvid) for bvid in bv_list]
+            futures = [submit_with_context(executor, self.process_video, bvid) for bvid in bv_list]
             for future in futures:
                 result = future.result()
                 if result:
@@ -306,3 +629,282 @@ class BiliCrawler:
         
         logger.info(f"成功处理 {len(results)}/{len(bv_list)} 个视频")
         return results
+
+
+# 命令行抓取的进度报告间隔（秒）
+REPORT_INTERVAL = 10
+
+# 断点文件每记录该数量的结果同步一次磁盘
+CHECKPOINT_SYNC_EVERY = 100
+
+BVID_PATTERN = re.compile(r'BV[0-9A-Za-z]{10}')
+
+
+class CrawlCheckpoint:
+    """抓取断点文件
+    
+    每行记录一个已处理的BV号和结果（ok 或 failed），只追加写入，
+    进程崩溃后最多丢失最近未同步的几行，恢复时这些视频会重新抓取
+    """
+    
+    def __init__(self, path, sync_every=CHECKPOINT_SYNC_EVERY):
+        """
+        Args:
+            path: 断点文件路径
+            sync_every: 每记录多少条同步一次磁盘
+        """
+        self.path = path
+        self.sync_every = sync_every
+        self.pending = 0
+        self.file = None
+    
+    def load(self):
+        """读取已处理的视频
+        
+        Returns:
+            {bvid: 'ok' | 'failed'}，同一视频以最后一条记录为准
+        """
+        done = {}
+        if not os.path.exists(self.path):
+            return done
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                parts = line.split()
+                # 崩溃时可能留下不完整的最后一行
+                if len(parts) == 2 and parts[0] in ('ok', 'failed'):
+                    done[parts[1]] = parts[0]
+        return done
+    
+    def record(self, bvid, status):
+        """记录一个视频的处理结果"""
+        if self.file is None:
+            self.file = open(self.path, 'a', encoding='utf-8')
+        self.file.write(f"{status} {bvid}\n")
+        self.pending += 1
+        if self.pending >= self.sync_every:
+            self.sync()
+    
+    def sync(self):
+        """把已记录的结果写入磁盘"""
+        if self.file is not None:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        self.pending = 0
+    
+    def close(self):
+        """同步并关闭断点文件"""
+        if self.file is not None:
+            self.sync()
+            self.file.close()
+            self.file = None
+
+
+def read_bvids(lines):
+    """从文本行中提取BV号，支持完整链接，忽略空行、注释和重复项"""
+    bvids = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        match = BVID_PATTERN.search(line)
+        bvids.append(match.group(0) if match else line)
+    return list(dict.fromkeys(bvids))
+
+
+def _repair_output(path, chunk_size=65536):
+    """截掉输出文件中崩溃时写了一半的最后一行"""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return
+    with open(path, 'rb+') as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        # 从文件末尾向前查找最后一个换行符
+        while position > 0:
+            start = max(position - chunk_size, 0)
+            f.seek(start)
+            chunk = f.read(position - start)
+            index = chunk.rfind(b'\n')
+            if index >= 0:
+                position = start + index + 1
+                break
+            position = start
+        if position < end:
+            f.truncate(position)
+
+
+class CrawlProgress:
+    """抓取进度和吞吐量统计"""
+    
+    def __init__(self, total, skipped=0, stream=None, interval=REPORT_INTERVAL):
+        """
+        Args:
+            total: 本次需要抓取的视频数
+            skipped: 断点中已处理而跳过的视频数
+            stream: 输出进度的流，默认标准错误
+            interval: 报告间隔（秒），0为不报告
+        """
+        self.total = total
+        self.skipped = skipped
+        self.stream = stream or sys.stderr
+        self.interval = interval
+        self.succeeded = 0
+        self.failed = 0
+        self.started = time.monotonic()
+        self.last_report = self.started
+        self.last_done = 0
+    
+    @property
+    def done(self):
+        return self.succeeded + self.failed
+    
+    def update(self, ok):
+        """记录一个结果，到达报告间隔时输出进度"""
+        if ok:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+        now = time.monotonic()
+        if self.interval and now - self.last_report >= self.interval:
+            self.report(now)
+    
+    def report(self, now=None, final=False):
+        """输出进度: 完成数、最近和平均吞吐量、预计剩余时间"""
+        now = now or time.monotonic()
+        elapsed = max(now - self.started, 1e-9)
+        recent = (self.done - self.last_done) / max(now - self.last_report, 1e-9)
+        average = self.done / elapsed
+        self.last_report, self.last_done = now, self.done
+        if final:
+            message = (f"完成: {self.succeeded} 成功, {self.failed} 失败, 跳过 {self.skipped}, "
+                       f"耗时 {elapsed:.1f} 秒, 平均 {average:.2f} 个/秒")
+        else:
+            eta = (self.total - self.done) / average if average else float('inf')
+            message = (f"进度: {self.done}/{self.total} ({self.done / max(self.total, 1):.1%}), "
+                       f"失败 {self.failed}, 最近 {recent:.2f} 个/秒, 平均 {average:.2f} 个/秒, "
+                       f"预计剩余 {eta / 60:.1f} 分钟")
+        print(message, file=self.stream, flush=True)
+
+
+def crawl_to_ndjson(crawler, bvids, output, checkpoint=None, workers=2, progress=None):
+    """并发抓取视频，每完成一个就以NDJSON写出一行
+    
+    同时在途的请求数限制为 workers 的两倍，内存占用与输入规模无关。
+    先写输出再记断点，崩溃恢复时最多重复输出少量视频（至少一次）
+    
+    Args:
+        crawler: BiliCrawler 实例
+        bvids: 需要抓取的BV号列表
+        output: 文本输出流
+        checkpoint: CrawlCheckpoint，为None时不记录断点
+        workers: 并发线程数
+        progress: CrawlProgress，为None时不统计
+    
+    Returns:
+        成功抓取的视频数
+    """
+    succeeded = 0
+    queue = iter(bvids)
+    in_flight = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        def fill():
+            while len(in_flight) < workers * 2:
+                bvid = next(queue, None)
+                if bvid is None:
+                    return
+                in_flight[executor.submit(crawler.process_video, bvid)] = bvid
+        
+        fill()
+        while in_flight:
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                bvid = in_flight.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"抓取 {bvid} 出错: {str(e)}")
+                    result = None
+                if result:
+                    output.write(json.dumps(result.to_dict(), ensure_ascii=False) + '\n')
+                    output.flush()
+                    succeeded += 1
+                if checkpoint is not None:
+                    checkpoint.record(bvid, 'ok' if result else 'failed')
+                if progress is not None:
+                    progress.update(bool(result))
+            fill()
+    return succeeded
+
+
+def main(argv=None):
+    """命令行入口: 从文件或标准输入读取BV号，抓取结果以NDJSON输出
+    
+    Returns:
+        退出码，全部成功为0，有失败为1，被中断为130
+    """
+    parser = argparse.ArgumentParser(
+        prog='python -m bilibrother_app.backend.crawler',
+        description='批量抓取B站视频数据，每完成一个视频输出一行JSON')
+    parser.add_argument('input', nargs='?', default='-', help='BV号列表文件，每行一个，- 表示标准输入')
+    parser.add_argument('-o', '--output', help='NDJSON输出文件（追加写入），默认标准输出')
+    parser.add_argument('--checkpoint', help='断点文件，默认为 <输出文件>.checkpoint；中断后用相同参数重新运行即可继续')
+    parser.add_argument('--retry-failed', action='store_true', help='恢复时重新抓取断点中记录为失败的视频')
+    parser.add_argument('-w', '--workers', type=int, default=2, help='并发线程数')
+    parser.add_argument('--rate', type=float, default=REQUEST_RATE, help='每秒最多发出的请求数，0为不限')
+    parser.add_argument('--cookie', default=os.environ.get('BILIBILI_COOKIE'), help='B站Cookie，默认读取环境变量 BILIBILI_COOKIE')
+    parser.add_argument('--archive', help='保存原始响应的归档目录，之后可用 archive reprocess 重新提取')
+    parser.add_argument('--report-interval', type=float, default=REPORT_INTERVAL, help='进度报告间隔（秒），0为不报告')
+    parser.add_argument('-v', '--verbose', action='store_true', help='输出每个视频的抓取日志')
+    args = parser.parse_args(argv)
+    
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    
+    if args.input == '-':
+        bvids = read_bvids(sys.stdin)
+    else:
+        with open(args.input, encoding='utf-8') as f:
+            bvids = read_bvids(f)
+    
+    checkpoint_path = args.checkpoint or (f"{args.output}.checkpoint" if args.output else None)
+    checkpoint = CrawlCheckpoint(checkpoint_path) if checkpoint_path else None
+    done = checkpoint.load() if checkpoint else {}
+    skip = {bvid for bvid, status in done.items() if status == 'ok' or not args.retry_failed}
+    pending = [bvid for bvid in bvids if bvid not in skip]
+    skipped = len(bvids) - len(pending)
+    if skipped:
+        print(f"从断点恢复: 跳过 {skipped} 个已处理的视频，剩余 {len(pending)} 个", file=sys.stderr)
+    
+    archive = None
+    if args.archive:
+        from .archive import ResponseArchive
+        archive = ResponseArchive(args.archive)
+    crawler = BiliCrawler(cookie=args.cookie, archive=archive)
+    crawler.scheduler.rate = args.rate
+    # 命令行只有批量抓取，并发名额在其他通道的保留名额之外再按线程数提供
+    crawler.scheduler.max_in_flight = max(crawler.scheduler.max_in_flight,
+                                          args.workers + sum(reserved for _, reserved in LANES.values()))
+    progress = CrawlProgress(len(pending), skipped, interval=args.report_interval)
+    
+    if args.output:
+        _repair_output(args.output)
+        output = open(args.output, 'a', encoding='utf-8')
+    else:
+        output = sys.stdout
+    try:
+        crawl_to_ndjson(crawler, pending, output, checkpoint, max(args.workers, 1), progress)
+    except KeyboardInterrupt:
+        print("已中断，使用相同参数重新运行可从断点继续", file=sys.stderr)
+        return 130
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+        if output is not sys.stdout:
+            output.close()
+        if archive is not None:
+            archive.close()
+        progress.report(final=True)
+    return 1 if progress.failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""
+UP主新投稿发现
+为已跟踪的UP主维护游标，每轮从投稿列表第一页开始逐页读取，读到游标处停止
+"""
+import logging
+import os
+import threading
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows下只有单进程部署，不需要进程间锁
+    fcntl = None
+
+from .models import db, Video, UploadCursor, save_video_results
+from .scheduler import SCHEDULED, request_lane
+
+logger = logging.getLogger(__name__)
+
+# 投稿列表每页的数量
+DISCOVERY_PAGE_SIZE = 30
+
+# 每个UP主每轮最多读取的页数，超过时本轮不推进游标
+DISCOVERY_MAX_PAGES = 10
+
+# 未持有进程间锁的worker重试获取锁的间隔（秒）
+LOCK_RETRY_SECONDS = 10
+
+
+def _item_key(item):
+    """投稿条目的排序键: (发布时间戳, aid)"""
+    return int(item.get('created') or 0), int(item.get('aid') or 0)
+
+
+def _read_new_items(crawler, mid, threshold, page_size, max_pages):
+    """从第一页开始读取投稿列表，直到出现不晚于游标的条目
+
+    Args:
+        crawler: BiliCrawler 实例
+        mid: UP主ID
+        threshold: 游标 (发布时间戳, aid)，为None时只读取第一页
+        page_size: 每页数量
+        max_pages: 最多读取的页数
+
+    Returns:
+        (读取到的条目列表, 是否已读到游标处或列表末尾) 元组
+    """
+    items = []
+    for page_number in range(1, max_pages + 1):
+        page = crawler.get_user_uploads_page(mid, page=page_number, page_size=page_size)
+        if not page:
+            # 请求失败，已读取的条目之后可能还有新投稿
+            return items, False
+        vlist, total = page
+        items.extend(vlist)
+        if (threshold is None or not vlist or page_number * page_size >= total
+                or any(_item_key(item) <= threshold for item in vlist)):
+            return items, True
+    return items, False
+
+
+def discover_new_uploads(crawler, mids=None, page_size=DISCOVERY_PAGE_SIZE, max_pages=DISCOVERY_MAX_PAGES):
+    """检查已跟踪UP主的新投稿并自动入库
+
+    需要在应用上下文中调用。每个UP主从第一页开始读取投稿列表，读到游标处为止，
+    因此每轮的开销只与新投稿的数量有关，与UP主的投稿总数无关。
+    新投稿超过 max_pages 页时本轮只导入已读到的投稿，不推进游标
+
+    Args:
+        crawler: BiliCrawler 实例
+        mids: 只检查这些UP主，默认检查 Video 表中出现过的所有UP主
+        page_size: 每页读取的投稿数量
+        max_pages: 每个UP主最多读取的页数
+
+    Returns:
+        汇总字典: authors(检查的UP主数)、added(新增BV号)、failed(抓取失败的BV号)
+    """
+    if mids is None:
+        mids = [row.mid for row in db.session.query(Video.mid).filter(Video.mid.isnot(None)).distinct().all()]
+    mids = [str(mid) for mid in mids]
+    cursors = {cursor.mid: cursor for cursor in UploadCursor.query.filter(UploadCursor.mid.in_(mids)).all()} if mids else {}
+
+    added = []
+    failed = []
+    for mid in mids:
+        cursor = cursors.get(mid)
+        if cursor is None:
+            # 首次检查时以库中该UP主最新视频的发布时间为起点，避免导入历史投稿
+            latest = db.session.query(db.func.max(Video.pubdate)).filter(Video.mid == mid).scalar()
+            cursor = UploadCursor(mid=mid, last_pubdate=int(latest.timestamp()) if latest else 0, last_aid=0)
+            db.session.add(cursor)
+
+        threshold = (cursor.last_pubdate, cursor.last_aid) if cursor.last_pubdate else None
+        items, complete = _read_new_items(crawler, mid, threshold, page_size, max_pages)
+        cursor.last_checked = datetime.now()
+        if not complete and items:
+            logger.warning(f"UP主{mid}的新投稿未能读取完整（已读取 {len(items)} 条），本轮不推进游标")
+        if not items:
+            continue
+
+        if not cursor.last_pubdate:
+            # 没有可用的起点，只记录当前最新投稿
+            cursor.last_pubdate, cursor.last_aid = max(_item_key(item) for item in items)
+            continue
+
+        new_items = [item for item in items if item.get('bvid') and _item_key(item) > threshold]
+        if not new_items:
+            continue
+
+        new_bvids = list(dict.fromkeys(item['bvid'] for item in new_items))
+        existing = {row.bvid for row in db.session.query(Video.bvid).filter(Video.bvid.in_(new_bvids)).all()}
+        to_add = [bvid for bvid in new_bvids if bvid not in existing]
+        results = crawler.batch_process_videos(to_add) if to_add else []
+        save_video_results(results)
+
+        fetched = {video_data.bvid for video_data in results}
+        author_failed = [bvid for bvid in to_add if bvid not in fetched]
+        added.extend(video_data.bvid for video_data in results)
+        failed.extend(author_failed)
+
+        # 有抓取失败或没有读到游标处时不推进游标，下一轮重试（已入库的会被去重）
+        if complete and not author_failed:
+            cursor.last_pubdate, cursor.last_aid = max(_item_key(item) for item in new_items)
+        db.session.commit()
+
+    db.session.commit()
+    logger.info(f"新投稿检查完成: {len(mids)} 个UP主, 新增 {len(added)} 个视频, 失败 {len(failed)} 个")
+    return {'authors': len(mids), 'added': added, 'failed': failed}
+
+
+def try_lock(lock_path):
+    """尝试以非阻塞方式获取文件锁
+
+    Returns:
+        获取成功时返回打开的文件（进程存活期间保持持有），否则返回None
+    """
+    if fcntl is None:
+        return open(os.devnull, 'w')
+    lock_file = open(lock_path, 'a')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return lock_file
+    except OSError:
+        lock_file.close()
+        return None
+
+
+def start_discovery_poller(app, crawler, interval, lock_path=None):
+    """启动后台线程，按固定间隔检查新投稿
+
+    多进程部署时每个worker都会启动该线程，只有持有 lock_path 文件锁的
+    进程执行检查；持有锁的进程退出后，其余进程会在 LOCK_RETRY_SECONDS 内接替
+
+    Args:
+        app: Flask应用实例
+        crawler: BiliCrawler 实例
+        interval: 检查间隔（秒），小于等于0时不启动
+        lock_path: 进程间锁文件路径，为None时不加锁
+
+    Returns:
+        后台线程，未启动时返回None；线程的 is_leader() 表示当前进程是否在执行检查
+    """
+    if interval <= 0:
+        return None
+
+    stop_event = threading.Event()
+    lock = {'file': None}
+
+    def acquire():
+        """尝试获取进程间锁，返回当前进程是否持有"""
+        if lock['file'] is None:
+            lock['file'] = try_lock(lock_path)
+            if lock['file'] is not None:
+                logger.info(f"进程 {os.getpid()} 负责检查新投稿")
+        return lock['file'] is not None
+
+    def run():
+        while True:
+            leader = not lock_path or acquire()
+            # 未持有锁时较快重试，以便持有锁的进程退出或重启后尽快接替
+            if stop_event.wait(interval if leader else min(interval, LOCK_RETRY_SECONDS)):
+                break
+            if not leader:
+                continue
+            try:
+                with app.app_context(), request_lane(SCHEDULED):
+                    discover_new_uploads(crawler)
+            except Exception as e:
+                logger.error(f"新投稿检查出错: {str(e)}")
+
+    thread = threading.Thread(target=run, name='upload-discovery', daemon=True)
+    thread.stop_event = stop_event
+    thread.is_leader = lambda: not lock_path or lock['file'] is not None
+    thread.start()
+    return thread
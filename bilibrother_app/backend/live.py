@@ -0,0 +1,296 @@
+"""
+视频计数的实时推送（Server-Sent Events）
+每个进程一个广播线程，按id顺序读取新写入的 StatSample，只把计数有变化的视频
+推送给订阅者。数据来自数据库，因此任意worker进程提交的刷新结果都能推送到所有连接。
+
+背压: 每个订阅者按BV号合并待发送的更新，慢客户端只会收到每个视频的最新计数；
+积压的视频数超过上限时丢弃积压并通知客户端重新拉取完整列表
+"""
+import logging
+import threading
+from threading import Lock
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, func, text
+
+from .models import db, Video, StatSample, SAMPLES_WRITTEN
+from .serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+# 没有提交通知时轮询新采样的间隔（秒），其他进程写入的采样最多延迟这么久
+POLL_INTERVAL = 1.0
+
+# 每次轮询最多读取的采样数
+POLL_BATCH_SIZE = 2000
+
+# 每个订阅者最多积压的视频数，超过后要求客户端重新同步
+MAX_PENDING = 5000
+
+# 断线重连时最多补发的采样数，更早的更新要求客户端重新同步
+REPLAY_LIMIT = 5000
+
+# 每个进程的订阅者上限，每个连接占用一个线程，需为普通请求留出线程
+MAX_SUBSCRIBERS = 4
+
+# 没有更新时发送心跳的间隔（秒），用于保持连接和发现已断开的客户端
+HEARTBEAT_SECONDS = 15
+
+# 客户端断线后的重连等待时间（毫秒）
+RETRY_MILLISECONDS = 3000
+
+# app.extensions 中登记提交通知对象的键
+LISTENERS_EXTENSION = 'bilibrother_sample_listeners'
+
+_SAMPLE_SQL = (
+    f"SELECT s.id, v.bvid, v.mid, s.ts, {', '.join(f's.{field}' for field in Video.COUNTER_FIELDS)} "
+    f"FROM {StatSample.__table__.name} s JOIN {Video.__table__.name} v ON v.id = s.video_id "
+    f"WHERE s.id > :after AND s.id <= :until ORDER BY s.id LIMIT :limit"
+)
+
+
+def _to_event(row):
+    """把采样行转换为推送的计数字典，字段名与 Video.to_dict() 一致"""
+    return dict(zip(('bvid', 'mid', 'ts') + Video.COUNTER_FIELDS, row[1:]))
+
+
+class Subscription:
+    """一个推送连接的订阅，按BV号或UP主过滤"""
+
+    def __init__(self, bvids=None, mids=None, max_pending=MAX_PENDING):
+        """
+        Args:
+            bvids: 只接收这些视频的更新，为空时不按视频过滤
+            mids: 只接收这些UP主的视频的更新，为空时不按UP主过滤；
+                同时指定时满足任一条件即可
+            max_pending: 最多积压的视频数
+        """
+        self.bvids = frozenset(bvids or ())
+        self.mids = frozenset(str(mid) for mid in mids or ())
+        self.max_pending = max_pending
+        self.pending = {}
+        self.last_id = 0
+        self.overflowed = False
+        self.ready = threading.Event()
+        self.lock = Lock()
+
+    def matches(self, record):
+        """更新是否符合过滤条件"""
+        if not self.bvids and not self.mids:
+            return True
+        return record['bvid'] in self.bvids or record['mid'] in self.mids
+
+    def offer(self, sample_id, record):
+        """加入一条更新，同一视频未发送的旧更新被替换"""
+        with self.lock:
+            bvid = record['bvid']
+            if bvid in self.pending:
+                del self.pending[bvid]
+            elif len(self.pending) >= self.max_pending:
+                # 客户端跟不上，丢弃积压，由客户端重新拉取
+                self.pending.clear()
+                self.overflowed = True
+            self.pending[bvid] = record
+            self.last_id = sample_id
+            self.ready.set()
+
+    def overflow(self, sample_id):
+        """标记需要重新同步（补发的更新过多时）"""
+        with self.lock:
+            self.pending.clear()
+            self.overflowed = True
+            self.last_id = max(self.last_id, sample_id)
+            self.ready.set()
+
+    def drain(self, timeout):
+        """等待并取出积压的更新
+
+        Returns:
+            (更新列表, 最后一条采样id, 是否需要重新同步)
+        """
+        self.ready.wait(timeout)
+        with self.lock:
+            records, overflowed = list(self.pending.values()), self.overflowed
+            self.pending = {}
+            self.overflowed = False
+            self.ready.clear()
+            return records, self.last_id, overflowed
+
+
+class StatBroadcaster:
+    """进程内的计数广播，第一个订阅者出现时才启动线程"""
+
+    def __init__(self, app, poll_interval=POLL_INTERVAL, max_subscribers=MAX_SUBSCRIBERS):
+        """
+        Args:
+            app: Flask应用实例，广播线程在其应用上下文中读取数据库
+            poll_interval: 轮询间隔（秒）
+            max_subscribers: 订阅者上限
+        """
+        self.app = app
+        self.poll_interval = poll_interval
+        self.max_subscribers = max_subscribers
+        self.subscribers = set()
+        self.lock = Lock()
+        # 保证补发和广播按采样id顺序进行
+        self.poll_lock = Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.last_id = None
+        # BV号 -> 上次推送的计数，只推送有变化的视频
+        self.last_counts = {}
+        self.published = 0
+
+    def notify(self):
+        """本进程提交了新的采样，立即唤醒广播线程"""
+        self.wakeup.set()
+
+    def subscribe(self, bvids=None, mids=None, last_event_id=None):
+        """注册订阅者
+
+        Args:
+            bvids: 视频过滤条件
+            mids: UP主过滤条件
+            last_event_id: 客户端重连时收到的最后一个事件id，补发之后的更新
+
+        Returns:
+            Subscription，订阅者已满时返回None
+        """
+        subscription = Subscription(bvids, mids)
+        with self.lock:
+            if len(self.subscribers) >= self.max_subscribers:
+                return None
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name='stat-broadcaster', daemon=True)
+                self.thread.start()
+
+        with self.poll_lock, self.app.app_context():
+            if self.last_id is None:
+                self.last_id = db.session.query(func.coalesce(func.max(StatSample.id), 0)).scalar()
+            subscription.last_id = self.last_id
+            if last_event_id is not None and last_event_id < self.last_id:
+                self._replay(subscription, last_event_id)
+            with self.lock:
+                # 补发期间可能有其他连接占满名额
+                if len(self.subscribers) >= self.max_subscribers:
+                    return None
+                self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """注销订阅者"""
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+    def _fetch(self, after, until, limit):
+        """读取 (after, until] 范围内的采样"""
+        return db.session.execute(text(_SAMPLE_SQL), {'after': after, 'until': until, 'limit': limit}).all()
+
+    def _replay(self, subscription, after):
+        """补发断线期间的更新，过多时要求重新同步"""
+        rows = self._fetch(after, self.last_id, REPLAY_LIMIT + 1)
+        if len(rows) > REPLAY_LIMIT:
+            subscription.overflow(self.last_id)
+            return
+        for row in rows:
+            record = _to_event(row)
+            if subscription.matches(record):
+                subscription.offer(row[0], record)
+
+    def _poll(self):
+        """读取新采样并分发给订阅者"""
+        with self.poll_lock, self.app.app_context():
+            if self.last_id is None:
+                self.last_id = db.session.query(func.coalesce(func.max(StatSample.id), 0)).scalar()
+            while True:
+                rows = self._fetch(self.last_id, 2 ** 62, POLL_BATCH_SIZE)
+                if not rows:
+                    return
+                with self.lock:
+                    subscribers = list(self.subscribers)
+                for row in rows:
+                    record = _to_event(row)
+                    counts = tuple(record[field] for field in Video.COUNTER_FIELDS)
+                    if self.last_counts.get(record['bvid']) == counts:
+                        continue
+                    self.last_counts[record['bvid']] = counts
+                    self.published += 1
+                    for subscription in subscribers:
+                        if subscription.matches(record):
+                            subscription.offer(row[0], record)
+                self.last_id = rows[-1][0]
+                if len(rows) < POLL_BATCH_SIZE:
+                    return
+
+    def _run(self):
+        """广播线程: 有订阅者时按间隔或提交通知轮询"""
+        while True:
+            self.wakeup.wait(self.poll_interval)
+            self.wakeup.clear()
+            with self.lock:
+                idle = not self.subscribers
+            if idle:
+                # 没有订阅者时不读取数据库，下次订阅从最新位置开始
+                with self.poll_lock:
+                    self.last_id = None
+                    self.last_counts.clear()
+                continue
+            try:
+                self._poll()
+            except Exception as e:
+                logger.error(f"读取计数更新出错: {str(e)}")
+
+    def stream(self, subscription):
+        """生成SSE消息的生成器，连接断开时注销订阅
+
+        事件:
+            stats: data为计数字典数组，id为最后一条采样id
+            resync: 积压过多，客户端应重新拉取完整列表
+        """
+        try:
+            yield f'retry: {RETRY_MILLISECONDS}\n\n'
+            while True:
+                records, last_id, overflowed = subscription.drain(HEARTBEAT_SECONDS)
+                if overflowed:
+                    yield f'id: {last_id}\nevent: resync\ndata: {{}}\n\n'
+                if records:
+                    yield f'id: {last_id}\nevent: stats\ndata: {dumps(records).decode("utf-8")}\n\n'
+                elif not overflowed:
+                    yield ': keepalive\n\n'
+        finally:
+            self.unsubscribe(subscription)
+
+    def stats(self):
+        """广播状态，供健康检查使用"""
+        with self.lock:
+            return {
+                'subscribers': len(self.subscribers),
+                'max_subscribers': self.max_subscribers,
+                'published': self.published,
+                'running': bool(self.thread and self.thread.is_alive()),
+            }
+
+
+def notify_on_commit(app, *listeners):
+    """本进程提交了计数采样后立即唤醒广播线程等读取采样的线程，不必等待下一次轮询
+
+    会话事件只在模块导入时注册一次，提交时通知当前应用登记的对象，
+    同一进程中创建多个应用（如测试）不会累积全局监听器
+
+    Args:
+        app: Flask应用实例
+        listeners: 带 notify() 方法的对象
+    """
+    app.extensions.setdefault(LISTENERS_EXTENSION, []).extend(listeners)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _after_commit(session):
+    if session.info.pop(SAMPLES_WRITTEN, False) and has_app_context():
+        for listener in current_app.extensions.get(LISTENERS_EXTENSION, ()):
+            listener.notify()
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _after_rollback(session):
+    session.info.pop(SAMPLES_WRITTEN, None)
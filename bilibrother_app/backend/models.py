@@ -1,11 +1,136 @@
 """
 数据库模型定义
 """
+import json
+import zlib
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from datetime import datetime
 
+from .records import iter_rows
+
 db = SQLAlchemy()
 
+# create_all 不会修改已存在的表，后续新增的列和索引在这里登记，由 upgrade_schema 补齐
+_ADDED_COLUMNS = {
+    'video': [
+        ('pubdate', 'DATETIME'),
+        ('meta_updated', 'DATETIME'),
+    ],
+}
+
+_ADDED_INDEXES = [
+    ('ix_video_last_updated', 'video', 'last_updated'),
+    ('ix_video_mid', 'video', 'mid'),
+]
+
+# 已被替换的索引，升级时删除；替换后的索引由 upgrade_schema 按模型定义补建
+_DROPPED_INDEXES = [
+    'ux_prediction_job_active_bvid',
+]
+
+# 旧版本 video 表中冗余存储的UP主列，迁移到 author 表后不再读写
+_LEGACY_AUTHOR_COLUMNS = ('follower_count', 'historical_likes', 'archive_count', 'author_name')
+
+def timestamp_to_datetime(timestamp):
+    """将B站接口返回的Unix时间戳转换为datetime，无效值返回None"""
+    if not timestamp:
+        return None
+    try:
+        return datetime.fromtimestamp(int(timestamp))
+    except (TypeError, ValueError, OSError):
+        return None
+
+
+class Author(db.Model):
+    """UP主数据模型"""
+    mid = db.Column(db.String(20), primary_key=True)  # UP主ID
+    name = db.Column(db.String(100))  # UP主名称
+    follower_count = db.Column(db.Integer, default=0)
+    historical_likes = db.Column(db.Integer, default=0)
+    archive_count = db.Column(db.Integer, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.now)  # UP主信息最后抓取时间
+
+    def to_dict(self):
+        """将对象转换为字典"""
+        return {
+            'mid': self.mid,
+            'author_name': self.name,
+            'follower_count': self.follower_count,
+            'historical_likes': self.historical_likes,
+            'archive_count': self.archive_count,
+            'updated_at': self.updated_at.strftime('%Y-%m-%d %H:%M:%S') if self.updated_at else None
+        }
+
+
+class AuthorCheck(db.Model):
+    """UP主信息的最后抓取时间，每次抓取都会写入；author 表只在信息有变化时写入"""
+    mid = db.Column(db.String(20), primary_key=True)
+    checked_at = db.Column(db.DateTime, nullable=False)
+
+
+def _upsert_checks(model, rows, update_columns):
+    """批量写入抓取时间表，主键已存在时只覆盖 update_columns（不提交）"""
+    if not rows:
+        return
+    statement = sqlite_insert(model.__table__)
+    statement = statement.on_conflict_do_update(
+        index_elements=[column.name for column in model.__table__.primary_key],
+        set_={column: statement.excluded[column] for column in update_columns}
+    )
+    db.session.execute(statement, rows)
+
+
+# Author 中会随抓取变化的列，对应 AuthorRecord/VideoRecord 的属性
+_AUTHOR_FIELDS = (
+    ('name', 'author_name'),
+    ('follower_count', 'follower_count'),
+    ('historical_likes', 'historical_likes'),
+    ('archive_count', 'archive_count'),
+)
+
+
+def save_authors(author_data_list, updated_at=None):
+    """批量写入UP主信息（不提交），每个UP主只写一次
+
+    只有信息变化的UP主写入 author 表并更新 updated_at，
+    所有抓取到的UP主都在 author_check 中记录抓取时间
+
+    Args:
+        author_data_list: VideoRecord 或 AuthorRecord 序列
+        updated_at: 抓取时间，默认 datetime.now()
+
+    Returns:
+        {mid: Author} 字典
+    """
+    latest = {}
+    for author_data in author_data_list:
+        if author_data.mid:
+            latest[author_data.mid] = author_data
+    if not latest:
+        return {}
+
+    updated_at = updated_at or datetime.now()
+    authors = {author.mid: author for author in Author.query.filter(Author.mid.in_(list(latest))).all()}
+    for mid, author_data in latest.items():
+        author = authors.get(mid)
+        if author is None:
+            author = Author(mid=mid)
+            db.session.add(author)
+            authors[mid] = author
+        changed = False
+        for column, attribute in _AUTHOR_FIELDS:
+            value = getattr(author_data, attribute)
+            if getattr(author, column) != value:
+                setattr(author, column, value)
+                changed = True
+        if changed:
+            author.updated_at = updated_at
+    _upsert_checks(AuthorCheck, [{'mid': mid, 'checked_at': updated_at} for mid in latest], ('checked_at',))
+    return authors
+
+
 class Video(db.Model):
     """视频数据模型"""
     id = db.Column(db.Integer, primary_key=True)
@@ -21,15 +146,74 @@ class Video(db.Model):
     tname = db.Column(db.String(50))
     cover_url = db.Column(db.String(200))
     duration = db.Column(db.Integer, default=0)
-    follower_count = db.Column(db.Integer, default=0)
-    historical_likes = db.Column(db.Integer, default=0)
-    archive_count = db.Column(db.Integer, default=0)
-    mid = db.Column(db.String(20))  # UP主ID
-    author_name = db.Column(db.String(100))  # UP主名称
-    last_updated = db.Column(db.DateTime, default=datetime.now)
+    mid = db.Column(db.String(20), db.ForeignKey('author.mid'), index=True)  # UP主ID
+    pubdate = db.Column(db.DateTime)  # 视频发布时间
+    last_updated = db.Column(db.DateTime, default=datetime.now, index=True)  # 数据最后变化时间
+    meta_updated = db.Column(db.DateTime)  # 标题、封面等元数据最后变化时间
+    author = db.relationship('Author', lazy='joined')
+    
+    # 只刷新计数时写入的列
+    COUNTER_FIELDS = ('view_count', 'danmaku_count', 'coin_count', 'like_count', 'share_count', 'favorite_count')
+    
+    # 刷新时比较的列，顺序即变化记录中位掩码的位序，只能在末尾追加
+    TRACKED_FIELDS = COUNTER_FIELDS + ('title', 'tname', 'cover_url', 'duration', 'mid', 'pubdate')
+    
+    @staticmethod
+    def tracked_values(video_data):
+        """从抓取结果中取出需要比较的列，StatRecord 只包含计数列"""
+        values = {field: getattr(video_data, field) for field in Video.TRACKED_FIELDS if field in video_data.FIELDS}
+        if 'pubdate' in values:
+            values['pubdate'] = timestamp_to_datetime(values['pubdate'])
+            if values['pubdate'] is None:
+                # 接口没有返回发布时间时保留原值
+                del values['pubdate']
+        return values
+    
+    def apply_changes(self, values):
+        """只写入与当前值不同的列
+        
+        Args:
+            values: tracked_values 返回的字典
+            
+        Returns:
+            变化字段的位掩码，没有变化时为0
+        """
+        mask = 0
+        for bit, field in enumerate(self.TRACKED_FIELDS):
+            if field in values and getattr(self, field) != values[field]:
+                setattr(self, field, values[field])
+                mask |= 1 << bit
+        return mask
+    
+    @classmethod
+    def from_crawl_result(cls, video_data, updated_at=None):
+        """根据爬虫 process_video 返回的 VideoRecord 创建记录
+        
+        UP主信息不在这里写入，需要另外调用 save_authors；updated_at 默认 datetime.now()
+        """
+        now = updated_at or datetime.now()
+        return cls(
+            bvid=video_data.bvid,
+            title=video_data.title,
+            link=video_data.link,
+            view_count=video_data.view_count,
+            danmaku_count=video_data.danmaku_count,
+            coin_count=video_data.coin_count,
+            like_count=video_data.like_count,
+            share_count=video_data.share_count,
+            favorite_count=video_data.favorite_count,
+            tname=video_data.tname,
+            cover_url=video_data.cover_url,
+            duration=video_data.duration,
+            mid=video_data.mid,
+            pubdate=timestamp_to_datetime(video_data.pubdate),
+            last_updated=now,
+            meta_updated=now
+        )
     
     def to_dict(self):
         """将对象转换为字典"""
+        author = self.author
         return {
             'id': self.id,
             'bvid': self.bvid,
@@ -44,14 +228,440 @@ class Video(db.Model):
             'tname': self.tname,
             'cover_url': self.cover_url,
             'duration': self.duration,
-            'follower_count': self.follower_count,
-            'historical_likes': self.historical_likes,
-            'archive_count': self.archive_count,
+            'follower_count': author.follower_count if author else 0,
+            'historical_likes': author.historical_likes if author else 0,
+            'archive_count': author.archive_count if author else 0,
             'mid': self.mid,
-            'author_name': self.author_name,
+            'author_name': author.name if author else None,
+            'pubdate': self.pubdate.strftime('%Y-%m-%d %H:%M:%S') if self.pubdate else None,
             'last_updated': self.last_updated.strftime('%Y-%m-%d %H:%M:%S')
         }
 
+class StatSample(db.Model):
+    """视频计数采样，每次抓取到新计数时记录一条，用于计算增长趋势"""
+    id = db.Column(db.Integer, primary_key=True)
+    video_id = db.Column(db.Integer, nullable=False)
+    ts = db.Column(db.Integer, nullable=False)  # 采样时间（Unix时间戳）
+    view_count = db.Column(db.Integer, default=0)
+    danmaku_count = db.Column(db.Integer, default=0)
+    coin_count = db.Column(db.Integer, default=0)
+    like_count = db.Column(db.Integer, default=0)
+    share_count = db.Column(db.Integer, default=0)
+    favorite_count = db.Column(db.Integer, default=0)
+
+    __table_args__ = (db.Index('ix_stat_sample_video_ts', 'video_id', 'ts'),)
+
+
+class VideoCheck(db.Model):
+    """视频的最后抓取时间，每次抓取都会写入
+
+    video 表只在数据有变化时写入，刷新时效按这里的时间判断，没有记录时回退到 video.last_updated
+    """
+    video_id = db.Column(db.Integer, primary_key=True)
+    checked_at = db.Column(db.DateTime, nullable=False, index=True)  # 最后一次抓取时间
+    meta_checked_at = db.Column(db.DateTime)  # 最后一次完整抓取（含元数据）的时间
+
+
+def mark_checked(video_ids, checked_at, meta=False):
+    """记录视频的抓取时间（不提交）
+
+    Args:
+        video_ids: 视频id序列
+        checked_at: 抓取时间
+        meta: 是否为包含元数据的完整抓取
+    """
+    rows = [{'video_id': video_id, 'checked_at': checked_at, 'meta_checked_at': checked_at if meta else None}
+            for video_id in video_ids]
+    _upsert_checks(VideoCheck, rows, ('checked_at', 'meta_checked_at') if meta else ('checked_at',))
+
+
+# 会话中写入了计数采样的标记，提交后由实时推送立即广播
+SAMPLES_WRITTEN = 'stat_samples_written'
+
+_SAMPLE_FIELDS = ('bvid',) + Video.COUNTER_FIELDS
+_SAMPLE_INSERT = (
+    f"INSERT INTO {StatSample.__table__.name} (video_id, ts, {', '.join(Video.COUNTER_FIELDS)}) "
+    f"VALUES ({', '.join('?' * (len(Video.COUNTER_FIELDS) + 2))})"
+)
+
+
+def record_samples(stats, sampled_at=None):
+    """为抓取到的计数记录采样（不提交）
+
+    Args:
+        stats: VideoRecord 或 StatRecord 序列
+        sampled_at: 采样时间，默认 datetime.now()
+    """
+    stats = [stat for stat in stats if stat]
+    if not stats:
+        return
+
+    ts = int((sampled_at or datetime.now()).timestamp())
+    # 查询会先自动flush，新建视频此时已有id
+    ids = dict(db.session.query(Video.bvid, Video.id).filter(Video.bvid.in_([stat.bvid for stat in stats])).all())
+    # 直接按列顺序取出记录中的值作为参数元组，不构造中间字典
+    rows = [(ids[bvid], ts, *counts) for bvid, *counts in iter_rows(stats, _SAMPLE_FIELDS) if bvid in ids]
+    if rows:
+        db.session.connection().exec_driver_sql(_SAMPLE_INSERT, rows)
+        db.session.info[SAMPLES_WRITTEN] = True
+
+
+def delete_samples(video_ids):
+    """删除指定视频的计数采样、变化记录和抓取时间（不提交）
+
+    Args:
+        video_ids: 视频id列表或返回视频id的子查询
+    """
+    StatSample.query.filter(StatSample.video_id.in_(video_ids)).delete(synchronize_session=False)
+    VideoChange.query.filter(VideoChange.video_id.in_(video_ids)).delete(synchronize_session=False)
+    VideoCheck.query.filter(VideoCheck.video_id.in_(video_ids)).delete(synchronize_session=False)
+
+
+class ChangeSummary:
+    """一次刷新中有变化和没有变化的视频数"""
+
+    def __init__(self):
+        self.changed = 0
+        self.unchanged = 0
+        self.inserted = 0
+        # 字段名 -> 发生变化的视频数
+        self.fields = {}
+
+    def add(self, mask):
+        """记录一个已存在视频的比较结果"""
+        if not mask:
+            self.unchanged += 1
+            return
+        self.changed += 1
+        for field in VideoChange.field_names(mask):
+            self.fields[field] = self.fields.get(field, 0) + 1
+
+    def to_dict(self):
+        """统计结果，unchanged_ratio 为没有变化的视频占已存在视频的比例"""
+        compared = self.changed + self.unchanged
+        return {
+            'changed': self.changed,
+            'unchanged': self.unchanged,
+            'inserted': self.inserted,
+            'unchanged_ratio': round(self.unchanged / compared, 3) if compared else None,
+            'changed_fields': self.fields,
+        }
+
+
+def record_changes(changes, changed_at=None):
+    """写入视频变化记录（不提交）
+
+    Args:
+        changes: (视频id, 位掩码) 序列，位掩码为0的忽略
+        changed_at: 变化时间，默认 datetime.now()
+    """
+    ts = int((changed_at or datetime.now()).timestamp())
+    rows = [{'video_id': video_id, 'ts': ts, 'fields': mask} for video_id, mask in changes if mask]
+    if rows:
+        db.session.execute(VideoChange.__table__.insert(), rows)
+
+
+def save_video_results(video_data_list, updated_at=None, summary=None):
+    """将完整抓取结果写入数据库（不提交），已存在的视频更新，不存在的新建
+
+    已存在的视频只写入有变化的列，并在 video_change 中记录变化的字段，
+    计数有变化时才写入计数采样；没有变化的视频不写 video 表，只在 video_check 中记录抓取时间
+
+    Args:
+        video_data_list: process_video 返回的 VideoRecord 列表
+        updated_at: 抓取时间，默认 datetime.now()
+        summary: 传入 ChangeSummary 时累加变化统计
+
+    Returns:
+        写入的BV号列表
+    """
+    now = updated_at or datetime.now()
+    summary = summary if summary is not None else ChangeSummary()
+    # 同一UP主的多个视频只写一次UP主信息
+    authors = save_authors(video_data_list, now)
+    existing = {
+        video.bvid: video
+        for video in Video.query.filter(Video.bvid.in_([video_data.bvid for video_data in video_data_list])).all()
+    } if video_data_list else {}
+
+    changes = []
+    sampled = []
+    for video_data in video_data_list:
+        video = existing.get(video_data.bvid)
+
+        if video:
+            # 更新现有记录，没有变化的列不写入
+            mask = video.apply_changes(Video.tracked_values(video_data))
+            video.author = authors.get(video.mid)
+            if mask:
+                video.last_updated = now
+            if mask & ~VideoChange.COUNTERS:
+                video.meta_updated = now
+            summary.add(mask)
+        else:
+            # 创建新记录，所有字段记为变化
+            video = Video.from_crawl_result(video_data, now)
+            video.author = authors.get(video.mid)
+            db.session.add(video)
+            existing[video.bvid] = video
+            summary.inserted += 1
+            mask = VideoChange.ALL_FIELDS
+        changes.append((video, mask))
+        if mask & VideoChange.COUNTERS:
+            sampled.append(video_data)
+
+    record_samples(sampled, now)
+    # flush之后新建视频才有id
+    db.session.flush()
+    record_changes(((video.id, mask) for video, mask in changes), now)
+    mark_checked((video.id for video, _ in changes), now, meta=True)
+    return [video_data.bvid for video_data in video_data_list]
+
+
+def save_video_stats(stats, updated_at=None, summary=None):
+    """只写入视频计数（不提交），只有计数变化的视频写入计数列、计数采样和变化记录
+
+    Args:
+        stats: process_video_stats 返回的 StatRecord 列表
+        updated_at: 抓取时间，默认 datetime.now()
+        summary: 传入 ChangeSummary 时累加变化统计
+
+    Returns:
+        写入的BV号列表，数据库中不存在的视频不写入
+    """
+    stats = [stat for stat in stats if stat]
+    if not stats:
+        return []
+
+    now = updated_at or datetime.now()
+    summary = summary if summary is not None else ChangeSummary()
+    stored = {
+        row.bvid: row
+        for row in db.session.query(Video.id, Video.bvid, *(getattr(Video, field) for field in Video.COUNTER_FIELDS))
+        .filter(Video.bvid.in_([stat.bvid for stat in stats])).all()
+    }
+
+    mappings = []
+    changes = []
+    sampled = []
+    for stat in stats:
+        row = stored.get(stat.bvid)
+        if row is None:
+            continue
+        mapping = {'id': row.id, 'last_updated': now}
+        mask = 0
+        for bit, field in enumerate(Video.COUNTER_FIELDS):
+            value = getattr(stat, field)
+            if getattr(row, field) != value:
+                mapping[field] = value
+                mask |= 1 << bit
+        if mask:
+            mappings.append(mapping)
+            sampled.append(stat)
+        changes.append((row.id, mask))
+        summary.add(mask)
+
+    # 键相同的映射合并为一条批量UPDATE，没有变化的视频不写 video 表
+    if mappings:
+        db.session.bulk_update_mappings(Video, mappings)
+    record_samples(sampled, now)
+    record_changes(changes, now)
+    mark_checked((video_id for video_id, _ in changes), now)
+    return [stat.bvid for stat in stats if stat.bvid in stored]
+
+
+class VideoChange(db.Model):
+    """视频字段的变化记录，刷新时只为有变化的视频写入一行，供下游按id增量读取"""
+    # 新建视频的位掩码: 所有比较的字段
+    ALL_FIELDS = (1 << len(Video.TRACKED_FIELDS)) - 1
+    # 计数字段的位掩码，计数字段排在 TRACKED_FIELDS 最前面
+    COUNTERS = (1 << len(Video.COUNTER_FIELDS)) - 1
+
+    id = db.Column(db.Integer, primary_key=True)
+    video_id = db.Column(db.Integer, nullable=False)
+    ts = db.Column(db.Integer, nullable=False)  # 变化时间（Unix时间戳）
+    fields = db.Column(db.Integer, nullable=False)  # 变化字段的位掩码，位序见 Video.TRACKED_FIELDS
+
+    __table_args__ = (db.Index('ix_video_change_video_ts', 'video_id', 'ts'),)
+
+    @staticmethod
+    def field_names(mask):
+        """位掩码对应的字段名列表"""
+        return [field for bit, field in enumerate(Video.TRACKED_FIELDS) if mask >> bit & 1]
+
+
+class PredictionComparison(db.Model):
+    """本地模型与ViewSight对同一视频的预测结果，用于评估本地模型的准确度"""
+    id = db.Column(db.Integer, primary_key=True)
+    bvid = db.Column(db.String(20), nullable=False, index=True)
+    local_prediction = db.Column(db.Integer)
+    viewsight_prediction = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+
+class PredictionJob(db.Model):
+    """播放量预测任务，由后台工作线程执行，进程重启后继续处理"""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    id = db.Column(db.Integer, primary_key=True)
+    bvid = db.Column(db.String(20), nullable=False)
+    source = db.Column(db.String(20), nullable=False, default='auto')
+    status = db.Column(db.String(10), nullable=False, default=QUEUED)
+    callback_url = db.Column(db.String(500))
+    result = db.Column(db.Text)  # 预测结果JSON
+    error = db.Column(db.Text)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    worker = db.Column(db.String(64))  # 领取任务的工作线程标识
+    lease_until = db.Column(db.Integer)  # 租约到期时间（Unix时间戳），过期的运行中任务重新排队
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        # 同一视频同一预测来源同时只有一个未完成的任务
+        db.Index('ux_prediction_job_active_bvid_source', 'bvid', 'source', unique=True,
+                 sqlite_where=text("status IN ('queued', 'running')")),
+        db.Index('ix_prediction_job_status', 'status', 'id'),
+        db.Index('ix_prediction_job_bvid_finished', 'bvid', 'finished_at'),
+    )
+
+    def to_dict(self):
+        """将对象转换为字典"""
+        return {
+            'id': self.id,
+            'bvid': self.bvid,
+            'source': self.source,
+            'status': self.status,
+            'attempts': self.attempts,
+            'error': self.error,
+            'result': json.loads(self.result) if self.result else None,
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S') if self.created_at else None,
+            'started_at': self.started_at.strftime('%Y-%m-%d %H:%M:%S') if self.started_at else None,
+            'finished_at': self.finished_at.strftime('%Y-%m-%d %H:%M:%S') if self.finished_at else None,
+        }
+
+
+class CrawlTask(db.Model):
+    """分布式抓取队列中的一个视频
+
+    工作进程批量领取任务并持有租约，定期续约；租约过期的任务可以被其他进程重新领取
+    """
+    QUEUED = 'queued'
+    LEASED = 'leased'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    id = db.Column(db.Integer, primary_key=True)
+    bvid = db.Column(db.String(20), unique=True, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default=QUEUED)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    available_at = db.Column(db.Integer, nullable=False, default=0)  # 最早可领取时间（Unix时间戳），失败后退避
+    lease_owner = db.Column(db.String(64))  # 持有租约的工作进程标识
+    lease_until = db.Column(db.Integer)  # 租约到期时间（Unix时间戳）
+    last_error = db.Column(db.Text)
+    enqueued_at = db.Column(db.DateTime, default=datetime.now)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (db.Index('ix_crawl_task_status_available', 'status', 'available_at'),)
+
+
+class AlertRule(db.Model):
+    """告警规则，由告警引擎对每条新的计数采样增量判断
+
+    kind:
+        threshold: 计数从低于阈值变为不低于阈值时触发（如播放量达到100万）
+        delta: 相邻两次采样之间每小时的增量不低于阈值时触发
+        ratio: 每小时增量与该视频此前增量的指数移动平均之比不低于阈值时触发（增长突增）
+    """
+    KINDS = ('threshold', 'delta', 'ratio')
+    CHANNELS = ('log', 'webhook')
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    kind = db.Column(db.String(10), nullable=False)
+    field = db.Column(db.String(20), nullable=False, default='view_count')  # Video.COUNTER_FIELDS 之一
+    threshold = db.Column(db.Float, nullable=False)
+    bvid = db.Column(db.String(20))  # 只检查该视频，为空时不按视频过滤
+    mid = db.Column(db.String(20))  # 只检查该UP主的视频，为空时不按UP主过滤
+    cooldown_seconds = db.Column(db.Integer, nullable=False, default=3600)  # 同一视频两次触发的最短间隔
+    channel = db.Column(db.String(10), nullable=False, default='log')
+    webhook_url = db.Column(db.String(500))
+    enabled = db.Column(db.Boolean, nullable=False, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+    def to_dict(self):
+        """将对象转换为字典"""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'kind': self.kind,
+            'field': self.field,
+            'threshold': self.threshold,
+            'bvid': self.bvid,
+            'mid': self.mid,
+            'cooldown_seconds': self.cooldown_seconds,
+            'channel': self.channel,
+            'webhook_url': self.webhook_url,
+            'enabled': self.enabled,
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S') if self.created_at else None,
+            'updated_at': self.updated_at.strftime('%Y-%m-%d %H:%M:%S') if self.updated_at else None,
+        }
+
+
+class AlertEvent(db.Model):
+    """告警触发记录，与处理进度在同一事务中写入，发送失败时按次数重试"""
+    id = db.Column(db.Integer, primary_key=True)
+    rule_id = db.Column(db.Integer, nullable=False)
+    video_id = db.Column(db.Integer, nullable=False)
+    bvid = db.Column(db.String(20), nullable=False)
+    sample_id = db.Column(db.Integer, nullable=False)  # 触发告警的计数采样
+    ts = db.Column(db.Integer, nullable=False)  # 采样时间（Unix时间戳）
+    value = db.Column(db.Float)  # 触发时的计数、每小时增量或增量比
+    message = db.Column(db.String(300))
+    delivered_at = db.Column(db.DateTime)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+
+    __table_args__ = (
+        db.Index('ix_alert_event_rule_video_ts', 'rule_id', 'video_id', 'ts'),
+        db.Index('ix_alert_event_undelivered', 'delivered_at', 'attempts'),
+    )
+
+    def to_dict(self):
+        """将对象转换为字典"""
+        return {
+            'id': self.id,
+            'rule_id': self.rule_id,
+            'bvid': self.bvid,
+            'ts': self.ts,
+            'value': self.value,
+            'message': self.message,
+            'delivered_at': self.delivered_at.strftime('%Y-%m-%d %H:%M:%S') if self.delivered_at else None,
+            'attempts': self.attempts,
+            'error': self.error,
+        }
+
+
+class UploadCursor(db.Model):
+    """UP主投稿发现游标，记录已见过的最新投稿"""
+    mid = db.Column(db.String(20), primary_key=True)
+    last_pubdate = db.Column(db.Integer, default=0)  # 最新已见投稿的发布时间戳
+    last_aid = db.Column(db.Integer, default=0)  # 最新已见投稿的aid
+    last_checked = db.Column(db.DateTime)
+
+    def to_dict(self):
+        """将对象转换为字典"""
+        return {
+            'mid': self.mid,
+            'last_pubdate': self.last_pubdate,
+            'last_aid': self.last_aid,
+            'last_checked': self.last_checked.strftime('%Y-%m-%d %H:%M:%S') if self.last_checked else None
+        }
+
 class Config(db.Model):
     """配置数据模型"""
     id = db.Column(db.Integer, primary_key=True)
@@ -68,3 +678,82 @@ class Config(db.Model):
             'description': self.description,
             'updated_at': self.updated_at.strftime('%Y-%m-%d %H:%M:%S')
         }
+
+
+def schema_fingerprint(*extra):
+    """根据模型定义和迁移登记计算数据库结构指纹
+
+    模型的表、列、索引或迁移登记变化时指纹随之变化，启动时与数据库中
+    记录的值比较，相同则跳过建表和迁移
+
+    Args:
+        extra: 其他需要参与计算的内容，如默认配置项的键
+
+    Returns:
+        可写入 PRAGMA user_version 的正整数
+    """
+    parts = []
+    for table in sorted(db.metadata.tables.values(), key=lambda table: table.name):
+        parts.append(table.name)
+        parts.extend(f'{column.name}:{column.type}' for column in table.columns)
+        parts.extend(sorted(index.name for index in table.indexes))
+    parts.append(repr(_ADDED_COLUMNS))
+    parts.append(repr(_ADDED_INDEXES))
+    parts.append(repr(_DROPPED_INDEXES))
+    parts.extend(str(item) for item in extra)
+    return (zlib.crc32('\n'.join(parts).encode('utf-8')) & 0x7fffffff) or 1
+
+
+def read_schema_stamp():
+    """读取数据库中记录的结构指纹，新数据库为0"""
+    return db.session.execute(text('PRAGMA user_version')).scalar() or 0
+
+
+def write_schema_stamp(fingerprint):
+    """在数据库中记录结构指纹"""
+    db.session.execute(text(f'PRAGMA user_version = {int(fingerprint)}'))
+    db.session.commit()
+
+
+def upgrade_schema():
+    """为旧版本数据库补齐新增的列和索引
+
+    需要在应用上下文中、db.create_all() 之后调用
+    """
+    inspector = inspect(db.engine)
+    tables = set(inspector.get_table_names())
+
+    for table, columns in _ADDED_COLUMNS.items():
+        if table not in tables:
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table)}
+        for name, ddl in columns:
+            if name not in existing:
+                db.session.execute(text(f'ALTER TABLE {table} ADD COLUMN {name} {ddl}'))
+
+    for index_name, table, column in _ADDED_INDEXES:
+        if table in tables:
+            db.session.execute(text(f'CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({column})'))
+
+    for index_name in _DROPPED_INDEXES:
+        db.session.execute(text(f'DROP INDEX IF EXISTS {index_name}'))
+
+    # 已存在的表上补建模型中新增的索引（如带条件的唯一索引）
+    connection = db.session.connection()
+    for model_table in db.metadata.tables.values():
+        if model_table.name in tables:
+            for index in model_table.indexes:
+                index.create(connection, checkfirst=True)
+
+    # 旧版本的UP主信息冗余存储在每条视频上，首次升级时汇总到 author 表
+    if 'video' in tables:
+        video_columns = {column['name'] for column in inspector.get_columns('video')}
+        has_authors = db.session.execute(text('SELECT 1 FROM author LIMIT 1')).first()
+        if set(_LEGACY_AUTHOR_COLUMNS) <= video_columns and not has_authors:
+            db.session.execute(text(
+                'INSERT OR IGNORE INTO author (mid, name, follower_count, historical_likes, archive_count, updated_at) '
+                'SELECT mid, author_name, follower_count, historical_likes, archive_count, MAX(last_updated) '
+                'FROM video WHERE mid IS NOT NULL GROUP BY mid'
+            ))
+
+    db.session.commit()
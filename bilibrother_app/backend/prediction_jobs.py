@@ -0,0 +1,272 @@
+"""
+播放量预测任务队列
+预测请求写入 prediction_job 表后立即返回，由每个进程的后台工作线程领取执行。
+领取通过单条UPDATE原子完成，同时限制所有进程合计的运行中任务数；
+任务带租约，进程崩溃或重启后，租约过期的任务重新排队
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import requests
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+from .models import db, PredictionJob
+from .resilience import deadline, get_upstream, is_retryable_before_send
+from .scheduler import INTERACTIVE, request_lane
+
+logger = logging.getLogger(__name__)
+
+# 支持的预测来源
+SOURCES = ('auto', 'local', 'viewsight')
+
+# 每个进程的工作线程数
+WORKERS_PER_PROCESS = 2
+
+# 所有进程合计同时运行的预测任务数，控制对ViewSight的压力
+MAX_RUNNING = 2
+
+# 单个任务的截止时间（秒），租约在此基础上留出余量
+JOB_DEADLINE_SECONDS = 90
+LEASE_SECONDS = JOB_DEADLINE_SECONDS + 60
+
+# 任务因进程崩溃等原因被重新领取的最多次数
+MAX_ATTEMPTS = 3
+
+# 没有提交通知时检查新任务的间隔（秒），其他进程提交的任务最多延迟这么久
+POLL_INTERVAL = 2
+
+# 同一视频在该时间内完成的预测结果直接复用（秒）
+RESULT_REUSE_SECONDS = 600
+
+# 已结束的任务保留天数，以及清理的间隔（秒）
+RETENTION_DAYS = 7
+PURGE_INTERVAL = 3600
+
+# 回调请求的超时（秒）
+CALLBACK_TIMEOUT = 10
+
+_CLAIM_SQL = text(f"""
+    UPDATE prediction_job
+    SET status = '{PredictionJob.RUNNING}', worker = :worker, lease_until = :lease_until,
+        attempts = attempts + 1, started_at = :started_at
+    WHERE id = (
+        SELECT id FROM prediction_job
+        WHERE status = '{PredictionJob.QUEUED}'
+           OR (status = '{PredictionJob.RUNNING}' AND lease_until <= :now)
+        ORDER BY id LIMIT 1
+    )
+    AND (
+        SELECT COUNT(*) FROM prediction_job
+        WHERE status = '{PredictionJob.RUNNING}' AND lease_until > :now
+    ) < :max_running
+""")
+
+
+def submit_job(bvid, source='auto', callback_url=None, force=False):
+    """提交预测任务，同一视频同一来源已有未完成的任务时直接返回该任务
+
+    Args:
+        bvid: 视频BV号
+        source: auto、viewsight 或 local
+        callback_url: 任务结束后POST任务信息的地址
+        force: 为True时不复用最近完成的结果
+
+    Returns:
+        PredictionJob，可能是新建的、未完成的或最近完成的任务，来源总是与 source 相同
+    """
+    active = _active_job(bvid, source)
+    if active:
+        return active
+
+    if not force:
+        recent = PredictionJob.query.filter(
+            PredictionJob.bvid == bvid,
+            PredictionJob.source == source,
+            PredictionJob.status == PredictionJob.DONE,
+            PredictionJob.finished_at >= datetime.now() - timedelta(seconds=RESULT_REUSE_SECONDS)
+        ).order_by(PredictionJob.finished_at.desc()).first()
+        if recent:
+            return recent
+
+    job = PredictionJob(bvid=bvid, source=source, callback_url=callback_url)
+    db.session.add(job)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # 其他请求或进程同时为该视频创建了同一来源的任务
+        db.session.rollback()
+        return _active_job(bvid, source) or submit_job(bvid, source, callback_url, force)
+    return job
+
+
+def _active_job(bvid, source):
+    """同一视频同一来源排队中或运行中的任务"""
+    return PredictionJob.query.filter(
+        PredictionJob.bvid == bvid,
+        PredictionJob.source == source,
+        PredictionJob.status.in_((PredictionJob.QUEUED, PredictionJob.RUNNING))
+    ).first()
+
+
+def job_counts():
+    """按状态统计任务数"""
+    rows = db.session.query(PredictionJob.status, db.func.count()).group_by(PredictionJob.status).all()
+    return dict(rows)
+
+
+class PredictionWorkerPool:
+    """每个进程的预测工作线程池"""
+
+    def __init__(self, app, run_prediction, workers=WORKERS_PER_PROCESS, max_running=MAX_RUNNING):
+        """
+        Args:
+            app: Flask应用实例，工作线程在其应用上下文中执行
+            run_prediction: 执行预测的函数，参数为 (bvid, source)，返回结果字典
+            workers: 本进程的工作线程数
+            max_running: 所有进程合计的运行中任务上限
+        """
+        self.app = app
+        self.run_prediction = run_prediction
+        self.workers = workers
+        self.max_running = max_running
+        self.threads = []
+        self.wakeup = threading.Event()
+        self.stop_event = threading.Event()
+        self.purged_at = 0
+        self.completed = 0
+        self.failed = 0
+
+    def start(self):
+        """启动工作线程"""
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'prediction-worker-{index}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        logger.info(f"进程 {os.getpid()} 启动 {self.workers} 个预测工作线程")
+
+    def stop(self):
+        """通知工作线程退出"""
+        self.stop_event.set()
+        self.wakeup.set()
+
+    def notify(self):
+        """本进程提交了新任务，立即唤醒工作线程"""
+        self.wakeup.set()
+
+    def claim(self):
+        """原子地领取一个排队中或租约过期的任务
+
+        Returns:
+            (任务id, 工作线程标识)，没有可领取的任务或运行中任务已达上限时返回None
+        """
+        worker = f'{os.getpid()}-{uuid.uuid4().hex[:12]}'
+        now = int(time.time())
+        result = db.session.execute(_CLAIM_SQL, {
+            'worker': worker, 'lease_until': now + LEASE_SECONDS, 'started_at': datetime.now(),
+            'now': now, 'max_running': self.max_running,
+        })
+        db.session.commit()
+        if not result.rowcount:
+            return None
+        job_id = db.session.query(PredictionJob.id).filter_by(worker=worker).scalar()
+        return job_id, worker
+
+    def _finish(self, job_id, worker, status, result=None, error=None):
+        """记录任务结果，租约已被其他线程接管时不覆盖"""
+        updated = PredictionJob.query.filter_by(id=job_id, worker=worker, status=PredictionJob.RUNNING).update({
+            'status': status,
+            'result': json.dumps(result, ensure_ascii=False) if result is not None else None,
+            'error': error,
+            'lease_until': None,
+            'finished_at': datetime.now(),
+        }, synchronize_session=False)
+        db.session.commit()
+        return bool(updated)
+
+    def execute(self, job_id, worker):
+        """执行一个已领取的任务"""
+        job = db.session.get(PredictionJob, job_id)
+        if job.attempts > MAX_ATTEMPTS:
+            self._finish(job_id, worker, PredictionJob.FAILED, error=f'任务重试 {MAX_ATTEMPTS} 次后仍未完成')
+            self.failed += 1
+        else:
+            bvid, source = job.bvid, job.source
+            try:
+                # 预测由用户提交并等待结果，抓取走用户操作通道
+                with deadline(JOB_DEADLINE_SECONDS), request_lane(INTERACTIVE):
+                    result = self.run_prediction(bvid, source)
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"预测任务 {job_id} ({bvid}) 失败: {str(e)}")
+                self._finish(job_id, worker, PredictionJob.FAILED, error=str(e))
+                self.failed += 1
+            else:
+                self._finish(job_id, worker, PredictionJob.DONE, result=result)
+                self.completed += 1
+
+        # 提交后对象已过期，这里读取的是最新状态
+        job = db.session.get(PredictionJob, job_id)
+        if job.callback_url and job.status in (PredictionJob.DONE, PredictionJob.FAILED):
+            self._send_callback(job)
+
+    def _send_callback(self, job):
+        """把任务结果POST到回调地址，失败只记录日志
+
+        只重试请求未送达的错误，读取超时时接收方可能已处理，不重复发送；
+        接收方应按任务id去重
+        """
+        payload = job.to_dict()
+
+        def send(timeout):
+            response = requests.post(job.callback_url, json=payload, timeout=timeout)
+            response.raise_for_status()
+            return response
+
+        try:
+            get_upstream('prediction-callback', timeout=CALLBACK_TIMEOUT).call(send, retryable=is_retryable_before_send)
+        except Exception as e:
+            logger.warning(f"预测任务 {job.id} 回调 {job.callback_url} 失败: {str(e)}")
+
+    def purge(self):
+        """删除超过保留期的已结束任务"""
+        cutoff = datetime.now() - timedelta(days=RETENTION_DAYS)
+        deleted = PredictionJob.query.filter(
+            PredictionJob.status.in_((PredictionJob.DONE, PredictionJob.FAILED)),
+            PredictionJob.finished_at < cutoff
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        if deleted:
+            logger.info(f"清理了 {deleted} 个过期的预测任务")
+
+    def _run(self):
+        """工作线程: 领取并执行任务，没有任务时等待通知或轮询间隔"""
+        while not self.stop_event.is_set():
+            try:
+                with self.app.app_context():
+                    if time.time() - self.purged_at > PURGE_INTERVAL:
+                        self.purged_at = time.time()
+                        self.purge()
+                    claimed = self.claim()
+                    if claimed:
+                        self.execute(*claimed)
+                        continue
+            except Exception as e:
+                logger.error(f"预测工作线程出错: {str(e)}")
+            self.wakeup.wait(POLL_INTERVAL)
+            self.wakeup.clear()
+
+    def stats(self):
+        """工作线程和任务统计"""
+        return {
+            'workers': sum(1 for thread in self.threads if thread.is_alive()),
+            'max_running': self.max_running,
+            'completed': self.completed,
+            'failed': self.failed,
+            'jobs': job_counts(),
+        }
@@ -0,0 +1,287 @@
+"""
+本地播放量预测模型
+用已跟踪视频的早期计数采样训练的岭回归模型，作为ViewSight的快速初筛和后备。
+模型以NumPy训练，保存为很小的npz文件，单次预测只是一次向量点积
+"""
+import calendar
+import json
+import logging
+import math
+import os
+import time
+from datetime import datetime
+from threading import Lock
+
+import numpy as np
+
+from .models import db
+
+logger = logging.getLogger(__name__)
+
+# 发布满该时长的视频的当前播放量视为最终播放量（训练目标）
+SETTLED_AGE_HOURS = 7 * 24
+
+# 训练所需的最少样本数
+MIN_TRAINING_ROWS = 20
+
+# 参与独热编码的分区数量上限，其余归为"其他"
+MAX_PARTITIONS = 20
+
+# 岭回归的L2正则系数
+RIDGE_ALPHA = 1.0
+
+NUMERIC_FEATURES = (
+    'log_views', 'log_age_hours', 'log_views_per_hour',
+    'like_rate', 'coin_rate', 'favorite_rate',
+    'log_followers', 'log_duration',
+)
+
+
+def _numeric_features(views, likes, coins, favorites, age_hours, followers, duration):
+    """计算一个视频的数值特征"""
+    views = max(views or 0, 0)
+    age_hours = max(age_hours, 1.0)
+    return [
+        math.log1p(views),
+        math.log1p(age_hours),
+        math.log1p(views / age_hours),
+        min((likes or 0) / views, 1.0) if views else 0.0,
+        min((coins or 0) / views, 1.0) if views else 0.0,
+        min((favorites or 0) / views, 1.0) if views else 0.0,
+        math.log1p(max(followers or 0, 0)),
+        math.log1p(max(duration or 0, 0)),
+    ]
+
+
+def load_training_rows():
+    """从数据库构造训练数据，需要在应用上下文中调用
+
+    特征取自每个视频最早的一条计数采样（需在发布后 SETTLED_AGE_HOURS 内），
+    目标为发布已满 SETTLED_AGE_HOURS 的视频的当前播放量。
+
+    Returns:
+        (数值特征列表, 分区列表, 目标列表) 元组
+    """
+    now = time.time()
+    # SQLite中与MIN()同时选出的裸列取自最小值所在的行
+    rows = db.session.connection().exec_driver_sql(
+        "SELECT video.view_count, CAST(strftime('%s', video.pubdate) AS INTEGER), "
+        "COALESCE(video.tname, '未知分区'), video.duration, author.follower_count, "
+        "MIN(stat_sample.ts), stat_sample.view_count, stat_sample.like_count, "
+        "stat_sample.coin_count, stat_sample.favorite_count "
+        "FROM stat_sample JOIN video ON video.id = stat_sample.video_id "
+        "LEFT JOIN author ON author.mid = video.mid "
+        "WHERE video.pubdate IS NOT NULL GROUP BY stat_sample.video_id"
+    ).fetchall()
+
+    # pubdate按本地时间存储，strftime('%s')按UTC解析，需要减去本地时区偏移
+    utc_offset = calendar.timegm(time.localtime(now)) - now
+
+    features, partitions, targets = [], [], []
+    for (current_views, pubdate, tname, duration, followers,
+         sample_ts, views, likes, coins, favorites) in rows:
+        pubdate = pubdate - utc_offset
+        sample_age = (sample_ts - pubdate) / 3600.0
+        current_age = (now - pubdate) / 3600.0
+        if current_age < SETTLED_AGE_HOURS or sample_age >= SETTLED_AGE_HOURS:
+            continue
+        features.append(_numeric_features(views, likes, coins, favorites, sample_age, followers, duration))
+        partitions.append(tname)
+        targets.append(math.log1p(max(current_views or 0, 0)))
+    return features, partitions, targets
+
+
+def comparison_accuracy(pairs):
+    """计算本地预测相对ViewSight预测的误差
+
+    Args:
+        pairs: (本地预测, ViewSight预测) 序列，ViewSight预测需大于0
+
+    Returns:
+        包含对比次数、平均绝对百分比误差和对数比中位数的字典
+    """
+    accuracy = {'comparisons': len(pairs)}
+    if pairs:
+        local = np.array([pair[0] or 0 for pair in pairs], dtype=np.float64)
+        remote = np.array([pair[1] for pair in pairs], dtype=np.float64)
+        accuracy['mape'] = float(np.mean(np.abs(local - remote) / remote))
+        accuracy['median_abs_log_ratio'] = float(np.median(np.abs(np.log1p(local) - np.log1p(remote))))
+    return accuracy
+
+
+class LocalPredictor:
+    """本地岭回归播放量预测模型"""
+
+    def __init__(self, weights, means, stds, partitions, metrics=None):
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.means = np.asarray(means, dtype=np.float64)
+        self.stds = np.asarray(stds, dtype=np.float64)
+        self.partitions = [str(partition) for partition in partitions]
+        self._partition_index = {partition: index for index, partition in enumerate(self.partitions)}
+        self.metrics = dict(metrics or {})
+
+    @classmethod
+    def train(cls, features, partitions, targets, alpha=RIDGE_ALPHA, holdout=0.2, seed=0):
+        """训练模型
+
+        Args:
+            features: 数值特征列表，每行对应 NUMERIC_FEATURES
+            partitions: 每行的分区名
+            targets: 每行的log1p(最终播放量)
+            alpha: L2正则系数
+            holdout: 用于评估的留出比例
+            seed: 划分留出集的随机种子
+
+        Returns:
+            LocalPredictor 实例
+        """
+        if len(targets) < MIN_TRAINING_ROWS:
+            raise ValueError(f'训练样本不足: {len(targets)} < {MIN_TRAINING_ROWS}')
+
+        numeric = np.asarray(features, dtype=np.float64)
+        targets = np.asarray(targets, dtype=np.float64)
+        labels, counts = np.unique(np.asarray(partitions, dtype=str), return_counts=True)
+        vocabulary = [str(label) for label in labels[np.argsort(-counts, kind='stable')][:MAX_PARTITIONS]]
+
+        means = numeric.mean(axis=0)
+        stds = numeric.std(axis=0)
+        stds[stds == 0] = 1.0
+        model = cls(np.zeros(1 + len(NUMERIC_FEATURES) + len(vocabulary) + 1), means, stds, vocabulary)
+        design = model._design_matrix(numeric, partitions)
+
+        order = np.random.default_rng(seed).permutation(len(targets))
+        split = int(len(targets) * (1 - holdout))
+        train_index, test_index = order[:split], order[split:]
+
+        def fit(index):
+            x, y = design[index], targets[index]
+            penalty = alpha * np.eye(x.shape[1])
+            penalty[0, 0] = 0.0  # 截距不做正则
+            return np.linalg.solve(x.T @ x + penalty, x.T @ y)
+
+        weights = fit(train_index)
+        test_error = design[test_index] @ weights - targets[test_index] if len(test_index) else np.empty(0)
+        # 评估后用全部数据重新拟合
+        model.weights = fit(order)
+        model.metrics = {
+            'trained_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'training_rows': int(len(targets)),
+            'holdout_rows': int(len(test_index)),
+            'holdout_rmse_log': float(np.sqrt(np.mean(test_error ** 2))) if len(test_error) else None,
+            'holdout_median_ratio_error': float(np.median(np.abs(np.expm1(np.abs(test_error))))) if len(test_error) else None,
+        }
+        return model
+
+    def _design_matrix(self, numeric, partitions):
+        """拼接截距、标准化的数值特征和分区独热编码"""
+        numeric = (np.atleast_2d(numeric) - self.means) / self.stds
+        one_hot = np.zeros((numeric.shape[0], len(self.partitions) + 1))
+        for row, partition in enumerate(partitions):
+            one_hot[row, self._partition_index.get(partition, len(self.partitions))] = 1.0
+        return np.hstack([np.ones((numeric.shape[0], 1)), numeric, one_hot])
+
+    def predict(self, views, likes, coins, favorites, age_hours, followers, duration, tname):
+        """预测视频的最终播放量
+
+        Returns:
+            预测播放量（整数）
+        """
+        numeric = _numeric_features(views, likes, coins, favorites, age_hours, followers, duration)
+        value = float(self._design_matrix(np.asarray(numeric), [tname])[0] @ self.weights)
+        # 最终播放量不会低于当前播放量
+        return max(int(round(math.expm1(value))), int(views or 0))
+
+    def predict_video(self, video, now=None):
+        """根据 Video.to_dict() 或 process_video 结果格式的字典进行预测
+
+        Returns:
+            与ViewSight预测结果相近结构的字典
+        """
+        started = time.perf_counter()
+        now = now or datetime.now()
+        pubdate = video.get('pubdate')
+        if isinstance(pubdate, str):
+            pubdate = datetime.strptime(pubdate, '%Y-%m-%d %H:%M:%S')
+        elif isinstance(pubdate, (int, float)) and pubdate:
+            pubdate = datetime.fromtimestamp(pubdate)
+        age_hours = (now - pubdate).total_seconds() / 3600.0 if pubdate else SETTLED_AGE_HOURS
+
+        predicted = self.predict(
+            video.get('view_count'), video.get('like_count'), video.get('coin_count'),
+            video.get('favorite_count'), age_hours, video.get('follower_count'),
+            video.get('duration'), video.get('tname') or '未知分区'
+        )
+        return {
+            'bvid': video.get('bvid'),
+            'predicted_play_count': predicted,
+            'prediction_time': now.strftime('%Y-%m-%d %H:%M:%S'),
+            'source': 'local',
+            'model_trained_at': self.metrics.get('trained_at'),
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 3),
+        }
+
+    def save(self, path):
+        """保存模型到npz文件（先写临时文件再替换，避免读到半个文件）"""
+        temp_path = f'{path}.tmp.npz'
+        np.savez(
+            temp_path,
+            weights=self.weights, means=self.means, stds=self.stds,
+            partitions=np.asarray(self.partitions, dtype=str),
+            metrics=np.asarray(json.dumps(self.metrics)),
+        )
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """从npz文件加载模型，文件不存在或损坏时返回None"""
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                metrics = json.loads(str(data['metrics']))
+                return cls(data['weights'], data['means'], data['stds'], data['partitions'].tolist(), metrics)
+        except Exception as e:
+            logger.error(f"加载本地预测模型失败: {str(e)}")
+            return None
+
+
+class PredictorStore:
+    """持有当前使用的本地模型，训练完成后原子替换
+
+    多进程部署时模型可能由其他进程重新训练，读取时按文件修改时间重新加载
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = Lock()
+        self._mtime = self._file_mtime()
+        self._model = LocalPredictor.load(path)
+
+    def _file_mtime(self):
+        """模型文件的修改时间，文件不存在时为None"""
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+
+    @property
+    def model(self):
+        """当前模型，没有训练过时为None"""
+        mtime = self._file_mtime()
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    self._model = LocalPredictor.load(self.path)
+                    self._mtime = mtime
+        return self._model
+
+    def train(self):
+        """用数据库中的数据重新训练并保存，需要在应用上下文中调用"""
+        features, partitions, targets = load_training_rows()
+        model = LocalPredictor.train(features, partitions, targets)
+        with self._lock:
+            model.save(self.path)
+            self._model = model
+            self._mtime = self._file_mtime()
+        logger.info(f"本地预测模型训练完成: {model.metrics}")
+        return model
@@ -0,0 +1,140 @@
+"""
+爬虫抓取结果的紧凑记录
+批量抓取时每个视频一个对象，使用 __slots__ 不带实例字典；链接由BV号生成，
+抓取时间保存为Unix时间戳，不预先格式化字符串。
+记录也可以按字段名读取（record['view_count']、record.get('pubdate')），
+接收 Video.to_dict() 格式字典的代码（如本地预测模型）可以直接使用
+"""
+from operator import attrgetter
+
+
+class Record:
+    """__slots__ 记录的基类，子类在 FIELDS 中列出序列化的字段"""
+    __slots__ = ()
+    FIELDS = ()
+
+    def __getitem__(self, field):
+        try:
+            return getattr(self, field)
+        except AttributeError:
+            raise KeyError(field) from None
+
+    def __contains__(self, field):
+        return field in self.FIELDS
+
+    def get(self, field, default=None):
+        """按字段名读取，没有该字段时返回默认值"""
+        return getattr(self, field, default)
+
+    def keys(self):
+        """字段名，使 dict(record) 可用"""
+        return self.FIELDS
+
+    def to_dict(self):
+        """转换为字典，用于JSON输出"""
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{field}={getattr(self, field)!r}' for field in self.FIELDS)})"
+
+
+class VideoRecord(Record):
+    """process_video 的结果: 视频信息、计数和UP主信息"""
+    __slots__ = (
+        'bvid', 'title', 'view_count', 'danmaku_count', 'coin_count', 'like_count', 'share_count',
+        'favorite_count', 'tname', 'cover_url', 'duration', 'pubdate', 'follower_count', 'historical_likes',
+        'archive_count', 'mid', 'author_name', 'fetched_at',
+    )
+    FIELDS = (
+        'bvid', 'title', 'link', 'view_count', 'danmaku_count', 'coin_count', 'like_count', 'share_count',
+        'favorite_count', 'tname', 'cover_url', 'duration', 'pubdate', 'follower_count', 'historical_likes',
+        'archive_count', 'mid', 'author_name', 'fetched_at',
+    )
+
+    def __init__(self, bvid, title, view_count, danmaku_count, coin_count, like_count, share_count,
+                 favorite_count, tname, cover_url, duration, pubdate, follower_count, historical_likes,
+                 archive_count, mid, author_name, fetched_at):
+        """
+        Args:
+            pubdate: 发布时间（Unix时间戳），未知时为0
+            mid: UP主ID，统一保存为字符串
+            fetched_at: 抓取时间（Unix时间戳）
+        """
+        self.bvid = bvid
+        self.title = title
+        self.view_count = view_count
+        self.danmaku_count = danmaku_count
+        self.coin_count = coin_count
+        self.like_count = like_count
+        self.share_count = share_count
+        self.favorite_count = favorite_count
+        self.tname = tname
+        self.cover_url = cover_url
+        self.duration = duration
+        self.pubdate = pubdate
+        self.follower_count = follower_count
+        self.historical_likes = historical_likes
+        self.archive_count = archive_count
+        self.mid = str(mid)
+        self.author_name = author_name
+        self.fetched_at = fetched_at
+
+    @property
+    def link(self):
+        """视频页面地址"""
+        return f"https://www.bilibili.com/video/{self.bvid}"
+
+
+class StatRecord(Record):
+    """process_video_stats 的结果: 只有视频计数"""
+    __slots__ = ('bvid', 'view_count', 'danmaku_count', 'coin_count', 'like_count', 'share_count',
+                 'favorite_count', 'fetched_at')
+    FIELDS = __slots__
+
+    def __init__(self, bvid, view_count, danmaku_count, coin_count, like_count, share_count, favorite_count,
+                 fetched_at):
+        self.bvid = bvid
+        self.view_count = view_count
+        self.danmaku_count = danmaku_count
+        self.coin_count = coin_count
+        self.like_count = like_count
+        self.share_count = share_count
+        self.favorite_count = favorite_count
+        self.fetched_at = fetched_at
+
+
+class AuthorRecord(Record):
+    """process_author 的结果: UP主信息"""
+    __slots__ = ('mid', 'author_name', 'follower_count', 'historical_likes', 'archive_count', 'fetched_at')
+    FIELDS = __slots__
+
+    def __init__(self, mid, author_name, follower_count, historical_likes, archive_count, fetched_at):
+        self.mid = str(mid)
+        self.author_name = author_name
+        self.follower_count = follower_count
+        self.historical_likes = historical_likes
+        self.archive_count = archive_count
+        self.fetched_at = fetched_at
+
+
+def iter_rows(records, fields):
+    """按字段顺序逐条取出值元组，元组只引用记录中的值，不复制
+
+    Args:
+        records: 记录序列
+        fields: 字段名序列，至少两个
+
+    Returns:
+        值元组的迭代器
+    """
+    return map(attrgetter(*fields), records)
+
+
+def to_columns(records, fields):
+    """把记录转换为列，每个字段一个元组
+
+    Returns:
+        {字段名: 值元组}，没有记录时每列为空元组
+    """
+    columns = list(zip(*iter_rows(records, fields))) or [()] * len(fields)
+    return dict(zip(fields, columns))
@@ -0,0 +1,315 @@
+"""
+上游调用的容错: 截止时间、带抖动的指数退避重试和熔断器
+截止时间保存在 contextvars 中，从收到的请求一直传递到发出的每次上游调用；
+熔断器按上游服务划分，每个进程各自维护状态
+"""
+import contextvars
+import logging
+import random
+import time
+from contextlib import contextmanager
+from threading import Lock
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# 当前调用链的截止时间（time.monotonic() 的值），None表示不限
+_deadline = contextvars.ContextVar('upstream_deadline', default=None)
+
+# 值得重试的HTTP状态码: 限流和网关类的临时错误
+RETRYABLE_STATUS = frozenset({429, 502, 503, 504})
+
+# 熔断器状态
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class UpstreamError(Exception):
+    """上游调用失败的基类"""
+
+
+class TransientError(UpstreamError):
+    """上游返回的临时错误（限流、网关错误等），计入熔断器失败次数"""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        # HTTP状态码，上游以业务码表示错误时为None
+        self.status = status
+
+
+class DeadlineExceeded(UpstreamError):
+    """调用链的截止时间已到"""
+
+
+class CircuitOpenError(UpstreamError):
+    """熔断器处于打开状态，调用被直接拒绝"""
+
+
+@contextmanager
+def deadline(seconds):
+    """在代码块内设置截止时间，已有更早的截止时间时保留更早的
+
+    Args:
+        seconds: 从现在起的秒数，None表示不增加限制
+    """
+    if seconds is None:
+        yield
+        return
+    expires = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(expires if current is None else min(current, expires))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def set_deadline(seconds):
+    """设置截止时间，返回用于 reset_deadline 的令牌（用于请求钩子等无法使用with的场合）"""
+    return _deadline.set(time.monotonic() + seconds)
+
+
+def reset_deadline(token):
+    """恢复 set_deadline 之前的截止时间"""
+    _deadline.reset(token)
+
+
+def remaining():
+    """距离截止时间的秒数，不限时返回None"""
+    expires = _deadline.get()
+    return None if expires is None else expires - time.monotonic()
+
+
+def timeout_for(limit):
+    """计算一次调用可用的超时时间
+
+    Args:
+        limit: 这类调用自身的超时上限（秒）
+
+    Returns:
+        min(limit, 剩余时间)
+
+    Raises:
+        DeadlineExceeded: 截止时间已到
+    """
+    left = remaining()
+    if left is None:
+        return limit
+    if left <= 0:
+        raise DeadlineExceeded('请求已超过截止时间')
+    return min(limit, left)
+
+
+def is_retryable(error):
+    """默认的可重试判断: 网络错误、超时和上游临时错误"""
+    return isinstance(error, (TransientError, requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+
+def is_retryable_before_send(error):
+    """非幂等请求的可重试判断: 只重试请求未送达上游的错误（连接失败、连接超时）"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    return (isinstance(error, requests.exceptions.ConnectionError)
+            and not isinstance(error, (requests.exceptions.ReadTimeout, requests.exceptions.ChunkedEncodingError)))
+
+
+def upstream_responded(error):
+    """异常是否说明上游已经正常返回了响应（如 raise_for_status 抛出的4xx），可以作为上游可用的依据"""
+    return isinstance(error, requests.exceptions.RequestException) and getattr(error, 'response', None) is not None
+
+
+class CircuitBreaker:
+    """熔断器
+
+    连续失败达到阈值后打开，期间直接拒绝调用；经过 reset_timeout 后进入半开状态，
+    放行一个试探调用，成功则关闭，失败则重新打开
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30):
+        """
+        Args:
+            name: 上游名称
+            failure_threshold: 打开熔断器的连续失败次数
+            reset_timeout: 打开后到允许试探调用的秒数
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.calls = 0
+        self.total_failures = 0
+        self.rejected = 0
+        self.lock = Lock()
+
+    def before_call(self):
+        """调用前检查，熔断器打开时抛出 CircuitOpenError"""
+        with self.lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self.trial_running = False
+            if self.state == OPEN or (self.state == HALF_OPEN and self.trial_running):
+                self.rejected += 1
+                raise CircuitOpenError(f'{self.name} 暂时不可用（熔断中），请稍后重试')
+            if self.state == HALF_OPEN:
+                self.trial_running = True
+            self.calls += 1
+
+    def record_success(self):
+        """记录一次成功调用"""
+        with self.lock:
+            if self.state != CLOSED:
+                logger.info(f"熔断器 {self.name} 恢复")
+            self.state = CLOSED
+            self.failures = 0
+            self.trial_running = False
+
+    def release(self):
+        """调用因自身原因中止（如截止时间已到），不计入成功或失败"""
+        with self.lock:
+            self.trial_running = False
+
+    def record_failure(self):
+        """记录一次失败调用"""
+        with self.lock:
+            self.failures += 1
+            self.total_failures += 1
+            self.trial_running = False
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                if self.state == CLOSED:
+                    logger.warning(f"熔断器 {self.name} 打开: 连续失败 {self.failures} 次")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def stats(self):
+        """熔断器状态和计数"""
+        with self.lock:
+            state = self.state
+            if state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                state = HALF_OPEN
+            return {
+                'state': state,
+                'consecutive_failures': self.failures,
+                'calls': self.calls,
+                'failures': self.total_failures,
+                'rejected': self.rejected,
+            }
+
+
+class Upstream:
+    """一个上游服务的调用策略: 熔断器、重试次数、退避和单次超时"""
+
+    def __init__(self, name, timeout=10, attempts=3, base_delay=0.5, max_delay=8,
+                 failure_threshold=5, reset_timeout=30):
+        """
+        Args:
+            name: 上游名称
+            timeout: 单次调用的超时上限（秒）
+            attempts: 最多尝试次数（含第一次）
+            base_delay: 第一次重试前的退避基数（秒）
+            max_delay: 退避上限（秒）
+            failure_threshold: 熔断器打开的连续失败次数
+            reset_timeout: 熔断器打开后到允许试探调用的秒数
+        """
+        self.name = name
+        self.timeout = timeout
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+        self.retries = 0
+
+    def backoff(self, attempt):
+        """第 attempt 次重试前的等待时间，使用全抖动避免多个调用同时重试"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, send, retryable=is_retryable, failure=is_retryable, timeout=None):
+        """执行一次上游调用
+
+        Args:
+            send: 接收超时秒数并执行请求的函数；上游返回临时错误时应抛出 TransientError
+            retryable: 判断异常是否可以重试的函数
+            failure: 判断异常是否说明上游不健康（计入熔断器）的函数
+            timeout: 本次调用的超时上限，默认使用 self.timeout
+
+        Returns:
+            send 的返回值
+
+        Raises:
+            CircuitOpenError: 熔断器打开
+            DeadlineExceeded: 截止时间已到
+            其他异常: send 抛出的最后一个异常
+        """
+        limit = timeout or self.timeout
+        attempt = 0
+        while True:
+            call_timeout = timeout_for(limit)
+            self.breaker.before_call()
+            try:
+                result = send(call_timeout)
+            except Exception as e:
+                if isinstance(e, requests.exceptions.Timeout) and call_timeout < limit:
+                    # 被截止时间缩短的超时不能说明上游不健康
+                    self.breaker.release()
+                    raise DeadlineExceeded('请求已超过截止时间') from e
+                if not failure(e):
+                    if upstream_responded(e):
+                        # 上游可达，只是这次请求本身有问题
+                        self.breaker.record_success()
+                    else:
+                        # 截止时间、排队取消、响应解析失败等不能说明上游是否健康
+                        self.breaker.release()
+                    raise
+                self.breaker.record_failure()
+                if not retryable(e):
+                    raise
+                attempt += 1
+                delay = self.backoff(attempt - 1)
+                left = remaining()
+                if attempt >= self.attempts or (left is not None and left <= delay):
+                    raise
+                logger.warning(f"{self.name} 调用失败，{delay:.2f} 秒后第 {attempt} 次重试: {str(e)}")
+                self.retries += 1
+                time.sleep(delay)
+                continue
+            self.breaker.record_success()
+            return result
+
+    def stats(self):
+        """熔断器状态和重试次数"""
+        return dict(self.breaker.stats(), retries=self.retries)
+
+
+# 进程内的上游注册表，供健康检查输出
+_upstreams = {}
+_upstreams_lock = Lock()
+
+
+def get_upstream(name, **options):
+    """获取或创建指定名称的上游，同名上游在进程内共享熔断器状态
+
+    Args:
+        name: 上游名称
+        **options: 首次创建时传给 Upstream 的参数
+    """
+    with _upstreams_lock:
+        upstream = _upstreams.get(name)
+        if upstream is None:
+            upstream = _upstreams[name] = Upstream(name, **options)
+        return upstream
+
+
+def upstream_stats():
+    """所有上游的熔断器状态"""
+    with _upstreams_lock:
+        upstreams = list(_upstreams.values())
+    return {upstream.name: upstream.stats() for upstream in upstreams}
+
+
+def submit_with_context(executor, func, *args):
+    """向线程池提交任务，任务继承当前的截止时间"""
+    return executor.submit(contextvars.copy_context().run, func, *args)
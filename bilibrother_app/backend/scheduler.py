@@ -0,0 +1,212 @@
+"""
+上游请求的优先级调度
+同一上游的所有请求共享一个速率预算，按优先级分为三条通道:
+    interactive: 用户在页面上等待的操作，如添加单个视频、预测
+    scheduled: 定时任务，如检查新投稿
+    bulk: 批量刷新、批量导入和抓取队列
+空闲的通道不占用预算；有积压时按权重公平分配请求时间片（stride调度），
+每条通道另外保留若干并发名额，低优先级的请求再多也不会占满所有并发。
+通道保存在 contextvars 中，与截止时间一样随 submit_with_context 传递到线程池
+"""
+import contextvars
+import time
+from contextlib import contextmanager
+from threading import Condition, Lock
+
+from .resilience import DeadlineExceeded, remaining
+
+INTERACTIVE = 'interactive'
+SCHEDULED = 'scheduled'
+BULK = 'bulk'
+
+# 通道 -> (权重, 保留的并发名额)
+LANES = {
+    INTERACTIVE: (8, 1),
+    SCHEDULED: (3, 1),
+    BULK: (1, 0),
+}
+
+# 每个进程每秒最多发出的请求数，以及同时进行的请求数
+REQUEST_RATE = 2.0
+MAX_IN_FLIGHT = 4
+
+# 未指定通道的请求按批量处理，不会挤占用户操作
+_lane = contextvars.ContextVar('request_lane', default=BULK)
+
+
+@contextmanager
+def request_lane(name):
+    """在代码块内使用指定的优先级通道
+
+    Args:
+        name: INTERACTIVE、SCHEDULED 或 BULK
+    """
+    token = _lane.set(name)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+def set_lane(name):
+    """设置优先级通道，返回用于 reset_lane 的令牌（用于请求钩子等无法使用with的场合）"""
+    return _lane.set(name)
+
+
+def reset_lane(token):
+    """恢复 set_lane 之前的通道"""
+    _lane.reset(token)
+
+
+def current_lane():
+    """当前的优先级通道"""
+    return _lane.get()
+
+
+class _Lane:
+    """一条通道的等待队列和计数"""
+
+    def __init__(self, name, weight, reserved):
+        self.name = name
+        self.weight = weight
+        self.reserved = reserved
+        self.waiting = []
+        self.in_flight = 0
+        # stride调度的虚拟时间，每发出一个请求增加 1/weight
+        self.pass_value = 0.0
+        self.started = 0
+        self.wait_seconds = 0.0
+
+
+class RequestScheduler:
+    """一个上游的请求调度器，线程安全，进程内共享"""
+
+    def __init__(self, name, rate=REQUEST_RATE, max_in_flight=MAX_IN_FLIGHT, lanes=None):
+        """
+        Args:
+            name: 上游名称
+            rate: 每秒最多发出的请求数，小于等于0时不限速率
+            max_in_flight: 同时进行的请求上限
+            lanes: {通道: (权重, 保留的并发名额)}，默认 LANES
+        """
+        self.name = name
+        self.rate = rate
+        self.max_in_flight = max_in_flight
+        self.lanes = {lane: _Lane(lane, weight, reserved) for lane, (weight, reserved) in (lanes or LANES).items()}
+        self.condition = Condition(Lock())
+        self.next_start = 0.0
+        self.virtual_time = 0.0
+        self.in_flight = 0
+
+    def _admissible(self, lane):
+        """该通道是否还能占用一个并发名额，其他通道未用完的保留名额不能占用"""
+        held = sum(max(0, other.reserved - other.in_flight) for other in self.lanes.values() if other is not lane)
+        return self.max_in_flight - self.in_flight > held
+
+    def _next_lane(self):
+        """有积压且能占用并发名额的通道中虚拟时间最小的，相同时权重高的优先"""
+        candidates = [lane for lane in self.lanes.values() if lane.waiting and self._admissible(lane)]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda lane: (lane.pass_value, -lane.weight))
+
+    @contextmanager
+    def slot(self, lane=None, paced=True):
+        """等待轮到本次请求，代码块内执行请求
+
+        Args:
+            lane: 通道，默认使用当前上下文的通道
+            paced: 为False时不计入速率预算（如获取签名参数），仍受并发上限约束
+
+        Raises:
+            DeadlineExceeded: 等待期间到达截止时间
+        """
+        queue = self.lanes[lane or current_lane()]
+        ticket = object()
+        queued_at = time.monotonic()
+        with self.condition:
+            if not queue.waiting and queue.in_flight == 0:
+                # 空闲的通道重新开始积压时从当前虚拟时间算起，不能用空闲期间的份额插队
+                queue.pass_value = max(queue.pass_value, self.virtual_time)
+            queue.waiting.append(ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = None
+                    if self._next_lane() is queue and queue.waiting[0] is ticket:
+                        if not paced or self.rate <= 0 or now >= self.next_start:
+                            break
+                        wait = self.next_start - now
+                    left = remaining()
+                    if left is not None:
+                        if left <= 0:
+                            raise DeadlineExceeded('等待请求配额时已超过截止时间')
+                        wait = left if wait is None else min(wait, left)
+                    self.condition.wait(wait)
+            except BaseException:
+                queue.waiting.remove(ticket)
+                self.condition.notify_all()
+                raise
+
+            queue.waiting.pop(0)
+            queue.in_flight += 1
+            queue.started += 1
+            queue.wait_seconds += now - queued_at
+            self.virtual_time = queue.pass_value
+            queue.pass_value += 1 / queue.weight
+            self.in_flight += 1
+            if paced and self.rate > 0:
+                self.next_start = max(now, self.next_start) + 1 / self.rate
+            # 下一个请求可能属于其他通道
+            self.condition.notify_all()
+
+        try:
+            yield
+        finally:
+            with self.condition:
+                queue.in_flight -= 1
+                self.in_flight -= 1
+                self.condition.notify_all()
+
+    def stats(self):
+        """各通道的积压、进行中的请求数和平均等待时间"""
+        with self.condition:
+            return {
+                'rate': self.rate,
+                'in_flight': self.in_flight,
+                'lanes': {
+                    lane.name: {
+                        'waiting': len(lane.waiting),
+                        'in_flight': lane.in_flight,
+                        'started': lane.started,
+                        'avg_wait_ms': round(lane.wait_seconds / lane.started * 1000, 1) if lane.started else 0,
+                    }
+                    for lane in self.lanes.values()
+                },
+            }
+
+
+# 进程内的调度器注册表
+_schedulers = {}
+_schedulers_lock = Lock()
+
+
+def get_scheduler(name, **options):
+    """获取或创建指定名称的调度器，同名调度器在进程内共享速率预算
+
+    Args:
+        name: 上游名称
+        **options: 首次创建时传给 RequestScheduler 的参数
+    """
+    with _schedulers_lock:
+        scheduler = _schedulers.get(name)
+        if scheduler is None:
+            scheduler = _schedulers[name] = RequestScheduler(name, **options)
+        return scheduler
+
+
+def scheduler_stats():
+    """所有调度器的状态"""
+    with _schedulers_lock:
+        schedulers = list(_schedulers.values())
+    return {scheduler.name: scheduler.stats() for scheduler in schedulers}
@@ -0,0 +1,140 @@
+"""
+视频全文搜索
+基于SQLite FTS5的trigram分词索引，覆盖标题、UP主名称和分区名，
+由触发器与 video、author 表保持同步
+"""
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from .models import db, Video, Author
+
+logger = logging.getLogger(__name__)
+
+# trigram 分词器无法匹配少于3个字符的词，这类查询退回到LIKE
+MIN_MATCH_LENGTH = 3
+
+# bm25 中各列的权重: 标题、UP主名称、分区名
+COLUMN_WEIGHTS = (10.0, 5.0, 1.0)
+
+_SCHEMA = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS video_fts USING fts5(title, author_name, tname, tokenize='trigram')",
+    """CREATE TRIGGER IF NOT EXISTS video_fts_ai AFTER INSERT ON video BEGIN
+        INSERT INTO video_fts(rowid, title, author_name, tname)
+        VALUES (new.id, new.title, (SELECT name FROM author WHERE mid = new.mid), new.tname);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS video_fts_ad AFTER DELETE ON video BEGIN
+        DELETE FROM video_fts WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS video_fts_au AFTER UPDATE OF title, tname, mid ON video BEGIN
+        UPDATE video_fts SET title = new.title, tname = new.tname,
+            author_name = (SELECT name FROM author WHERE mid = new.mid)
+        WHERE rowid = new.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS video_fts_author_ai AFTER INSERT ON author BEGIN
+        UPDATE video_fts SET author_name = new.name WHERE rowid IN (SELECT id FROM video WHERE mid = new.mid);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS video_fts_author_au AFTER UPDATE OF name ON author BEGIN
+        UPDATE video_fts SET author_name = new.name WHERE rowid IN (SELECT id FROM video WHERE mid = new.mid);
+    END""",
+]
+
+# 全文索引表和同步触发器的名称
+_INDEX_OBJECTS = {
+    'video_fts', 'video_fts_ai', 'video_fts_ad', 'video_fts_au', 'video_fts_author_ai', 'video_fts_author_au',
+}
+
+_REBUILD = [
+    "DELETE FROM video_fts",
+    """INSERT INTO video_fts(rowid, title, author_name, tname)
+        SELECT video.id, video.title, author.name, video.tname
+        FROM video LEFT JOIN author ON author.mid = video.mid""",
+]
+
+
+def ensure_search_index():
+    """创建全文索引和同步触发器，索引与视频表不一致时重建
+
+    需要在应用上下文中调用
+
+    Returns:
+        FTS5索引是否可用；不可用时搜索退回到LIKE查询
+    """
+    if db.engine.dialect.name != 'sqlite':
+        return False
+
+    try:
+        with db.engine.begin() as conn:
+            for statement in _SCHEMA:
+                conn.execute(text(statement))
+            indexed = conn.execute(text("SELECT COUNT(*) FROM video_fts")).scalar()
+            total = conn.execute(text("SELECT COUNT(*) FROM video")).scalar()
+            if indexed != total:
+                logger.info(f"重建全文索引: 索引 {indexed} 条, 视频 {total} 条")
+                for statement in _REBUILD:
+                    conn.execute(text(statement))
+        return True
+    except OperationalError as e:
+        # 旧版SQLite没有FTS5或trigram分词器
+        logger.warning(f"全文索引不可用，搜索将使用LIKE查询: {str(e)}")
+        return False
+
+
+def search_index_ready():
+    """全文索引表和同步触发器是否都已存在，不检查内容是否一致
+
+    用于结构未变化时的快速启动，需要在应用上下文中调用
+    """
+    if db.engine.dialect.name != 'sqlite':
+        return False
+    names = {row[0] for row in db.session.execute(
+        text("SELECT name FROM sqlite_master WHERE name LIKE 'video_fts%'")
+    )}
+    return _INDEX_OBJECTS <= names
+
+
+def _match_expression(terms):
+    """把搜索词转换为FTS5查询表达式，每个词作为短语并以AND连接"""
+    return ' '.join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+def search_videos(query, page=1, per_page=20, use_fts=True):
+    """搜索视频
+
+    Args:
+        query: 搜索字符串，按空白拆分为多个词，所有词都需要匹配
+        page: 页码，从1开始
+        per_page: 每页数量
+        use_fts: 是否使用FTS5索引
+
+    Returns:
+        (匹配总数, 当前页Video列表) 元组，按相关度排序
+    """
+    terms = query.split()
+    if not terms:
+        return 0, []
+    offset = (max(page, 1) - 1) * per_page
+
+    if use_fts and all(len(term) >= MIN_MATCH_LENGTH for term in terms):
+        params = {'q': _match_expression(terms), 'limit': per_page, 'offset': offset}
+        total = db.session.execute(
+            text("SELECT COUNT(*) FROM video_fts WHERE video_fts MATCH :q"), params
+        ).scalar()
+        weights = ', '.join(str(weight) for weight in COLUMN_WEIGHTS)
+        ids = [row[0] for row in db.session.execute(text(
+            f"SELECT rowid FROM video_fts WHERE video_fts MATCH :q "
+            f"ORDER BY bm25(video_fts, {weights}) LIMIT :limit OFFSET :offset"
+        ), params)]
+        videos = {video.id: video for video in Video.query.filter(Video.id.in_(ids)).all()} if ids else {}
+        return total, [videos[video_id] for video_id in ids if video_id in videos]
+
+    # 短词或无索引时使用LIKE
+    conditions = []
+    for term in terms:
+        pattern = f"%{term}%"
+        conditions.append(db.or_(Video.title.like(pattern), Author.name.like(pattern), Video.tname.like(pattern)))
+    like_query = Video.query.outerjoin(Author, Author.mid == Video.mid).filter(*conditions)
+    total = like_query.count()
+    videos = like_query.order_by(Video.view_count.desc()).offset(offset).limit(per_page).all()
+    return total, videos
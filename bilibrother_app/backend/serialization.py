@@ -0,0 +1,260 @@
+"""
+视频数据的快速序列化
+直接读取列元组，不构造ORM对象，也不在Python中逐行格式化时间；
+JSON优先使用orjson编码，较大的响应按客户端支持的编码用brotli或gzip压缩。
+完整视频列表分批读取、编码和压缩，以流式响应返回
+"""
+import gzip
+import json
+import logging
+import zlib
+
+from flask import Response, request, stream_with_context
+
+from .models import db
+from .records import Record
+
+try:
+    import orjson
+except ImportError:  # 未安装时退回标准库json
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # 未安装时只使用gzip
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# 与 Video.to_dict() 相同的字段及对应的SQL表达式，时间在SQLite中格式化
+VIDEO_COLUMNS = (
+    ('id', 'video.id'),
+    ('bvid', 'video.bvid'),
+    ('title', 'video.title'),
+    ('link', 'video.link'),
+    ('view_count', 'video.view_count'),
+    ('danmaku_count', 'video.danmaku_count'),
+    ('coin_count', 'video.coin_count'),
+    ('like_count', 'video.like_count'),
+    ('share_count', 'video.share_count'),
+    ('favorite_count', 'video.favorite_count'),
+    ('tname', 'video.tname'),
+    ('cover_url', 'video.cover_url'),
+    ('duration', 'video.duration'),
+    ('follower_count', 'COALESCE(author.follower_count, 0)'),
+    ('historical_likes', 'COALESCE(author.historical_likes, 0)'),
+    ('archive_count', 'COALESCE(author.archive_count, 0)'),
+    ('mid', 'video.mid'),
+    ('author_name', 'author.name'),
+    ('pubdate', "strftime('%Y-%m-%d %H:%M:%S', video.pubdate)"),
+    ('last_updated', "strftime('%Y-%m-%d %H:%M:%S', video.last_updated)"),
+)
+
+VIDEO_FIELDS = tuple(key for key, _ in VIDEO_COLUMNS)
+
+_VIDEO_SELECT = (
+    f"SELECT {', '.join(expression for _, expression in VIDEO_COLUMNS)} "
+    f"FROM video LEFT JOIN author ON author.mid = video.mid"
+)
+
+# 流式编码时每批读取的行数
+STREAM_BATCH_SIZE = 2000
+
+# 按BV号查询时每批的参数个数，低于SQLite的变量数上限
+BVID_CHUNK_SIZE = 500
+
+# 小于该字节数的响应不压缩
+COMPRESS_MIN_BYTES = 1024
+
+# 压缩级别，偏向速度
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+
+def _video_sql(where, order_by):
+    """拼接视频查询语句"""
+    sql = _VIDEO_SELECT
+    if where:
+        sql += f" WHERE {where}"
+    if order_by:
+        sql += f" ORDER BY {order_by}"
+    return sql
+
+
+def iter_video_rows(where='', params=(), order_by='video.id', batch_size=STREAM_BATCH_SIZE):
+    """分批读取视频列元组的生成器，需要在应用上下文中调用
+
+    Args:
+        where: 可选的SQL条件（不含WHERE关键字），参数用 ? 占位
+        params: 条件参数
+        order_by: 排序表达式
+        batch_size: 每批行数
+
+    Yields:
+        元组列表，列顺序与 VIDEO_FIELDS 相同
+    """
+    # 使用DBAPI游标，直接得到sqlite3的原生元组
+    cursor = db.session.connection().connection.cursor()
+    try:
+        cursor.execute(_video_sql(where, order_by), tuple(params))
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cursor.close()
+
+
+def video_rows(where='', params=(), order_by='video.id'):
+    """一次读取全部匹配的视频列元组，参数同 iter_video_rows"""
+    cursor = db.session.connection().connection.cursor()
+    try:
+        return cursor.execute(_video_sql(where, order_by), tuple(params)).fetchall()
+    finally:
+        cursor.close()
+
+
+def video_records(where='', params=(), order_by='video.id'):
+    """读取视频字典列表，结构与 Video.to_dict() 相同"""
+    return [dict(zip(VIDEO_FIELDS, row)) for row in video_rows(where, params, order_by)]
+
+
+def videos_by_bvid(bvids):
+    """按给定BV号顺序读取视频字典，不存在的BV号被忽略"""
+    bvids = list(dict.fromkeys(bvids))
+    records = {}
+    for start in range(0, len(bvids), BVID_CHUNK_SIZE):
+        chunk = bvids[start:start + BVID_CHUNK_SIZE]
+        placeholders = ', '.join('?' * len(chunk))
+        for record in video_records(f"video.bvid IN ({placeholders})", chunk, order_by=None):
+            records[record['bvid']] = record
+    return [records[bvid] for bvid in bvids if bvid in records]
+
+
+def _encode_default(value):
+    """编码JSON不支持的类型: 爬虫的抓取结果记录"""
+    if isinstance(value, Record):
+        return value.to_dict()
+    raise TypeError(f'无法编码为JSON: {type(value).__name__}')
+
+
+def dumps(payload):
+    """把数据编码为UTF-8 JSON字节串，可以包含爬虫的抓取结果记录"""
+    if orjson is not None:
+        return orjson.dumps(payload, default=_encode_default)
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':'), default=_encode_default).encode('utf-8')
+
+
+def iter_video_json(where='', params=(), order_by='video.id', layout='records'):
+    """逐批生成视频列表的JSON片段，参数同 iter_video_rows
+
+    Args:
+        layout: 'records' 生成与 Video.to_dict() 结构相同的对象数组；
+            'columns' 生成 {"fields": [...], "rows": [[...], ...]}，体积更小
+
+    Yields:
+        JSON字节串片段，拼接后是完整的JSON文档
+    """
+    if layout == 'columns':
+        yield b'{"fields":' + dumps(VIDEO_FIELDS) + b',"rows":['
+    else:
+        yield b'['
+    separator = b''
+    for rows in iter_video_rows(where, params, order_by):
+        if layout != 'columns':
+            rows = [dict(zip(VIDEO_FIELDS, row)) for row in rows]
+        # 去掉每批数组的方括号后拼接
+        yield separator + dumps(rows)[1:-1]
+        separator = b','
+    yield b']}' if layout == 'columns' else b']'
+
+
+def _stream_encoder():
+    """按请求的 Accept-Encoding 选择流式压缩器
+
+    Returns:
+        (编码名, 压缩函数, 结束函数)，客户端不接受压缩时返回None
+    """
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        return 'br', compressor.process, compressor.finish
+    if accepted['gzip']:
+        # wbits=31 输出gzip格式
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        return 'gzip', compressor.compress, compressor.flush
+    return None
+
+
+def stream_json(chunks, status=200):
+    """把JSON片段生成器包装为流式响应，按需逐块压缩
+
+    生成器在请求上下文中执行，可以继续读取数据库
+
+    Args:
+        chunks: 生成JSON字节串片段的可迭代对象
+        status: HTTP状态码
+
+    Returns:
+        Flask流式响应
+    """
+    encoder = _stream_encoder()
+
+    def generate():
+        if encoder is None:
+            yield from chunks
+            return
+        _, compress, finish = encoder
+        for chunk in chunks:
+            data = compress(chunk)
+            if data:
+                yield data
+        yield finish()
+
+    response = Response(stream_with_context(generate()), status=status, mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+    if encoder is not None:
+        response.headers['Content-Encoding'] = encoder[0]
+    return response
+
+
+def compress_response(response):
+    """按请求的 Accept-Encoding 压缩响应体，优先brotli，其次gzip
+
+    Args:
+        response: 未压缩的Flask响应
+
+    Returns:
+        同一个响应对象
+    """
+    response.vary.add('Accept-Encoding')
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_BYTES or 'Content-Encoding' in response.headers:
+        return response
+
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        encoding, body = 'br', brotli.compress(body, quality=BROTLI_QUALITY)
+    elif accepted['gzip']:
+        encoding, body = 'gzip', gzip.compress(body, compresslevel=GZIP_LEVEL)
+    else:
+        return response
+
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def json_response(payload, status=200):
+    """生成JSON响应，替代 jsonify 用于大数据量的接口
+
+    Args:
+        payload: 可JSON序列化的数据
+        status: HTTP状态码
+
+    Returns:
+        Flask响应，较大时已压缩
+    """
+    response = Response(dumps(payload), status=status, mimetype='application/json')
+    return compress_response(response)
@@ -0,0 +1,109 @@
+"""
+生产模式WSGI服务
+POSIX系统使用gunicorn多进程+多线程；Windows或未安装gunicorn时使用waitress多线程。
+应用在主进程中创建（数据库建表和迁移只执行一次），每个worker在fork之后
+重建数据库连接池并启动自己的后台任务
+"""
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# 默认worker进程数和每个进程的线程数
+DEFAULT_WORKERS = min((os.cpu_count() or 1) + 1, 4)
+DEFAULT_THREADS = 8
+
+# 长时间的刷新请求在线程中执行，超时只用于检测卡死的worker（秒）
+WORKER_TIMEOUT = 120
+
+# 平滑重启时等待进行中请求完成的时间（秒）
+GRACEFUL_TIMEOUT = 30
+
+# 每个worker处理该数量的请求后自动轮换，加上随机抖动避免同时重启
+MAX_REQUESTS = 5000
+MAX_REQUESTS_JITTER = 500
+
+
+def after_fork(app):
+    """在worker进程中重建从主进程继承的状态
+
+    - 丢弃继承的数据库连接，子进程使用自己的连接
+    - 启动后台任务（新投稿检查），由多个worker间的文件锁保证只有一个在执行
+    """
+    from .models import db
+
+    with app.app_context():
+        # close=False: 不关闭父进程仍可能在用的连接，只是不再复用
+        db.engine.dispose(close=False)
+    app.extensions['bilibrother'].start_background_tasks()
+    logger.info(f"worker {os.getpid()} 已初始化")
+
+
+def _serve_gunicorn(app, host, port, workers, threads):
+    """使用gunicorn启动多进程服务"""
+    from gunicorn.app.base import BaseApplication
+
+    class BiliBrotherServer(BaseApplication):
+        """内嵌的gunicorn应用，直接使用已创建的Flask应用"""
+
+        def __init__(self, application, options):
+            self.application = application
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return self.application
+
+    options = {
+        'bind': f'{host}:{port}',
+        'workers': workers,
+        'threads': threads,
+        'worker_class': 'gthread',
+        'preload_app': True,
+        'timeout': WORKER_TIMEOUT,
+        'graceful_timeout': GRACEFUL_TIMEOUT,
+        'max_requests': MAX_REQUESTS,
+        'max_requests_jitter': MAX_REQUESTS_JITTER,
+        'post_fork': lambda server, worker: after_fork(app),
+    }
+    logger.info(f"使用gunicorn启动: {host}:{port}, {workers} 个进程 x {threads} 个线程 "
+                f"(kill -HUP {os.getpid()} 平滑重启worker)")
+    BiliBrotherServer(app, options).run()
+
+
+def _serve_waitress(app, host, port, threads):
+    """使用waitress启动单进程多线程服务"""
+    from waitress import serve
+
+    app.extensions['bilibrother'].start_background_tasks()
+    logger.info(f"使用waitress启动: {host}:{port}, {threads} 个线程")
+    serve(app, host=host, port=port, threads=threads)
+
+
+def serve_production(app, host='0.0.0.0', port=10000, workers=DEFAULT_WORKERS, threads=DEFAULT_THREADS):
+    """以生产模式启动服务
+
+    Args:
+        app: 以 start_background=False 创建的Flask应用实例
+        host: 监听地址
+        port: 监听端口
+        workers: worker进程数，waitress下忽略
+        threads: 每个进程的线程数
+    """
+    if os.name != 'nt':
+        try:
+            return _serve_gunicorn(app, host, port, workers, threads)
+        except ImportError:
+            logger.warning("未安装gunicorn，改用waitress单进程多线程模式")
+
+    try:
+        return _serve_waitress(app, host, port, threads)
+    except ImportError:
+        logger.warning("未安装waitress，改用Flask内置服务器的多线程模式")
+
+    app.extensions['bilibrother'].start_background_tasks()
+    app.run(host=host, port=port, threaded=True)
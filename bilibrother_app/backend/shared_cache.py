@@ -0,0 +1,378 @@
+"""
+进程间共享缓存
+基于独立的SQLite文件，不依赖外部服务。支持过期时间、基于版本号的原子
+比较并设置（CAS）、条目数上限及近似LRU淘汰，以及跨进程的单飞计算：
+多个worker同时请求同一个缺失的键时只有一个执行计算，其余等待结果
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 默认条目数上限
+DEFAULT_MAX_ENTRIES = 10000
+
+# 每个进程每写入该次数检查一次是否超过上限
+EVICT_CHECK_EVERY = 100
+
+# 读取时距上次记录访问超过该时长才更新访问时间，避免每次读取都写库（秒）
+TOUCH_INTERVAL = 60
+
+# 单飞计算时等待其他进程结果的默认最长时间（秒）
+DEFAULT_COMPUTE_WAIT = 15
+
+# 单飞计算锁的过期时间（秒），需长于计算耗时；计算方崩溃未释放锁时，之后的请求在过期后重新计算
+COMPUTE_LOCK_TTL = 120
+
+# 等待其他进程计算结果时的轮询间隔（秒）
+POLL_INTERVAL = 0.05
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    expires_at REAL,
+    accessed_at REAL NOT NULL
+)
+"""
+
+_MISSING = object()
+
+
+class SharedCache:
+    """SQLite实现的进程间共享缓存
+
+    值以JSON存储，只能缓存可JSON序列化的数据。每个线程使用独立连接，
+    fork之后在子进程中自动重新连接
+    """
+
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES):
+        """初始化缓存
+
+        Args:
+            path: 缓存数据库文件路径，所有进程使用同一路径即可共享
+            max_entries: 条目数上限，超过时先清理过期条目，再淘汰最久未访问的条目
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(_SCHEMA)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_accessed_at ON cache (accessed_at)")
+
+    def _connect(self):
+        """当前线程的连接，fork之后重新建立"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _lookup(self, key):
+        """读取未过期的条目
+
+        Returns:
+            (值, 版本号)，不存在或已过期时为 (_MISSING, None)
+        """
+        now = time.time()
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT value, version, accessed_at FROM cache WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, now)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return _MISSING, None
+        self.hits += 1
+        if now - row[2] > TOUCH_INTERVAL:
+            conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(row[0]), row[1]
+
+    def _is_live(self, key):
+        """键是否存在且未过期（不计入命中统计）"""
+        return self._connect().execute(
+            "SELECT 1 FROM cache WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, time.time())
+        ).fetchone() is not None
+
+    def _after_write(self):
+        """按写入次数触发淘汰检查"""
+        self._writes += 1
+        if self._writes % EVICT_CHECK_EVERY == 0:
+            self.evict()
+
+    @staticmethod
+    def _expires_at(ttl):
+        return time.time() + ttl if ttl else None
+
+    def get(self, key, default=None):
+        """读取键的值，不存在或已过期时返回 default"""
+        value, _ = self._lookup(key)
+        return default if value is _MISSING else value
+
+    def get_with_version(self, key):
+        """读取键的值和版本号，用于之后的 compare_and_set
+
+        Returns:
+            (值, 版本号)，不存在或已过期时为 (None, None)
+        """
+        value, version = self._lookup(key)
+        return (None, None) if value is _MISSING else (value, version)
+
+    def set(self, key, value, ttl=None):
+        """写入键的值
+
+        Args:
+            key: 键
+            value: 可JSON序列化的值
+            ttl: 过期时间（秒），为None时不过期
+
+        Returns:
+            写入后的版本号
+        """
+        now = time.time()
+        conn = self._connect()
+        # 写入和读取版本号在同一个写事务中完成（不依赖较新SQLite才有的RETURNING）
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO cache (key, value, version, expires_at, accessed_at) VALUES (?, ?, 1, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, version = cache.version + 1, "
+                "expires_at = excluded.expires_at, accessed_at = excluded.accessed_at",
+                (key, json.dumps(value, ensure_ascii=False), self._expires_at(ttl), now)
+            )
+            version = conn.execute("SELECT version FROM cache WHERE key = ?", (key,)).fetchone()[0]
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._after_write()
+        return version
+
+    def add(self, key, value, ttl=None):
+        """仅当键不存在或已过期时写入
+
+        Returns:
+            是否写入成功
+        """
+        return self.compare_and_set(key, value, None, ttl)
+
+    def compare_and_set(self, key, value, expected_version, ttl=None):
+        """原子比较并设置
+
+        Args:
+            key: 键
+            value: 新值
+            expected_version: get_with_version 返回的版本号；为None表示要求键不存在或已过期
+            ttl: 新的过期时间（秒）
+
+        Returns:
+            版本号匹配并写入成功时为True
+        """
+        now = time.time()
+        conn = self._connect()
+        encoded = json.dumps(value, ensure_ascii=False)
+        if expected_version is None:
+            cursor = conn.execute(
+                "INSERT INTO cache (key, value, version, expires_at, accessed_at) VALUES (?, ?, 1, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, version = cache.version + 1, "
+                "expires_at = excluded.expires_at, accessed_at = excluded.accessed_at "
+                "WHERE cache.expires_at IS NOT NULL AND cache.expires_at <= ?",
+                (key, encoded, self._expires_at(ttl), now, now)
+            )
+        else:
+            cursor = conn.execute(
+                "UPDATE cache SET value = ?, version = version + 1, expires_at = ?, accessed_at = ? "
+                "WHERE key = ? AND version = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (encoded, self._expires_at(ttl), now, key, expected_version, now)
+            )
+        if cursor.rowcount != 1:
+            return False
+        self._after_write()
+        return True
+
+    def delete(self, key):
+        """删除键"""
+        self._connect().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def get_or_compute(self, key, compute, ttl=None, wait=DEFAULT_COMPUTE_WAIT, lock_ttl=COMPUTE_LOCK_TTL):
+        """读取键的值，缺失时计算并写入，跨进程只计算一次
+
+        Args:
+            key: 键
+            compute: 无参数的计算函数，返回None表示失败，失败结果不缓存
+            ttl: 结果的过期时间（秒）
+            wait: 其他进程正在计算时最多等待的时间（秒），超时后自行计算
+            lock_ttl: 计算锁的过期时间（秒），计算期间锁一直有效，不受 wait 影响
+
+        Returns:
+            缓存或计算得到的值
+        """
+        value, _ = self._lookup(key)
+        if value is not _MISSING:
+            return value
+
+        lock_key = f'{key}#computing'
+        if self.add(lock_key, os.getpid(), ttl=lock_ttl):
+            try:
+                value = compute()
+                if value is not None:
+                    self.set(key, value, ttl)
+                return value
+            finally:
+                self.delete(lock_key)
+
+        # 其他进程或线程正在计算，等待其结果
+        deadline = time.time() + wait
+        while time.time() < deadline:
+            time.sleep(POLL_INTERVAL)
+            value, _ = self._lookup(key)
+            if value is not _MISSING:
+                return value
+            if not self._is_live(lock_key):
+                # 计算方已结束但没有写入结果（失败），不再等待
+                break
+        return compute()
+
+    def evict(self):
+        """清理过期条目，超过上限时淘汰最久未访问的条目
+
+        Returns:
+            删除的条目数
+        """
+        conn = self._connect()
+        removed = conn.execute("DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),)).rowcount
+        excess = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0] - self.max_entries
+        if excess > 0:
+            removed += conn.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed_at LIMIT ?)", (excess,)
+            ).rowcount
+        if removed:
+            logger.debug(f"共享缓存淘汰 {removed} 个条目")
+        return removed
+
+    def clear(self):
+        """清空缓存"""
+        self._connect().execute("DELETE FROM cache")
+
+    def stats(self):
+        """缓存条目数和本进程的命中统计"""
+        entries = self._connect().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        return {'entries': entries, 'max_entries': self.max_entries, 'hits': self.hits, 'misses': self.misses}
+
+
+class MemoryCache:
+    """进程内缓存，接口与 SharedCache 相同，用于未配置共享缓存时"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._computing = {}
+        self._entries = {}  # key -> [值, 版本号, 过期时间, 访问时间]
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (entry[2] is not None and entry[2] <= now):
+                self.misses += 1
+                return _MISSING, None
+            self.hits += 1
+            entry[3] = now
+            return entry[0], entry[1]
+
+    def _store(self, key, value, ttl, version):
+        now = time.time()
+        self._entries[key] = [value, version, now + ttl if ttl else None, now]
+        if len(self._entries) > self.max_entries:
+            self._evict_locked()
+
+    def _evict_locked(self):
+        now = time.time()
+        removed = 0
+        for key in [key for key, entry in self._entries.items() if entry[2] is not None and entry[2] <= now]:
+            del self._entries[key]
+            removed += 1
+        excess = len(self._entries) - self.max_entries
+        if excess > 0:
+            for key in sorted(self._entries, key=lambda key: self._entries[key][3])[:excess]:
+                del self._entries[key]
+                removed += 1
+        return removed
+
+    def get(self, key, default=None):
+        value, _ = self._lookup(key)
+        return default if value is _MISSING else value
+
+    def get_with_version(self, key):
+        value, version = self._lookup(key)
+        return (None, None) if value is _MISSING else (value, version)
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            version = entry[1] + 1 if entry else 1
+            self._store(key, value, ttl, version)
+            return version
+
+    def add(self, key, value, ttl=None):
+        return self.compare_and_set(key, value, None, ttl)
+
+    def compare_and_set(self, key, value, expected_version, ttl=None):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            live = entry is not None and (entry[2] is None or entry[2] > now)
+            if (expected_version is None and live) or \
+                    (expected_version is not None and (not live or entry[1] != expected_version)):
+                return False
+            self._store(key, value, ttl, entry[1] + 1 if entry else 1)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def get_or_compute(self, key, compute, ttl=None, wait=DEFAULT_COMPUTE_WAIT, lock_ttl=COMPUTE_LOCK_TTL):
+        value, _ = self._lookup(key)
+        if value is not _MISSING:
+            return value
+        with self._lock:
+            key_lock = self._computing.setdefault(key, threading.Lock())
+        with key_lock:
+            # 等待期间其他线程可能已经算出结果
+            value, _ = self._lookup(key)
+            if value is not _MISSING:
+                return value
+            try:
+                value = compute()
+                if value is not None:
+                    self.set(key, value, ttl)
+                return value
+            finally:
+                with self._lock:
+                    self._computing.pop(key, None)
+
+    def evict(self):
+        with self._lock:
+            return self._evict_locked()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {'entries': len(self._entries), 'max_entries': self.max_entries, 'hits': self.hits, 'misses': self.misses}
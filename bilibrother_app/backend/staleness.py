@@ -0,0 +1,97 @@
+"""
+刷新时效策略
+根据视频的最后抓取时间和发布时长判断是否需要重新抓取
+"""
+import json
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, func, or_, select
+
+from .models import Video, VideoCheck
+
+logger = logging.getLogger(__name__)
+
+# 默认过期阈值（秒）：距上次抓取超过该时长才重新抓取
+DEFAULT_STALE_SECONDS = 3600
+
+# 默认按视频发布时长分档的过期阈值: [(发布天数上限, 过期秒数), ...]，上限为None表示兜底档
+DEFAULT_STALE_TIERS = [
+    (7, 3600),             # 一周内的新视频: 1小时
+    (30, 6 * 3600),        # 一个月内: 6小时
+    (365, 24 * 3600),      # 一年内: 1天
+    (None, 7 * 24 * 3600), # 更老的视频: 7天
+]
+
+
+def parse_stale_tiers(raw):
+    """解析分档配置
+
+    Args:
+        raw: JSON字符串或列表，形如 [[7, 3600], [30, 21600], [null, 604800]]
+
+    Returns:
+        按发布天数升序排列的 (天数上限, 过期秒数) 列表，解析失败返回默认分档
+    """
+    if not raw:
+        return list(DEFAULT_STALE_TIERS)
+
+    try:
+        tiers = json.loads(raw) if isinstance(raw, str) else raw
+        parsed = [(None if days is None else float(days), float(seconds)) for days, seconds in tiers]
+    except (TypeError, ValueError) as e:
+        logger.warning(f"刷新分档配置无效，使用默认值: {str(e)}")
+        return list(DEFAULT_STALE_TIERS)
+
+    # 有上限的档位按天数排序，兜底档放到最后
+    bounded = sorted((tier for tier in parsed if tier[0] is not None), key=lambda tier: tier[0])
+    fallback = [tier for tier in parsed if tier[0] is None]
+    return bounded + fallback[:1]
+
+
+def stale_condition(stale_seconds=DEFAULT_STALE_SECONDS, tiers=None, now=None):
+    """构造筛选过期视频的SQL条件
+
+    不分档时只比较最后抓取时间；分档时按 pubdate 落入的档位使用对应阈值，
+    未知发布时间的视频使用 stale_seconds。最后抓取时间取自 video_check，
+    没有记录的视频使用 last_updated。
+
+    Args:
+        stale_seconds: 基础过期阈值（秒）
+        tiers: parse_stale_tiers 返回的分档列表，None表示不分档
+        now: 当前时间，默认 datetime.now()
+
+    Returns:
+        SQLAlchemy 条件表达式
+    """
+    now = now or datetime.now()
+    checked_at = func.coalesce(
+        select(VideoCheck.checked_at).where(VideoCheck.video_id == Video.id).scalar_subquery(),
+        Video.last_updated
+    )
+    never_updated = checked_at.is_(None)
+
+    def older_than(seconds):
+        return checked_at < now - timedelta(seconds=seconds)
+
+    if not tiers:
+        return or_(never_updated, older_than(stale_seconds))
+
+    conditions = [never_updated, and_(Video.pubdate.is_(None), older_than(stale_seconds))]
+    lower_bound = None  # 上一档的发布时间下限
+    for max_days, seconds in tiers:
+        tier_range = [Video.pubdate.isnot(None)]
+        if max_days is not None:
+            tier_range.append(Video.pubdate >= now - timedelta(days=max_days))
+        if lower_bound is not None:
+            tier_range.append(Video.pubdate < lower_bound)
+        conditions.append(and_(*tier_range, older_than(seconds)))
+        if max_days is None:
+            break
+        lower_bound = now - timedelta(days=max_days)
+    else:
+        # 未配置兜底档时，超出所有档位的老视频使用基础阈值
+        if lower_bound is not None:
+            conditions.append(and_(Video.pubdate < lower_bound, older_than(stale_seconds)))
+
+    return or_(*conditions)
@@ -0,0 +1,217 @@
+"""
+前端构建文件的静态服务
+启动时扫描 frontend/build 生成内存清单，请求时只查字典，不访问文件系统。
+带内容哈希的文件名（如 main.3f2a1b9c.js）长期缓存；其余文件（index.html 等）每次协商缓存。
+可压缩的文件预先生成 .br/.gz 版本并写回构建目录，下次启动直接复用
+"""
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+
+from flask import Response, request, send_file
+
+from .serialization import brotli
+
+logger = logging.getLogger(__name__)
+
+# 构建工具生成的带内容哈希的文件名，如 main.3f2a1b9c.js、787.1a2b3c4d.chunk.css
+HASHED_NAME = re.compile(r'\.[0-9a-f]{8,}\.')
+
+# 带哈希的文件内容不会变化，缓存一年且不再验证
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+# 其余文件每次通过ETag协商
+REVALIDATE_CACHE = 'no-cache'
+
+# 单个文件不超过该字节数时内容常驻内存，否则请求时从磁盘发送
+MAX_MEMORY_BYTES = 4 * 2 ** 20
+
+# 小于该字节数的文件不预压缩
+PRECOMPRESS_MIN_BYTES = 1024
+
+# 预压缩只做一次，使用最高压缩级别
+PRECOMPRESS_GZIP_LEVEL = 9
+PRECOMPRESS_BROTLI_QUALITY = 11
+
+# 值得压缩的内容类型
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'application/manifest+json',
+                      'application/xml', 'image/svg+xml')
+
+# 预压缩文件的扩展名和对应的编码，按优先级排列
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+INDEX_FILE = 'index.html'
+
+
+class StaticAsset:
+    """清单中的一个文件"""
+
+    def __init__(self, path, mimetype, etag, last_modified, immutable, data=None, variants=None):
+        self.path = path
+        self.mimetype = mimetype
+        self.etag = etag
+        self.last_modified = last_modified
+        self.immutable = immutable
+        # 文件内容，过大的文件为None
+        self.data = data
+        # 编码名 -> 压缩后的内容
+        self.variants = variants or {}
+
+
+def _compressible(mimetype):
+    """内容类型是否值得压缩"""
+    return mimetype.startswith(COMPRESSIBLE_TYPES)
+
+
+def _compress(encoding, data):
+    """用指定编码压缩内容"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=PRECOMPRESS_BROTLI_QUALITY)
+    # mtime=0 使相同内容的输出相同
+    return gzip.compress(data, compresslevel=PRECOMPRESS_GZIP_LEVEL, mtime=0)
+
+
+def _read_variant(path, mtime):
+    """读取不早于源文件的预压缩文件，不存在或已过期时返回None"""
+    try:
+        if os.stat(path).st_mtime < mtime:
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _write_variant(path, data):
+    """把预压缩结果写回构建目录，目录只读时只保留在内存中"""
+    temp_path = f'{path}.tmp{os.getpid()}'
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except OSError as e:
+        logger.debug(f"无法写入预压缩文件 {path}: {str(e)}")
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+
+class StaticManifest:
+    """前端构建目录的内存清单
+
+    清单在创建时生成，之后只读，可以被多个线程同时使用。
+    重新构建前端后需要重启后端（或调用 build()）才会生效
+    """
+
+    def __init__(self, root):
+        """
+        Args:
+            root: 前端构建目录
+        """
+        self.root = os.path.abspath(root)
+        self.assets = {}
+        self.build()
+
+    def build(self):
+        """扫描构建目录，生成清单并准备预压缩版本"""
+        assets = {}
+        precompressed = 0
+        for directory, _, filenames in os.walk(self.root):
+            names = set(filenames)
+            for filename in filenames:
+                # 预压缩文件作为源文件的变体，不单独提供
+                if any(filename.endswith(suffix) and filename[:-len(suffix)] in names for _, suffix in ENCODINGS):
+                    continue
+                full_path = os.path.join(directory, filename)
+                asset, generated = self._load(full_path)
+                key = os.path.relpath(full_path, self.root).replace(os.sep, '/')
+                assets[key] = asset
+                precompressed += generated
+
+        self.assets = assets
+        if assets:
+            logger.info(f"前端静态文件清单: {len(assets)} 个文件，新生成 {precompressed} 个预压缩文件")
+        return self
+
+    def _load(self, full_path):
+        """读取一个文件的元数据、内容和预压缩版本
+
+        Returns:
+            (StaticAsset, 新生成的预压缩文件数)
+        """
+        stat = os.stat(full_path)
+        mimetype = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+        immutable = bool(HASHED_NAME.search(os.path.basename(full_path)))
+        if stat.st_size > MAX_MEMORY_BYTES:
+            etag = f'{stat.st_size:x}-{int(stat.st_mtime):x}'
+            return StaticAsset(full_path, mimetype, etag, stat.st_mtime, immutable), 0
+
+        with open(full_path, 'rb') as f:
+            data = f.read()
+        etag = hashlib.sha1(data).hexdigest()[:20]
+
+        variants = {}
+        generated = 0
+        if _compressible(mimetype) and len(data) >= PRECOMPRESS_MIN_BYTES:
+            for encoding, suffix in ENCODINGS:
+                if encoding == 'br' and brotli is None:
+                    continue
+                variant = _read_variant(full_path + suffix, stat.st_mtime)
+                if variant is None:
+                    variant = _compress(encoding, data)
+                    _write_variant(full_path + suffix, variant)
+                    generated += 1
+                # 压缩后没有变小的不使用
+                if len(variant) < len(data):
+                    variants[encoding] = variant
+        return StaticAsset(full_path, mimetype, etag, stat.st_mtime, immutable, data, variants), generated
+
+    def lookup(self, path):
+        """查找文件，找不到时返回 index.html（前端路由），构建目录不存在时返回None"""
+        return self.assets.get(path) or self.assets.get(INDEX_FILE)
+
+    def response(self, path):
+        """生成静态文件响应，需要在请求上下文中调用
+
+        Args:
+            path: 相对构建目录的路径
+
+        Returns:
+            Flask响应，构建目录中没有该文件和 index.html 时返回None
+        """
+        asset = self.lookup(path)
+        if asset is None:
+            return None
+
+        if asset.data is None:
+            response = send_file(asset.path, mimetype=asset.mimetype, etag=asset.etag,
+                                 last_modified=asset.last_modified, max_age=0)
+        else:
+            accepted = request.accept_encodings
+            encoding = next((name for name, _ in ENCODINGS if name in asset.variants and accepted[name]), None)
+            body = asset.variants[encoding] if encoding else asset.data
+            response = Response(body, mimetype=asset.mimetype)
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+            if asset.variants:
+                response.vary.add('Accept-Encoding')
+            # 不同编码的内容不同，ETag也要区分
+            response.set_etag(f'{asset.etag}-{encoding}' if encoding else asset.etag)
+            response.last_modified = asset.last_modified
+
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE if asset.immutable else REVALIDATE_CACHE
+        return response.make_conditional(request)
+
+    def stats(self):
+        """清单统计信息"""
+        return {
+            'files': len(self.assets),
+            'memory_bytes': sum(
+                len(asset.data) + sum(len(variant) for variant in asset.variants.values())
+                for asset in self.assets.values() if asset.data is not None
+            ),
+            'precompressed': sum(1 for asset in self.assets.values() if asset.variants),
+        }
@@ -0,0 +1,206 @@
+"""
+计数历史的降采样查询
+从 StatSample 读取视频在时间范围内的计数采样，用NumPy在服务端降采样到指定点数后返回，
+绘制几周的采样曲线时不需要把全部采样传给浏览器:
+    lttb: Largest-Triangle-Three-Buckets，保留曲线的形状
+    minmax: 按时间等分区间，保留每个区间的最小值和最大值，不会漏掉尖峰
+结果按 (视频, 时间范围, 点数, 方法, 字段) 缓存在进程内，视频有新的采样时失效
+"""
+from collections import OrderedDict
+from threading import Lock
+
+import numpy as np
+
+from .models import db, Video, StatSample
+
+METHODS = ('lttb', 'minmax')
+
+# 默认和最多返回的点数
+DEFAULT_POINTS = 500
+MAX_POINTS = 5000
+
+# 一次最多查询的视频数
+MAX_VIDEOS = 20
+
+# 缓存的条目数上限，超过时淘汰最久未使用的
+CACHE_ENTRIES = 512
+
+
+def lttb(x, y, threshold):
+    """Largest-Triangle-Three-Buckets 降采样
+
+    首尾两点固定保留，中间的点均分为 threshold-2 个区间，每个区间选出与上一个选中点、
+    下一个区间平均点构成的三角形面积最大的点
+
+    Args:
+        x: 升序的时间数组
+        y: 数值数组
+        threshold: 目标点数
+
+    Returns:
+        选中点的下标数组（升序），点数不超过目标时返回全部下标
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = x.astype(np.float64)
+    y = y.astype(np.float64)
+    every = (n - 2) / (threshold - 2)
+    # 第i个区间为 [bounds[i], bounds[i+1])，最后一个区间结束于末点之前
+    bounds = np.floor(np.arange(threshold - 1) * every).astype(np.int64) + 1
+    counts = np.diff(bounds)
+    avg_x = np.add.reduceat(x[:n - 1], bounds[:-1]) / counts
+    avg_y = np.add.reduceat(y[:n - 1], bounds[:-1]) / counts
+    # 每个区间的下一个区间的平均点，最后一个区间用末点
+    next_x = np.append(avg_x[1:], x[-1])
+    next_y = np.append(avg_y[1:], y[-1])
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi = bounds[i], bounds[i + 1]
+        area = np.abs((x[a] - next_x[i]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y[i] - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax(x, y, threshold):
+    """按时间等分区间，每个区间保留最小值和最大值所在的点，另外保留首尾两点
+
+    Args:
+        x: 升序的时间数组
+        y: 数值数组
+        threshold: 目标点数
+
+    Returns:
+        选中点的下标数组（升序），点数不超过目标时返回全部下标
+    """
+    n = len(x)
+    if threshold >= n or threshold < 4:
+        return np.arange(n)
+
+    buckets = (threshold - 2) // 2
+    x = x.astype(np.int64)
+    span = max(int(x[-1] - x[0]), 1)
+    bucket = np.minimum((x - x[0]) * buckets // span, buckets - 1)
+    # 按 (区间, 数值) 排序，每组的第一个是最小值，最后一个是最大值
+    order = np.lexsort((y, bucket))
+    sorted_bucket = bucket[order]
+    starts = np.flatnonzero(np.r_[True, sorted_bucket[1:] != sorted_bucket[:-1]])
+    ends = np.r_[starts[1:], n] - 1
+    return np.unique(np.concatenate(([0, n - 1], order[starts], order[ends])))
+
+
+_DOWNSAMPLERS = {'lttb': lttb, 'minmax': minmax}
+
+
+def load_samples(video_id, fields, start=None, end=None):
+    """读取一个视频在时间范围内的采样
+
+    Returns:
+        (时间数组, {字段: 数值数组})，按时间升序
+    """
+    columns = ', '.join(f'COALESCE({field}, 0)' for field in fields)
+    # 直接使用DBAPI游标，跳过逐行构造 Row 对象
+    cursor = db.session.connection().connection.cursor()
+    try:
+        rows = cursor.execute(
+            f"SELECT ts, {columns} FROM {StatSample.__table__.name} "
+            f"WHERE video_id = ? AND ts >= ? AND ts <= ? ORDER BY ts",
+            (video_id, start if start is not None else 0, end if end is not None else 2 ** 62)
+        ).fetchall()
+    finally:
+        cursor.close()
+    data = np.array(rows, dtype=np.int64).reshape(-1, len(fields) + 1)
+    return data[:, 0], {field: data[:, i + 1] for i, field in enumerate(fields)}
+
+
+def downsample(ts, values, points, method='lttb'):
+    """对每个字段分别降采样
+
+    Returns:
+        {字段: [[时间, 数值], ...]}
+    """
+    downsampler = _DOWNSAMPLERS[method]
+    series = {}
+    for field, column in values.items():
+        index = downsampler(ts, column, points)
+        series[field] = np.column_stack((ts[index], column[index])).tolist()
+    return series
+
+
+class SeriesCache:
+    """降采样结果的LRU缓存，以视频最新的采样时间作为版本，有新采样时重新计算"""
+
+    def __init__(self, max_entries=CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def query(self, bvids, fields=('view_count',), start=None, end=None, points=DEFAULT_POINTS, method='lttb'):
+        """查询多个视频降采样后的计数曲线，需要在应用上下文中调用
+
+        Args:
+            bvids: BV号列表
+            fields: 计数字段，取自 Video.COUNTER_FIELDS
+            start: 起始时间（Unix时间戳），默认不限
+            end: 结束时间（Unix时间戳），默认到最新的采样
+            points: 每条曲线的目标点数
+            method: 'lttb' 或 'minmax'
+
+        Returns:
+            {'series': {BV号: {'samples': 范围内的采样数, 字段: [[时间, 数值], ...]}}, 'missing': 不存在的BV号}
+
+        Raises:
+            ValueError: 字段或方法无效
+        """
+        fields = tuple(fields)
+        unknown = [field for field in fields if field not in Video.COUNTER_FIELDS]
+        if unknown or not fields:
+            raise ValueError(f"无效的字段: {', '.join(unknown)}，可选 {', '.join(Video.COUNTER_FIELDS)}")
+        if method not in _DOWNSAMPLERS:
+            raise ValueError(f"无效的降采样方法: {method}，可选 {', '.join(METHODS)}")
+
+        video_ids = dict(db.session.query(Video.bvid, Video.id).filter(Video.bvid.in_(bvids)).all())
+        # 每个视频最新的采样时间，走 (video_id, ts) 索引
+        versions = dict(
+            db.session.query(StatSample.video_id, db.func.max(StatSample.ts))
+            .filter(StatSample.video_id.in_(list(video_ids.values()))).group_by(StatSample.video_id).all()
+        ) if video_ids else {}
+
+        series = {}
+        for bvid in bvids:
+            video_id = video_ids.get(bvid)
+            if video_id is None:
+                continue
+            key = (video_id, fields, start, end, points, method)
+            version = versions.get(video_id)
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] == version:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    series[bvid] = entry[1]
+                    continue
+                self.misses += 1
+
+            ts, values = load_samples(video_id, fields, start, end)
+            result = {'samples': len(ts), **downsample(ts, values, points, method)}
+            series[bvid] = result
+            with self._lock:
+                self._entries[key] = (version, result)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+        return {'series': series, 'missing': [bvid for bvid in bvids if bvid not in video_ids]}
+
+    def stats(self):
+        """缓存条目数和命中次数"""
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,265 @@
+"""
+视频增长趋势计算
+基于 StatSample 计数采样，用NumPy批量计算各时间窗口内的增量、加速度
+和相对同分区视频的z分数
+"""
+import logging
+import time
+from itertools import chain
+from threading import Lock
+
+import numpy as np
+
+from .models import db
+
+logger = logging.getLogger(__name__)
+
+# 增量统计窗口（秒）
+WINDOWS = {'1h': 3600, '24h': 24 * 3600, '7d': 7 * 24 * 3600}
+
+# 加速度比较的两个相邻窗口长度（秒）
+ACCELERATION_WINDOW = 24 * 3600
+
+# 内存中保留的采样时长，需覆盖最长窗口并留出余量
+RETENTION_SECONDS = max(max(WINDOWS.values()), 2 * ACCELERATION_WINDOW) + 24 * 3600
+
+
+def _sample_keys(video_ids, ts):
+    """把 (video_id, ts) 编码为单调的int64排序键"""
+    return (video_ids.astype(np.int64) << 32) | ts.astype(np.int64)
+
+
+def compute_trending(video_ids, ts, views, likes, now=None):
+    """批量计算每个视频的增长指标
+
+    所有输入数组需按 (video_id, ts) 升序排列。计数没有变化时不写采样，
+    所以两条采样之间的计数视为等于前一条，窗口统一截止到 now；
+    窗口起点之前没有采样时使用该视频最早的一条采样，即按已有的时长计算增量。
+
+    Args:
+        video_ids: 视频id数组
+        ts: 采样时间戳数组
+        views: 播放量数组
+        likes: 点赞数数组
+        now: 窗口截止时间（Unix时间戳），默认为每个视频最后一条采样的时间
+
+    Returns:
+        列名到数组的字典，每个视频一个元素
+    """
+    if len(video_ids) == 0:
+        return {'video_id': np.empty(0, dtype=np.int64)}
+
+    keys = _sample_keys(video_ids, ts)
+    starts = np.flatnonzero(np.r_[True, video_ids[1:] != video_ids[:-1]])
+    ends = np.r_[starts[1:], len(video_ids)] - 1
+    unique_ids = video_ids[starts].astype(np.int64)
+    last_ts = ts[ends].astype(np.int64)
+    anchor = last_ts if now is None else np.full(len(unique_ids), int(now), dtype=np.int64)
+
+    def index_at(offset):
+        """每个视频在 anchor - offset 时刻或之前的最后一条采样下标"""
+        target = (unique_ids << 32) | np.maximum(anchor - offset, 0)
+        return np.maximum(np.searchsorted(keys, target, side='right') - 1, starts)
+
+    result = {
+        'video_id': unique_ids,
+        'last_ts': last_ts,
+        'view_count': views[ends],
+        'like_count': likes[ends],
+    }
+    for name, seconds in WINDOWS.items():
+        index = index_at(seconds)
+        result[f'view_delta_{name}'] = views[ends] - views[index]
+        result[f'like_delta_{name}'] = likes[ends] - likes[index]
+
+    # 加速度: 最近一个窗口与前一个窗口的每小时播放增速之差
+    recent = index_at(ACCELERATION_WINDOW)
+    previous = index_at(2 * ACCELERATION_WINDOW)
+    # 窗口起点在两条采样之间时从起点算起，早于最早的采样时从最早的采样算起
+    recent_start = np.maximum(ts[recent], anchor - ACCELERATION_WINDOW)
+    previous_start = np.maximum(ts[previous], anchor - 2 * ACCELERATION_WINDOW)
+    recent_hours = (anchor - recent_start) / 3600.0
+    previous_hours = (recent_start - previous_start) / 3600.0
+    recent_rate = np.divide(views[ends] - views[recent], recent_hours,
+                            out=np.zeros(len(unique_ids)), where=recent_hours > 0)
+    previous_rate = np.divide(views[recent] - views[previous], previous_hours,
+                              out=np.zeros(len(unique_ids)), where=previous_hours > 0)
+    result['view_rate_24h'] = recent_rate
+    result['acceleration'] = np.where(previous_hours > 0, recent_rate - previous_rate, 0.0)
+    return result
+
+
+def partition_z_scores(values, partitions):
+    """计算每个值相对于同分区的z分数，分区内标准差为0时为0"""
+    if len(values) == 0:
+        return np.empty(0)
+    _, codes = np.unique(partitions, return_inverse=True)
+    counts = np.bincount(codes)
+    means = np.bincount(codes, weights=values) / counts
+    variances = np.bincount(codes, weights=values * values) / counts - means * means
+    stds = np.sqrt(np.maximum(variances, 0))[codes]
+    return np.divide(values - means[codes], stds, out=np.zeros(len(values)), where=stds > 0)
+
+
+# 流式读取采样时每批的行数
+FETCH_BATCH_SIZE = 65536
+
+# 采样行在SQL中编码为 (排序键, 播放量, 点赞数)，排序键同 _sample_keys
+_SAMPLE_COLUMNS = "(video_id << 32) | ts, COALESCE(view_count, 0), COALESCE(like_count, 0)"
+
+
+def _load_samples(cursor, sql, params):
+    """用fetchmany分批读取采样，每批直接展开为int64数组，不构造中间列表
+
+    Returns:
+        (排序键数组, 播放量数组, 点赞数数组)，按排序键升序
+    """
+    cursor.execute(sql, params)
+    batches = []
+    while True:
+        rows = cursor.fetchmany(FETCH_BATCH_SIZE)
+        if not rows:
+            break
+        batches.append(np.fromiter(chain.from_iterable(rows), dtype=np.int64, count=3 * len(rows)))
+    data = np.concatenate(batches).reshape(-1, 3) if batches else np.empty((0, 3), dtype=np.int64)
+    data = data[np.argsort(data[:, 0], kind='stable')]
+    return data[:, 0].copy(), data[:, 1].copy(), data[:, 2].copy()
+
+
+class SampleWindow:
+    """内存中的计数采样窗口
+
+    首次使用时加载保留时长内的全部采样，之后每次只增量读取新写入的采样，
+    按排序位置插入，不需要重新排序。每个视频另外保留保留时长之前的最后一条采样，
+    长时间没有变化的视频以它作为窗口起点的计数
+    """
+
+    def __init__(self, retention=RETENTION_SECONDS):
+        self.retention = retention
+        self._lock = Lock()
+        self._last_id = 0
+        self.video_ids = np.empty(0, dtype=np.int64)
+        self.ts = np.empty(0, dtype=np.int64)
+        self.views = np.empty(0, dtype=np.int64)
+        self.likes = np.empty(0, dtype=np.int64)
+        self._keys = np.empty(0, dtype=np.int64)
+
+    def sync(self):
+        """读取新写入的采样并淘汰过期采样，需要在应用上下文中调用"""
+        with self._lock:
+            horizon = int(time.time()) - self.retention
+            # 直接使用DBAPI游标，跳过逐行构造 Row 对象
+            cursor = db.session.connection().connection.cursor()
+            try:
+                # 先确定本次读取的id上限，读取期间新写入的采样留给下一次
+                max_id = cursor.execute("SELECT COALESCE(MAX(id), 0) FROM stat_sample").fetchone()[0]
+                keys, views, likes = _load_samples(
+                    cursor,
+                    f"SELECT {_SAMPLE_COLUMNS} FROM stat_sample WHERE id > ? AND id <= ? AND ts >= ?",
+                    (self._last_id, max_id, horizon)
+                )
+                if not self._last_id:
+                    # 首次加载时补上每个视频在保留时长之前的最后一条采样，走 (video_id, ts) 索引
+                    baseline = _load_samples(
+                        cursor,
+                        f"SELECT {_SAMPLE_COLUMNS} FROM stat_sample "
+                        f"WHERE id IN (SELECT (SELECT id FROM stat_sample WHERE video_id = video.id AND ts < ? "
+                        f"ORDER BY ts DESC LIMIT 1) FROM video) AND id <= ?",
+                        (horizon, max_id)
+                    )
+                    if len(baseline[0]):
+                        # 基准采样都早于保留时长，同一视频内排在窗口采样之前
+                        order = np.argsort(np.concatenate((baseline[0], keys)), kind='stable')
+                        keys, views, likes = (np.concatenate(pair)[order]
+                                              for pair in zip(baseline, (keys, views, likes)))
+            finally:
+                cursor.close()
+            self._last_id = max_id
+
+            if len(keys):
+                video_ids, ts = keys >> 32, keys & 0xFFFFFFFF
+                if len(self._keys):
+                    positions = np.searchsorted(self._keys, keys, side='right')
+                    self.video_ids = np.insert(self.video_ids, positions, video_ids)
+                    self.ts = np.insert(self.ts, positions, ts)
+                    self.views = np.insert(self.views, positions, views)
+                    self.likes = np.insert(self.likes, positions, likes)
+                    self._keys = np.insert(self._keys, positions, keys)
+                else:
+                    self.video_ids, self.ts, self.views, self.likes, self._keys = video_ids, ts, views, likes, keys
+
+            if len(self.ts) and self.ts.min() < horizon:
+                # 淘汰过期采样，但保留每个视频过期采样中的最后一条
+                old = self.ts < horizon
+                same_video = self.video_ids[1:] == self.video_ids[:-1]
+                keep = ~(old & np.r_[same_video & old[1:], False])
+                self.video_ids, self.ts = self.video_ids[keep], self.ts[keep]
+                self.views, self.likes, self._keys = self.views[keep], self.likes[keep], self._keys[keep]
+
+            return self.video_ids, self.ts, self.views, self.likes
+
+class TrendingEngine:
+    """趋势排行，持有采样窗口并在每次查询时增量同步"""
+
+    def __init__(self):
+        self.window = SampleWindow()
+
+    def warm_up(self, app):
+        """完成采样窗口的首次加载，之后的排行查询只需增量同步
+
+        启动时在后台线程中调用，不阻塞服务启动
+        """
+        started = time.perf_counter()
+        try:
+            with app.app_context():
+                self.window.sync()
+                db.session.remove()
+        except Exception as e:
+            logger.error(f"趋势采样窗口预热失败: {str(e)}")
+            return
+        logger.info(f"趋势采样窗口预热完成: {len(self.window.ts)} 条采样, 耗时 {time.perf_counter() - started:.2f}s")
+
+    def rank(self, sort='view_delta_24h', limit=50, tname=None):
+        """计算并返回排行，需要在应用上下文中调用
+
+        Args:
+            sort: 排序字段，compute_trending 结果中的列或 'z_score'
+            limit: 返回数量
+            tname: 只返回该分区的视频
+
+        Returns:
+            每个视频一个字典的列表
+        """
+        arrays = self.window.sync()
+        metrics = compute_trending(*arrays, now=int(time.time()))
+        if len(metrics['video_id']) == 0:
+            return []
+
+        # 与当前视频表对齐，已删除的视频不参与排行
+        rows = db.session.connection().exec_driver_sql(
+            "SELECT id, bvid, title, COALESCE(tname, '未知分区') FROM video"
+        ).fetchall()
+        info = {row[0]: row[1:] for row in rows}
+        present = np.array([video_id in info for video_id in metrics['video_id'].tolist()], dtype=bool)
+        metrics = {name: values[present] for name, values in metrics.items()}
+
+        partitions = np.array([info[video_id][2] for video_id in metrics['video_id'].tolist()], dtype=object)
+        metrics['z_score'] = partition_z_scores(metrics['view_delta_24h'].astype(np.float64), partitions.astype(str))
+
+        candidates = np.arange(len(partitions))
+        if tname:
+            candidates = candidates[partitions == tname]
+        if sort not in metrics:
+            raise ValueError(f'不支持的排序字段: {sort}')
+        order = candidates[np.argsort(-metrics[sort][candidates], kind='stable')][:limit]
+
+        ranked = []
+        for index in order.tolist():
+            bvid, title, partition = info[int(metrics['video_id'][index])]
+            entry = {'bvid': bvid, 'title': title, 'tname': partition}
+            for name, values in metrics.items():
+                if name not in ('video_id', 'last_ts'):
+                    entry[name] = values[index].item()
+            entry['last_sampled'] = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(int(metrics['last_ts'][index])))
+            ranked.append(entry)
+        return ranked
@@ -7,10 +7,25 @@ import json
 import logging
 from datetime import datetime
 from .models import Config, db
+from .resilience import (
+    CircuitOpenError, DeadlineExceeded, TransientError, get_upstream, is_retryable, is_retryable_before_send
+)
 from flask import current_app
 
 logger = logging.getLogger(__name__)
 
+# 预测请求的默认超时（秒），可通过 viewsight_timeout_seconds 配置
+DEFAULT_TIMEOUT = 60
+
+# 预测请求不是幂等的廉价操作，只在请求未送达或服务明确表示暂不可用时重试
+RETRYABLE_STATUS = frozenset({429, 503})
+
+
+def _is_retryable(error):
+    """预测请求的可重试判断"""
+    return is_retryable_before_send(error) or (isinstance(error, TransientError) and error.status in RETRYABLE_STATUS)
+
+
 class ViewSightClient:
     """ViewSight API客户端，用于与视频预测服务器交互"""
     
@@ -22,6 +37,12 @@ class ViewSightClient:
         """
         self.config = config_dict or self._load_config_from_db()
         self.server_url = self.config.get('viewsight_server_url', 'http://sy1.efrp.eu.org:40399')
+        try:
+            self.timeout = float(self.config.get('viewsight_timeout_seconds') or DEFAULT_TIMEOUT)
+        except ValueError:
+            self.timeout = DEFAULT_TIMEOUT
+        # 熔断器在进程内共享，ViewSight不可用时后续请求立即失败，不再占用线程等待超时
+        self.upstream = get_upstream('viewsight', attempts=2, failure_threshold=3, reset_timeout=60)
         
     def _load_config_from_db(self):
         """从数据库加载配置"""
@@ -115,26 +136,38 @@ class ViewSightClient:
             
             logger.info(f"发送预测请求到 {endpoint}")
             
-            # 设置较长的超时时间，因为预测过程可能需要较长时间
-            response = requests.post(
-                endpoint, 
-                json=payload, 
-                timeout=120,  # 增加超时时间到120秒
-                headers={
-                    'Content-Type': 'application/json',
-                    'User-Agent': 'BiliBrother-Prediction-Client/1.0'
-                }
-            )
-            
-            if response.status_code != 200:
-                logger.error(f"预测请求失败，状态码: {response.status_code}")
-                logger.error(f"响应内容: {response.text}")
-                error_msg = f"预测API返回错误 (状态码: {response.status_code}): {response.text}"
-                if response.status_code == 500:
+            def send(timeout):
+                # 超时取配置值与请求截止时间中较早的一个
+                response = requests.post(
+                    endpoint, 
+                    json=payload, 
+                    timeout=timeout,
+                    headers={
+                        'Content-Type': 'application/json',
+                        'User-Agent': 'BiliBrother-Prediction-Client/1.0'
+                    }
+                )
+                # 5xx和限流说明服务不健康，计入熔断器
+                if response.status_code >= 500 or response.status_code == 429:
+                    raise TransientError(response.text, response.status_code)
+                return response
+            
+            try:
+                response = self.upstream.call(send, retryable=_is_retryable, failure=is_retryable, timeout=self.timeout)
+                status_code, body = response.status_code, response.text
+            except TransientError as e:
+                # 重试后仍然失败，按状态码给出错误信息
+                status_code, body = e.status, str(e)
+            
+            if status_code != 200:
+                logger.error(f"预测请求失败，状态码: {status_code}")
+                logger.error(f"响应内容: {body}")
+                error_msg = f"预测API返回错误 (状态码: {status_code}): {body}"
+                if status_code == 500:
                     error_msg = "服务器内部错误，请检查ViewSight服务是否正常运行及配置是否正确"
-                elif response.status_code == 400:
+                elif status_code == 400:
                     error_msg = "请求参数错误，请检查BV号和配置信息"
-                elif response.status_code == 404:
+                elif status_code == 404:
                     error_msg = "API接口不存在，请确认ViewSight服务地址是否正确"
                 raise Exception(error_msg)
                 
@@ -164,6 +197,12 @@ class ViewSightClient:
                 "raw_message": result.get("message", "")
             }
             
+        except CircuitOpenError as e:
+            logger.warning(str(e))
+            raise Exception("ViewSight服务暂时不可用（连续失败后熔断），请稍后重试")
+        except DeadlineExceeded:
+            logger.error("预测请求超过截止时间")
+            raise Exception("预测请求超时，已超过请求的截止时间")
         except requests.exceptions.Timeout:
             logger.error(f"预测请求超时")
             raise Exception("预测请求超时，ViewSight服务响应时间过长")
@@ -62,7 +62,7 @@ const PredictionPage = () => {
       setPrediction(result);
       message.success('播放量预测成功');
     } catch (error) {
-      const errorMsg = error.response?.data?.error || '预测失败，请检查配置和网络';
+      const errorMsg = error.response?.data?.error || error.message || '预测失败，请检查配置和网络';
       setError(errorMsg);
       message.error(errorMsg);
     } finally {
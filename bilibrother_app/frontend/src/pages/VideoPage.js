@@ -10,7 +10,7 @@ import {
   InfoCircleOutlined,
   VideoCameraOutlined
 } from '@ant-design/icons';
-import { fetchVideos, addVideo, deleteVideo, refreshVideos, exportData } from '../services/api';
+import { fetchVideos, addVideo, deleteVideo, refreshVideos, exportData, subscribeVideoStats } from '../services/api';
 
 const { Title, Text } = Typography;
 const { Search } = Input;
@@ -47,6 +47,18 @@ function VideoPage() {
     loadVideos();
   }, []);
 
+  // 订阅计数实时推送，只更新变化的视频
+  useEffect(() => {
+    const unsubscribe = subscribeVideoStats((updates) => {
+      const updatesByBvid = new Map(updates.map((update) => [update.bvid, update]));
+      setVideos((current) => current.map((video) => {
+        const update = updatesByBvid.get(video.bvid);
+        return update ? { ...video, ...update } : video;
+      }));
+    }, loadVideos);
+    return unsubscribe;
+  }, []);
+
   // 添加新视频
   const handleAddVideo = async () => {
     if (!newBVID || !newBVID.trim()) {
@@ -19,6 +19,16 @@ export const fetchVideos = async () => {
   }
 };
 
+export const searchVideos = async (q, page = 1, perPage = 20) => {
+  try {
+    const response = await api.get('/videos/search', { params: { q, page, per_page: perPage } });
+    return response.data;
+  } catch (error) {
+    console.error('搜索视频失败:', error);
+    throw error;
+  }
+};
+
 export const addVideo = async (bvid) => {
   try {
     const response = await api.post('/videos', { bvid });
@@ -39,9 +49,32 @@ export const deleteVideo = async (bvid) => {
   }
 };
 
-export const refreshVideos = async (bvids = []) => {
+export const bulkAddVideos = async (source) => {
+  try {
+    // source: { bvids } | { mid } | { fav_id } | { ranking }，可附带 limit
+    const response = await api.post('/videos/bulk', source);
+    return response.data;
+  } catch (error) {
+    console.error('批量添加视频失败:', error);
+    throw error;
+  }
+};
+
+export const bulkDeleteVideos = async (target) => {
   try {
-    const response = await api.post('/videos/refresh', { bvids });
+    // target: { bvids } | { mid }
+    const response = await api.delete('/videos/bulk', { data: target });
+    return response.data;
+  } catch (error) {
+    console.error('批量删除视频失败:', error);
+    throw error;
+  }
+};
+
+export const refreshVideos = async (bvids = [], options = {}) => {
+  try {
+    // options: { only_stale, stale_after, tiered, mode: 'stats' }
+    const response = await api.post('/videos/refresh', { bvids, ...options });
     return response.data;
   } catch (error) {
     console.error('刷新视频失败:', error);
@@ -49,6 +82,65 @@ export const refreshVideos = async (bvids = []) => {
   }
 };
 
+export const fetchAuthors = async (params = {}) => {
+  try {
+    // params: { page, per_page, sort }
+    const response = await api.get('/authors', { params });
+    return response.data;
+  } catch (error) {
+    console.error('获取UP主列表失败:', error);
+    throw error;
+  }
+};
+
+export const fetchAuthorVideos = async (mid) => {
+  try {
+    const response = await api.get(`/authors/${mid}/videos`);
+    return response.data;
+  } catch (error) {
+    console.error(`获取UP主 ${mid} 的视频失败:`, error);
+    throw error;
+  }
+};
+
+export const fetchAnalytics = async (groupBy = 'all', params = {}) => {
+  try {
+    // groupBy: all | tname | mid | cohort；params: { cohort, sort, limit }
+    const response = await api.get(`/analytics/${groupBy}`, { params });
+    return response.data;
+  } catch (error) {
+    console.error('获取统计数据失败:', error);
+    throw error;
+  }
+};
+
+export const fetchTrending = async (params = {}) => {
+  try {
+    // params: { sort, limit, tname }
+    const response = await api.get('/trending', { params });
+    return response.data;
+  } catch (error) {
+    console.error('获取趋势排行失败:', error);
+    throw error;
+  }
+};
+
+export const subscribeVideoStats = (onStats, onResync, filters = {}) => {
+  // filters: { bvid: [...], mid: [...] }，返回取消订阅的函数
+  const params = new URLSearchParams();
+  Object.entries(filters).forEach(([key, values]) => {
+    if (values && values.length) {
+      params.append(key, [].concat(values).join(','));
+    }
+  });
+  const query = params.toString();
+  const source = new EventSource(`${API_URL}/videos/live${query ? `?${query}` : ''}`);
+  source.addEventListener('stats', (event) => onStats(JSON.parse(event.data)));
+  source.addEventListener('resync', () => onResync && onResync());
+  source.onerror = () => console.warn('实时推送连接断开，正在重连...');
+  return () => source.close();
+};
+
 export const getConfig = async () => {
   try {
     const response = await api.get('/config');
@@ -38,15 +38,56 @@ export const updateViewSightConfig = async (configData) => {
   }
 };
 
+// 轮询预测任务的间隔（毫秒）和最长等待时间（毫秒）
+const JOB_POLL_INTERVAL = 1000;
+const JOB_POLL_TIMEOUT = 5 * 60 * 1000;
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+/**
+ * 查询预测任务
+ * @param {number} jobId 任务ID
+ * @returns {Promise<Object>} 任务信息，完成后包含 result
+ */
+export const getPredictionJob = async (jobId) => {
+  const response = await api.get(`/predict/jobs/${jobId}`);
+  return response.data;
+};
+
+/**
+ * 预测接口返回202时轮询任务直到完成
+ * @param {Object} response 预测接口的响应
+ * @returns {Promise<Object>} 预测结果
+ */
+const resolvePrediction = async (response) => {
+  if (response.status !== 202) {
+    return response.data;
+  }
+  const deadline = Date.now() + JOB_POLL_TIMEOUT;
+  let job = response.data.job;
+  while (job.status === 'queued' || job.status === 'running') {
+    if (Date.now() > deadline) {
+      throw new Error('预测任务等待超时，请稍后重试');
+    }
+    await sleep(JOB_POLL_INTERVAL);
+    job = await getPredictionJob(job.id);
+  }
+  if (job.status === 'failed') {
+    throw new Error(job.error || '预测任务失败');
+  }
+  return { ...job.result, job_id: job.id };
+};
+
 /**
  * 预测视频播放量
  * @param {string} bvid B站视频BV号
+ * @param {string} source 预测来源: auto(优先ViewSight，失败时用本地模型)、local 或 viewsight
  * @returns {Promise<Object>} 预测结果
  */
-export const predictVideoViews = async (bvid) => {
+export const predictVideoViews = async (bvid, source = 'auto') => {
   try {
-    const response = await api.get(`/predict/${bvid}`);
-    return response.data;
+    const response = await api.get(`/predict/${bvid}`, { params: { source } });
+    return await resolvePrediction(response);
   } catch (error) {
     console.error(`预测视频 ${bvid} 播放量失败:`, error);
     throw error;
@@ -56,14 +97,43 @@ export const predictVideoViews = async (bvid) => {
 /**
  * 获取特定视频的预测信息
  * @param {string} bvid B站视频BV号
+ * @param {string} source 预测来源: auto、local 或 viewsight
  * @returns {Promise<Object>} 预测结果
  */
-export const getVideoPrediction = async (bvid) => {
+export const getVideoPrediction = async (bvid, source = 'auto') => {
   try {
-    const response = await api.get(`/videos/${bvid}/prediction`);
-    return response.data;
+    const response = await api.get(`/videos/${bvid}/prediction`, { params: { source } });
+    return await resolvePrediction(response);
   } catch (error) {
     console.error(`获取视频 ${bvid} 预测信息失败:`, error);
     throw error;
   }
 };
+
+/**
+ * 获取本地预测模型信息及与ViewSight的对比准确度
+ * @returns {Promise<Object>} 模型信息
+ */
+export const getLocalPredictor = async () => {
+  try {
+    const response = await api.get('/predictor');
+    return response.data;
+  } catch (error) {
+    console.error('获取本地预测模型信息失败:', error);
+    throw error;
+  }
+};
+
+/**
+ * 重新训练本地预测模型
+ * @returns {Promise<Object>} 训练结果
+ */
+export const trainLocalPredictor = async () => {
+  try {
+    const response = await api.post('/predictor/train');
+    return response.data;
+  } catch (error) {
+    console.error('训练本地预测模型失败:', error);
+    throw error;
+  }
+};
@@ -1,7 +1,65 @@
+"""
+BiliBrother 后端启动脚本
+默认使用Flask开发服务器；--production 时使用多进程WSGI服务（gunicorn/waitress）
+"""
+import argparse
+import time
 
-from bilibrother_app.backend.api import create_app
+_started = time.perf_counter()
+
+from bilibrother_app.backend.server import DEFAULT_WORKERS, DEFAULT_THREADS
+
+
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description='BiliBrother 后端服务')
+    parser.add_argument('--host', default='0.0.0.0', help='监听地址')
+    parser.add_argument('--port', type=int, default=10000, help='监听端口')
+    parser.add_argument('--production', action='store_true', help='使用生产模式的多进程WSGI服务')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='生产模式的worker进程数')
+    parser.add_argument('--threads', type=int, default=DEFAULT_THREADS, help='生产模式每个进程的线程数')
+    parser.add_argument('--profile-startup', action='store_true', help='输出启动各阶段耗时')
+    return parser.parse_args()
+
+
+def load_app(profile=False, **kwargs):
+    """导入后端并创建应用，profile 为真时输出各阶段耗时"""
+    import_started = time.perf_counter()
+    from bilibrother_app.backend.api import create_app
+    import_ms = (time.perf_counter() - import_started) * 1000
+
+    app = create_app(**kwargs)
+    if profile:
+        timings = {'import': import_ms, **app.extensions['bilibrother'].startup_timings}
+        timings['total'] = (time.perf_counter() - _started) * 1000
+        print("启动耗时分析 (毫秒):")
+        for name, elapsed in timings.items():
+            print(f"  {name:<12}{elapsed:8.1f}")
+        print(flush=True)
+    return app
+
+
+def _reloader_placeholder(environ, start_response):
+    """开发服务器重载器父进程中的占位应用，父进程只监视文件变化，不处理请求"""
+    raise RuntimeError('重载器父进程不处理请求')
 
-app = create_app()
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=10000, debug=True)
+    args = parse_args()
+
+    if args.production:
+        from bilibrother_app.backend.server import serve_production
+
+        # 后台任务在每个worker进程fork之后启动
+        app = load_app(args.profile_startup, start_background=False)
+        serve_production(app, host=args.host, port=args.port, workers=args.workers, threads=args.threads)
+    else:
+        from werkzeug.serving import run_simple, is_running_from_reloader
+
+        # 重载器会在子进程中重新执行本脚本，只有子进程需要导入后端和创建应用
+        if is_running_from_reloader():
+            app = load_app(args.profile_startup)
+            app.debug = True
+        else:
+            app = _reloader_placeholder
+        run_simple(args.host, args.port, app, use_reloader=True, use_debugger=True, threaded=True)
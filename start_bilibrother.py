@@ -14,6 +14,11 @@ import shutil
 import json
 import logging
 import atexit
+import argparse
+import hashlib
+import socket
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # 全局变量
@@ -27,6 +32,14 @@ processes = {
     "frontend": None,
 }
 START_BROWSER = True
+BACKEND_PORT = 10000
+FRONTEND_PORT = 3000
+
+# 启动参数，由命令行解析
+options = argparse.Namespace(production=False, workers=None, threads=None, recheck=False, profile_startup=False)
+
+# 启动各阶段耗时（毫秒），--profile-startup 时输出
+startup_timings = {}
 
 # 日志配置
 logging.basicConfig(
@@ -94,61 +107,112 @@ def run_command(cmd, cwd=None, shell=False):
     except Exception as e:
         return False, str(e)
 
-def check_dependencies():
-    """检查是否安装了必要的依赖"""
+# 依赖检查结果缓存，环境指纹不变时跳过子进程探测
+DEPENDENCY_CACHE = Path("bilibrother_app/data/.dependency_cache.json")
+
+# 在目标Python中查找包的位置，只定位不导入，比逐个 import 快得多
+PYTHON_PROBE = (
+    "import importlib.util, json, sys; "
+    "specs = {name: importlib.util.find_spec(name) for name in sys.argv[1:]}; "
+    "print(json.dumps({'version': sys.version.split()[0], "
+    "'packages': {name: spec.origin if spec else None for name, spec in specs.items()}}))"
+)
+
+def required_python_packages():
+    """后端运行所需的Python包"""
+    packages = ["flask", "flask_cors", "flask_sqlalchemy", "numpy"]
+    if options.production:
+        # 生产模式的WSGI服务器，Windows不支持gunicorn
+        packages.append("waitress" if IS_WINDOWS else "gunicorn")
+    return packages
+
+def environment_fingerprint(packages):
+    """依赖检查缓存的键: 各命令的实际路径和修改时间、所需Python包和前端依赖目录"""
+    parts = {"packages": packages}
+    for cmd in (PYTHON_CMD, PIP_CMD, "node", NPM_CMD):
+        path = shutil.which(cmd)
+        parts[cmd] = [path, os.path.getmtime(path) if path else None]
+    node_modules = Path("bilibrother_app/frontend/node_modules")
+    parts["node_modules"] = node_modules.stat().st_mtime if node_modules.exists() else None
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+def load_dependency_cache(fingerprint):
+    """读取与当前环境指纹一致的缓存结果，Python包文件已不存在时视为失效"""
+    try:
+        cache = json.loads(DEPENDENCY_CACHE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if cache.get("fingerprint") != fingerprint:
+        return None
+    if not all(origin and os.path.exists(origin) for origin in cache["packages"].values()):
+        return None
+    return cache
+
+def save_dependency_cache(fingerprint, packages):
+    """保存检查全部通过时的结果"""
+    try:
+        DEPENDENCY_CACHE.parent.mkdir(exist_ok=True, parents=True)
+        DEPENDENCY_CACHE.write_text(json.dumps({"fingerprint": fingerprint, "packages": packages}), encoding="utf-8")
+    except OSError as e:
+        logger.warning(f"无法写入依赖检查缓存: {e}")
+
+def probe_dependencies(packages):
+    """并行探测Python、pip、Node.js、npm和Python包
+    
+    Returns:
+        (各命令是否可用的字典, Python包位置字典)，Python不可用时包位置为None
+    """
+    probes = {
+        "python": [PYTHON_CMD, "-c", PYTHON_PROBE] + packages,
+        "pip": [PIP_CMD, "--version"],
+        "node": ["node", "--version"],
+        "npm": [NPM_CMD, "--version"],
+    }
+    with ThreadPoolExecutor(max_workers=len(probes)) as executor:
+        futures = {name: executor.submit(run_command, cmd) for name, cmd in probes.items()}
+        results = {name: future.result() for name, future in futures.items()}
+    
+    package_origins = None
+    if results["python"][0]:
+        try:
+            package_origins = json.loads(results["python"][1])["packages"]
+        except (ValueError, KeyError):
+            results["python"] = (False, results["python"][1])
+    return {name: result[0] for name, result in results.items()}, package_origins
+
+def check_dependencies(use_cache=True):
+    """检查是否安装了必要的依赖
+    
+    各项探测并行执行；全部通过时按环境指纹缓存结果，下次启动直接复用
+    """
     print_header("检查依赖")
     
     missing_deps = []
-    
-    # 检查Python依赖
-    print_step("检查Python版本...")
-    success, output = run_command([PYTHON_CMD, "--version"])
-    if success:
-        print_step("Python已安装", "success")
-    else:
-        print_step("Python未安装", "fail")
-        missing_deps.append("Python 3.8+")
-    
-    # 检查pip
-    print_step("检查pip...")
-    success, output = run_command([PIP_CMD, "--version"])
-    if success:
-        print_step("pip已安装", "success")
+    packages = required_python_packages()
+    fingerprint = environment_fingerprint(packages)
+    
+    cache = load_dependency_cache(fingerprint) if use_cache else None
+    if cache:
+        print_step("环境未变化，使用缓存的依赖检查结果", "success")
+        available = {"python": True, "pip": True, "node": True, "npm": True}
+        package_origins = cache["packages"]
     else:
-        print_step("pip未安装", "fail")
-        missing_deps.append("pip")
-    
-    # 检查Node.js
-    print_step("检查Node.js...")
-    success, output = run_command(["node", "--version"])
-    if success:
-        print_step("Node.js已安装", "success")
-    else:
-        print_step("Node.js未安装", "fail")
-        missing_deps.append("Node.js 14+")
-    
-    # 检查npm
-    print_step("检查npm...")
-    success, output = run_command([NPM_CMD, "--version"])
-    if success:
-        print_step("npm已安装", "success")
-    else:
-        print_step("npm未安装", "fail")
-        missing_deps.append("npm")
-    
-    # 检查Flask依赖
-    print_step("检查Flask依赖...")
-    required_python_packages = ["flask", "flask_cors", "flask_sqlalchemy"]
-    missing_python_packages = []
-    
-    for package in required_python_packages:
-        success, _ = run_command(
-            [PYTHON_CMD, "-c", f"import {package}"],
-            shell=IS_WINDOWS
-        )
-        if not success:
-            missing_python_packages.append(package)
+        print_step("检查Python、pip、Node.js、npm和Flask依赖...")
+        available, package_origins = probe_dependencies(packages)
+    
+    for name, label, requirement in (
+        ("python", "Python", "Python 3.8+"),
+        ("pip", "pip", "pip"),
+        ("node", "Node.js", "Node.js 14+"),
+        ("npm", "npm", "npm"),
+    ):
+        if available[name]:
+            print_step(f"{label}已安装", "success")
+        else:
+            print_step(f"{label}未安装", "fail")
+            missing_deps.append(requirement)
     
+    missing_python_packages = [name for name in packages if not (package_origins or {}).get(name)]
     if missing_python_packages:
         print_step(f"缺少Python包: {', '.join(missing_python_packages)}", "fail")
         missing_deps.append(f"Python包: {', '.join(missing_python_packages)}")
@@ -165,6 +229,9 @@ def check_dependencies():
     else:
         print_step("前端依赖已安装", "success")
     
+    if not missing_deps and not cache:
+        save_dependency_cache(fingerprint, package_origins)
+    
     # 返回检查结果
     return missing_deps
 
@@ -220,23 +287,20 @@ def start_backend():
         shutil.copy(config_properties, data_dir / "config.properties")
         print_step("已复制配置文件到数据目录", "success")
     
-    # 创建启动脚本
-    backend_script = """
-from bilibrother_app.backend.api import create_app
-
-app = create_app()
-
-if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=10000, debug=True)
-"""
-
-    with open("run_backend.py", "w", encoding="utf-8") as f:
-        f.write(backend_script)
+    backend_cmd = [PYTHON_CMD, "run_backend.py", "--port", str(BACKEND_PORT)]
+    if options.profile_startup:
+        backend_cmd.append("--profile-startup")
+    if options.production:
+        backend_cmd.append("--production")
+        if options.workers:
+            backend_cmd += ["--workers", str(options.workers)]
+        if options.threads:
+            backend_cmd += ["--threads", str(options.threads)]
     
     # 启动后端服务
     if IS_WINDOWS:
         backend_process = subprocess.Popen(
-            [PYTHON_CMD, "run_backend.py"],
+            backend_cmd,
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
             text=True,
@@ -244,7 +308,7 @@ if __name__ == '__main__':
         )
     else:
         backend_process = subprocess.Popen(
-            [PYTHON_CMD, "run_backend.py"],
+            backend_cmd,
             stdout=subprocess.PIPE,
             stderr=subprocess.STDOUT,
             text=True,
@@ -253,11 +317,11 @@ if __name__ == '__main__':
     
     processes["backend"] = backend_process
     
-    # 等待服务启动
-    time.sleep(2)
+    # 等待健康检查通过
+    ready = wait_for_backend(backend_process)
     
     # 检查服务是否已启动
-    if backend_process.poll() is None:
+    if ready and backend_process.poll() is None:
         print_step("后端API服务已启动", "success")
         # 启动日志打印线程
         threading.Thread(
@@ -275,6 +339,43 @@ if __name__ == '__main__':
             pass
         return False
 
+def wait_for_backend(process, timeout=60):
+    """轮询后端健康检查接口，直到服务可用、进程退出或超时
+    
+    Returns:
+        服务是否可用
+    """
+    url = f"http://127.0.0.1:{BACKEND_PORT}/api/health"
+    deadline = time.time() + timeout
+    while time.time() < deadline and process.poll() is None:
+        try:
+            with urllib.request.urlopen(url, timeout=2) as response:
+                if response.status == 200:
+                    # 记录后端自身报告的启动各阶段耗时
+                    health = json.loads(response.read().decode("utf-8"))
+                    for name, elapsed in (health.get("startup_ms") or {}).items():
+                        startup_timings[f"后端 {name}"] = elapsed
+                    return True
+        except Exception:
+            pass
+        time.sleep(0.05)
+    return False
+
+def wait_for_port(process, port, timeout=120):
+    """等待进程开始监听端口，进程退出或超时时返回False"""
+    deadline = time.time() + timeout
+    while time.time() < deadline and process.poll() is None:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+def frontend_build_exists():
+    """是否已有前端构建产物（生产模式下由后端直接提供）"""
+    return (Path("bilibrother_app/frontend/build") / "index.html").exists()
+
 def start_frontend():
     """启动前端服务"""
     print_step("启动前端开发服务器...")
@@ -315,11 +416,11 @@ def start_frontend():
     
     processes["frontend"] = frontend_process
     
-    # 等待服务启动
-    time.sleep(5)
+    # 等待开发服务器开始监听
+    ready = wait_for_port(frontend_process, FRONTEND_PORT)
     
     # 检查服务是否已启动
-    if frontend_process.poll() is None:
+    if ready and frontend_process.poll() is None:
         print_step("前端开发服务器已启动", "success")
         # 启动日志打印线程
         threading.Thread(
@@ -349,9 +450,9 @@ def log_process_output(process, name):
         except:
             break
 
-def open_browser():
+def open_browser(port=FRONTEND_PORT):
     """在浏览器中打开应用"""
-    url = "http://localhost:3000"
+    url = f"http://localhost:{port}"
     print_step(f"在浏览器中打开应用: {url}...")
     webbrowser.open(url)
 
@@ -377,17 +478,39 @@ def cleanup():
                 except:
                     print_step(f"无法终止{name}服务", "fail")
     
-    print_step("清理临时文件...")
-    try:
-        if os.path.exists("run_backend.py"):
-            os.remove("run_backend.py")
-    except:
-        pass
-    
     print_step("所有服务已停止", "success")
 
+def parse_args():
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="BiliBrother 启动器")
+    parser.add_argument("--production", action="store_true",
+                        help="后端使用多进程WSGI服务；已构建前端时由后端直接提供页面")
+    parser.add_argument("--workers", type=int, help="生产模式的后端worker进程数")
+    parser.add_argument("--threads", type=int, help="生产模式每个worker的线程数")
+    parser.add_argument("--recheck", action="store_true", help="忽略缓存，重新检查依赖")
+    parser.add_argument("--profile-startup", action="store_true", help="输出启动各阶段耗时")
+    return parser.parse_args()
+
+def timed_step(name, func, *args):
+    """执行启动步骤并记录耗时"""
+    started = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        startup_timings[name] = round((time.perf_counter() - started) * 1000, 1)
+
+def print_startup_profile():
+    """输出启动各阶段耗时"""
+    print_header("启动耗时分析")
+    for name, elapsed in startup_timings.items():
+        print(f"  {name:<24}{elapsed:10.1f} ms")
+    print()
+
 def main():
     """主函数"""
+    global options
+    options = parse_args()
+    
     print_header("欢迎使用 BiliBrother 启动器")
     print("项目: B站视频数据监控工具")
     print(f"时间: {time.strftime('%Y-%m-%d %H:%M:%S')}")
@@ -400,7 +523,7 @@ def main():
         return
     
     # 检查依赖
-    missing_deps = check_dependencies()
+    missing_deps = timed_step("检查依赖", check_dependencies, not options.recheck)
     if missing_deps:
         print_step(f"缺少依赖: {', '.join(missing_deps)}", "fail")
         choice = input("是否尝试安装缺失的依赖? (y/n): ").strip().lower()
@@ -416,27 +539,35 @@ def main():
     atexit.register(cleanup)
     
     # 启动后端
-    if not start_backend():
+    if not timed_step("启动后端", start_backend):
         print_step("后端启动失败，程序退出", "fail")
         return
     
+    # 生产模式且已构建前端时由后端提供页面，不启动开发服务器
+    serve_built_frontend = options.production and frontend_build_exists()
+    app_port = BACKEND_PORT if serve_built_frontend else FRONTEND_PORT
+    
     # 启动前端
-    if not start_frontend():
+    if serve_built_frontend:
+        print_step("使用已构建的前端，由后端提供页面", "skip")
+    elif not timed_step("启动前端", start_frontend):
         print_step("前端启动失败，程序退出", "fail")
         return
     
     global START_BROWSER
-    # 打开浏览器
-    time.sleep(2)
+    # 打开浏览器（前后端都已确认可用）
     if START_BROWSER:
-        open_browser()
+        open_browser(app_port)
         START_BROWSER = False
     
     print_header("BiliBrother 已成功启动")
-    print("后端API地址: http://localhost:10000")
-    print("前端访问地址: http://localhost:3000")
+    print(f"后端API地址: http://localhost:{BACKEND_PORT}")
+    print(f"前端访问地址: http://localhost:{app_port}")
     print("\n按 Ctrl+C 可停止所有服务\n")
     
+    if options.profile_startup:
+        print_startup_profile()
+    
     try:
         # 保持程序运行
         while True:
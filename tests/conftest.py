@@ -0,0 +1,16 @@
+"""
+测试公共夹具: 每个测试使用临时目录中的独立SQLite数据库，不启动后台任务
+"""
+import pytest
+
+from bilibrother_app.backend.api import create_app
+from bilibrother_app.backend.models import db
+
+
+@pytest.fixture
+def app(tmp_path):
+    """在临时数据库上创建应用并进入应用上下文"""
+    app = create_app(str(tmp_path / 'test.db'), start_background=False)
+    with app.app_context():
+        yield app
+        db.session.remove()
@@ -0,0 +1,189 @@
+"""
+告警引擎: 处理进度和冷却时间在重启后恢复、ratio 规则的预热、webhook重试和熔断
+"""
+import pytest
+
+from bilibrother_app.backend.alerts import CURSOR_KEY, MAX_DELIVERY_ATTEMPTS, RATIO_MIN_SAMPLES, AlertEngine
+from bilibrother_app.backend.models import db, Config, Video, AlertRule, AlertEvent
+from bilibrother_app.backend.resilience import CircuitOpenError
+
+# 第一条采样的时间
+START = 1700000000
+HOUR = 3600
+
+
+def add_sample(video_id, ts, view_count):
+    """写入一条计数采样并返回其id"""
+    result = db.session.connection().exec_driver_sql(
+        "INSERT INTO stat_sample (video_id, ts, view_count, danmaku_count, coin_count, like_count, "
+        "share_count, favorite_count) VALUES (?, ?, ?, 0, 0, 0, 0, 0)",
+        (video_id, ts, view_count)
+    )
+    db.session.commit()
+    return result.lastrowid
+
+
+def add_rule(**values):
+    rule = AlertRule(**{'name': '测试规则', 'field': 'view_count', 'cooldown_seconds': HOUR, **values})
+    db.session.add(rule)
+    db.session.commit()
+    return rule
+
+
+@pytest.fixture
+def video(app):
+    video = Video(bvid='BV1', title='测试视频', link='', mid='42')
+    db.session.add(video)
+    db.session.commit()
+    return video
+
+
+@pytest.fixture
+def engine(app, video):
+    """已初始化处理进度的引擎，之后写入的采样都会被处理"""
+    engine = AlertEngine(app)
+    engine.poll()
+    return engine
+
+
+def test_cursor_survives_restart(app, video, engine):
+    add_rule(kind='threshold', threshold=1000)
+    add_sample(video.id, START, 500)
+    last_id = add_sample(video.id, START + HOUR, 1500)
+
+    assert engine.poll() == 2
+    assert Config.query.filter_by(key=CURSOR_KEY).one().value == str(last_id)
+    assert AlertEvent.query.count() == 1
+
+    # 重启后从保存的进度继续，已处理的采样不会再次触发
+    restarted = AlertEngine(app)
+    assert restarted.poll() == 0
+    add_sample(video.id, START + 2 * HOUR, 1600)
+    assert restarted.poll() == 1
+    assert AlertEvent.query.count() == 1
+
+
+def test_first_run_skips_history(app, video):
+    add_rule(kind='threshold', threshold=1000)
+    add_sample(video.id, START, 500)
+    add_sample(video.id, START + HOUR, 1500)
+
+    assert AlertEngine(app).poll() == 0
+    assert AlertEvent.query.count() == 0
+
+
+def test_cooldown_seeded_from_events(app, video, engine):
+    rule = add_rule(kind='delta', threshold=100, cooldown_seconds=2 * HOUR)
+    add_sample(video.id, START, 0)
+    add_sample(video.id, START + HOUR, 1000)
+    engine.poll()
+    assert [event.ts for event in AlertEvent.query.all()] == [START + HOUR]
+
+    # 重启后内存中没有状态，冷却时间从 alert_event 恢复
+    restarted = AlertEngine(app)
+    add_sample(video.id, START + 2 * HOUR, 2000)
+    restarted.poll()
+    assert AlertEvent.query.count() == 1
+    assert restarted.states[video.id].last_fired == {rule.id: START + HOUR}
+
+    add_sample(video.id, START + 3 * HOUR, 3000)
+    restarted.poll()
+    assert [event.ts for event in AlertEvent.query.order_by(AlertEvent.id).all()] == [START + HOUR, START + 3 * HOUR]
+
+
+def test_ratio_waits_for_warm_up(app, video, engine):
+    add_rule(kind='ratio', threshold=3, cooldown_seconds=0)
+    views = 0
+    add_sample(video.id, START, views)
+    # 观察到的增量不足 RATIO_MIN_SAMPLES 个时，即使增速是此前的10倍也不判断
+    for hour in range(1, RATIO_MIN_SAMPLES):
+        views += 100
+        add_sample(video.id, START + hour * HOUR, views)
+    views += 1000
+    add_sample(video.id, START + RATIO_MIN_SAMPLES * HOUR, views)
+    engine.poll()
+    assert AlertEvent.query.count() == 0
+
+    # 平稳增长一段时间后，同样的突增触发告警
+    hour = RATIO_MIN_SAMPLES
+    for hour in range(RATIO_MIN_SAMPLES + 1, RATIO_MIN_SAMPLES + 15):
+        views += 100
+        add_sample(video.id, START + hour * HOUR, views)
+    engine.poll()
+    assert AlertEvent.query.count() == 0
+
+    views += 1000
+    spike_id = add_sample(video.id, START + (hour + 1) * HOUR, views)
+    engine.poll()
+    events = AlertEvent.query.all()
+    assert [event.sample_id for event in events] == [spike_id]
+    assert events[0].value >= 3
+
+
+def test_webhook_retried_up_to_max_attempts(app, video, engine, monkeypatch):
+    add_rule(kind='threshold', threshold=1000, channel='webhook', webhook_url='http://127.0.0.1:9/hook')
+    posts = []
+
+    def failing_post(rule, event):
+        posts.append(event.id)
+        raise ConnectionError('连接被拒绝')
+
+    monkeypatch.setattr(AlertEngine, '_post', staticmethod(failing_post))
+    add_sample(video.id, START, 500)
+    add_sample(video.id, START + HOUR, 1500)
+    engine.poll()
+    for _ in range(MAX_DELIVERY_ATTEMPTS + 2):
+        engine.deliver()
+
+    event = AlertEvent.query.one()
+    assert len(posts) == MAX_DELIVERY_ATTEMPTS
+    assert event.attempts == MAX_DELIVERY_ATTEMPTS
+    assert event.delivered_at is None
+    assert '连接被拒绝' in event.error
+    assert engine.failed == MAX_DELIVERY_ATTEMPTS
+
+
+def test_webhook_delivered_after_transient_failure(app, video, engine, monkeypatch):
+    add_rule(kind='threshold', threshold=1000, channel='webhook', webhook_url='http://127.0.0.1:9/hook')
+    outcomes = [ConnectionError('超时'), None]
+
+    def flaky_post(rule, event):
+        outcome = outcomes.pop(0)
+        if outcome is not None:
+            raise outcome
+
+    monkeypatch.setattr(AlertEngine, '_post', staticmethod(flaky_post))
+    add_sample(video.id, START, 500)
+    add_sample(video.id, START + HOUR, 1500)
+    engine.poll()
+    engine.deliver()
+
+    event = AlertEvent.query.one()
+    assert event.attempts == 2
+    assert event.delivered_at is not None
+    assert event.error is None
+
+
+def test_open_circuit_not_counted_as_attempt(app, video, engine, monkeypatch):
+    add_rule(kind='threshold', threshold=1000, channel='webhook', webhook_url='http://127.0.0.1:9/hook')
+    outcomes = [CircuitOpenError('熔断中'), CircuitOpenError('熔断中'), None]
+
+    def guarded_post(rule, event):
+        outcome = outcomes.pop(0)
+        if outcome is not None:
+            raise outcome
+
+    monkeypatch.setattr(AlertEngine, '_post', staticmethod(guarded_post))
+    add_sample(video.id, START, 500)
+    add_sample(video.id, START + HOUR, 1500)
+    engine.poll()
+    engine.deliver()
+
+    event = AlertEvent.query.one()
+    assert event.attempts == 0
+    assert event.delivered_at is None
+    assert engine.failed == 0
+
+    engine.deliver()
+    assert event.attempts == 1
+    assert event.delivered_at is not None
@@ -0,0 +1,218 @@
+"""
+分布式抓取队列: 两个工作进程共用同一个数据库时的领取、租约过期、退避重试和失败上限
+"""
+import threading
+import time
+
+from bilibrother_app.backend.crawl_queue import (
+    MAX_ATTEMPTS, RETRY_BASE_SECONDS, CrawlWorker, claim, complete, enqueue, queue_stats, release, renew
+)
+from bilibrother_app.backend.models import db, CrawlTask, Video
+from bilibrother_app.backend.records import VideoRecord
+
+OWNER_A = 'host-a-1'
+OWNER_B = 'host-b-2'
+
+
+def task(bvid):
+    db.session.expire_all()
+    return CrawlTask.query.filter_by(bvid=bvid).one()
+
+
+def make_available(bvids=None):
+    """跳过退避等待，模拟退避时间已到"""
+    query = CrawlTask.query.filter_by(status=CrawlTask.QUEUED)
+    if bvids:
+        query = query.filter(CrawlTask.bvid.in_(bvids))
+    query.update({'available_at': 0}, synchronize_session=False)
+    db.session.commit()
+
+
+def expire_leases(owner):
+    """模拟工作进程崩溃，租约已过期"""
+    CrawlTask.query.filter_by(lease_owner=owner).update(
+        {'lease_until': int(time.time()) - 1}, synchronize_session=False)
+    db.session.commit()
+
+
+def test_owners_never_claim_the_same_task(app):
+    assert enqueue([f'BV{index}' for index in range(30)]) == 30
+
+    first = claim(OWNER_A, limit=20)
+    second = claim(OWNER_B, limit=20)
+
+    assert len(first) == 20
+    assert len(second) == 10
+    assert not set(first) & set(second)
+    assert claim(OWNER_B, limit=20) == second
+    assert queue_stats()[CrawlTask.LEASED] == 30
+
+
+def test_concurrent_claims_never_share_a_task(app):
+    enqueue([f'BV{index}' for index in range(40)])
+    claimed = {}
+    errors = []
+
+    def drain(owner):
+        try:
+            with app.app_context():
+                claimed[owner] = claim(owner, limit=15)
+                db.session.remove()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=drain, args=(f'owner-{index}',)) for index in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    bvids = [bvid for owned in claimed.values() for bvid in owned]
+    assert len(bvids) == len(set(bvids)) == 40
+
+
+def test_expired_lease_is_reclaimed_by_other_owner(app):
+    enqueue(['BV1', 'BV2'])
+    claim(OWNER_A)
+    assert claim(OWNER_B) == []
+
+    expire_leases(OWNER_A)
+    assert queue_stats()['expired_leases'] == 2
+    assert sorted(claim(OWNER_B)) == ['BV1', 'BV2']
+    assert task('BV1').attempts == 2
+
+    # 原持有者恢复后不能续约，也不能覆盖新持有者的结果
+    assert renew(OWNER_A) == 0
+    complete(OWNER_A, ['BV1'], ['BV2'], '过期的结果')
+    assert task('BV1').status == CrawlTask.LEASED
+    assert task('BV2').lease_owner == OWNER_B
+    assert task('BV2').last_error is None
+
+    complete(OWNER_B, ['BV1', 'BV2'], [])
+    assert task('BV1').status == CrawlTask.DONE
+
+
+def test_renew_extends_only_own_leases(app):
+    enqueue(['BV1', 'BV2'])
+    claim(OWNER_A, limit=1)
+    claim(OWNER_B, limit=1)
+    expire_leases(OWNER_A)
+    expire_leases(OWNER_B)
+
+    assert renew(OWNER_A) == 1
+    # 续约后的任务不会被其他进程领取，未续约的过期任务可以重新领取
+    assert claim(OWNER_B) == ['BV2']
+    assert task('BV1').lease_owner == OWNER_A
+    assert task('BV1').lease_until > time.time()
+
+
+def test_failed_task_backs_off_exponentially(app):
+    enqueue(['BV1'])
+    before = int(time.time())
+    claim(OWNER_A)
+    complete(OWNER_A, [], ['BV1'], '请求被拒绝')
+
+    first = task('BV1')
+    assert first.status == CrawlTask.QUEUED
+    assert first.last_error == '请求被拒绝'
+    assert first.available_at >= before + RETRY_BASE_SECONDS
+    # 退避期间不能被任何进程领取
+    assert claim(OWNER_B) == []
+
+    make_available()
+    before = int(time.time())
+    assert claim(OWNER_B) == ['BV1']
+    complete(OWNER_B, [], ['BV1'], '请求被拒绝')
+    second = task('BV1')
+    assert second.attempts == 2
+    assert second.available_at >= before + 2 * RETRY_BASE_SECONDS
+
+
+def test_task_fails_after_max_attempts(app):
+    enqueue(['BV1'])
+    owners = (OWNER_A, OWNER_B)
+    for attempt in range(MAX_ATTEMPTS):
+        make_available()
+        owner = owners[attempt % 2]
+        assert claim(owner) == ['BV1']
+        complete(owner, [], ['BV1'], f'第{attempt + 1}次失败')
+
+    failed = task('BV1')
+    assert failed.status == CrawlTask.FAILED
+    assert failed.attempts == MAX_ATTEMPTS
+    assert failed.finished_at is not None
+    make_available()
+    assert claim(OWNER_A) == []
+
+    # 失败的任务可以重新入队，尝试次数清零
+    assert enqueue(['BV1']) == 1
+    assert task('BV1').attempts == 0
+    assert claim(OWNER_A) == ['BV1']
+
+
+def test_release_does_not_count_attempt(app):
+    enqueue(['BV1'])
+    claim(OWNER_A)
+    release(OWNER_A)
+
+    released = task('BV1')
+    assert released.status == CrawlTask.QUEUED
+    assert released.attempts == 0
+    assert claim(OWNER_B) == ['BV1']
+
+
+def test_enqueue_keeps_active_tasks(app):
+    enqueue(['BV1', 'BV2'])
+    claim(OWNER_A, limit=1)
+
+    assert enqueue(['BV1', 'BV2', 'BV3']) == 1
+    assert task('BV1').status == CrawlTask.LEASED
+
+
+class FakeCrawler:
+    """返回固定结果的爬虫，failing 中的视频抓取失败"""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+
+    def batch_process_videos(self, bvids, max_workers=2):
+        return [
+            VideoRecord(bvid=bvid, title=f'标题{bvid}', view_count=100, danmaku_count=0, coin_count=0,
+                        like_count=0, share_count=0, favorite_count=0, tname='动画', cover_url='', duration=60,
+                        pubdate=1600000000, follower_count=0, historical_likes=0, archive_count=0, mid='42',
+                        author_name='UP', fetched_at=0)
+            for bvid in bvids if bvid not in self.failing
+        ]
+
+
+def test_worker_saves_results_and_requeues_failures(app):
+    enqueue(['BV1', 'BV2'])
+    worker = CrawlWorker(app, FakeCrawler(failing={'BV2'}), batch_size=10)
+
+    assert worker.run_batch() == 2
+
+    assert [video.bvid for video in Video.query.all()] == ['BV1']
+    assert task('BV1').status == CrawlTask.DONE
+    assert task('BV2').status == CrawlTask.QUEUED
+    assert task('BV2').last_error == '抓取失败'
+    assert (worker.succeeded, worker.failed) == (1, 1)
+
+
+class BrokenCrawler:
+    def batch_process_videos(self, bvids, max_workers=2):
+        raise RuntimeError('抓取器异常')
+
+
+def test_worker_error_counts_attempt_and_backs_off(app):
+    enqueue(['BV1'])
+    worker = CrawlWorker(app, BrokenCrawler(), batch_size=10)
+
+    worker.run(once=True)
+
+    failed = task('BV1')
+    assert failed.status == CrawlTask.QUEUED
+    assert failed.attempts == 1
+    assert failed.available_at > time.time()
+    assert failed.last_error == '抓取器异常'
+    assert worker.failed == 1
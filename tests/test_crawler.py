@@ -0,0 +1,84 @@
+"""
+B站请求的重试和熔断: 风控拦截（412/-412）不重试但计入熔断器，限流和网关错误退避重试
+"""
+import pytest
+
+from bilibrother_app.backend import crawler as crawler_module
+from bilibrother_app.backend.crawler import BiliCrawler, RequestBlocked
+from bilibrother_app.backend.resilience import OPEN, CircuitOpenError, TransientError, Upstream
+
+URL = 'https://api.bilibili.com/x/web-interface/nav'
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, payload=None):
+        self.status_code = status_code
+        self.payload = payload if payload is not None else {'code': 0, 'data': {}}
+
+    def json(self):
+        return self.payload
+
+
+@pytest.fixture
+def crawler(monkeypatch):
+    """不等待退避、连续失败2次即熔断的爬虫，requests.get 按顺序返回 responses 中的响应"""
+    crawler = BiliCrawler()
+    crawler.upstream = Upstream('bilibili-test', attempts=3, base_delay=0, max_delay=0, failure_threshold=2)
+    crawler.responses = []
+    crawler.requests = 0
+
+    def fake_get(url, headers=None, params=None, timeout=None):
+        crawler.requests += 1
+        return crawler.responses.pop(0)
+
+    monkeypatch.setattr(crawler_module.requests, 'get', fake_get)
+    return crawler
+
+
+@pytest.mark.parametrize('response', [FakeResponse(412), FakeResponse(200, {'code': -412, 'message': '请求被拦截'})])
+def test_blocked_request_not_retried(crawler, response):
+    crawler.responses = [response, FakeResponse()]
+
+    with pytest.raises(RequestBlocked):
+        crawler._request_json(URL, paced=False)
+
+    assert crawler.requests == 1
+    assert crawler.upstream.breaker.failures == 1
+    assert crawler.upstream.retries == 0
+
+
+def test_blocked_requests_open_breaker(crawler):
+    crawler.responses = [FakeResponse(412), FakeResponse(412), FakeResponse()]
+
+    for _ in range(2):
+        with pytest.raises(RequestBlocked):
+            crawler._request_json(URL, paced=False)
+
+    assert crawler.upstream.breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        crawler._request_json(URL, paced=False)
+    assert crawler.requests == 2
+
+
+@pytest.mark.parametrize('response', [
+    FakeResponse(429), FakeResponse(503),
+    FakeResponse(200, {'code': -509, 'message': '请求过于频繁'}),
+    FakeResponse(200, {'code': -799, 'message': '请求过于频繁'}),
+])
+def test_transient_errors_retried(crawler, response):
+    crawler.upstream.breaker.failure_threshold = 5
+    crawler.responses = [response, FakeResponse()]
+
+    assert crawler._request_json(URL, paced=False) == {'code': 0, 'data': {}}
+    assert crawler.requests == 2
+    assert crawler.upstream.retries == 1
+
+
+def test_transient_errors_give_up_after_attempts(crawler):
+    crawler.upstream.breaker.failure_threshold = 5
+    crawler.responses = [FakeResponse(503)] * 3
+
+    with pytest.raises(TransientError) as error:
+        crawler._request_json(URL, paced=False)
+    assert not isinstance(error.value, RequestBlocked)
+    assert crawler.requests == 3
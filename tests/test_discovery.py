@@ -0,0 +1,80 @@
+"""
+新投稿发现: 新投稿超过一页时逐页读取到游标处，读取不完整时不推进游标
+"""
+from bilibrother_app.backend.discovery import discover_new_uploads
+from bilibrother_app.backend.models import db, UploadCursor, Video
+from bilibrother_app.backend.records import VideoRecord
+
+MID = '42'
+# 游标处投稿的发布时间
+START = 1700000000
+
+
+class FakeCrawler:
+    """按发布时间倒序返回 uploads 中的投稿，failing_pages 中的页码请求失败"""
+
+    def __init__(self, uploads, failing_pages=()):
+        self.uploads = sorted(uploads, key=lambda item: item['created'], reverse=True)
+        self.failing_pages = set(failing_pages)
+        self.pages = []
+
+    def get_user_uploads_page(self, mid, page=1, page_size=30):
+        self.pages.append(page)
+        if page in self.failing_pages:
+            return None
+        return self.uploads[(page - 1) * page_size:page * page_size], len(self.uploads)
+
+    def batch_process_videos(self, bvids, max_workers=2):
+        return [
+            VideoRecord(bvid=bvid, title=f'标题{bvid}', view_count=100, danmaku_count=0, coin_count=0,
+                        like_count=0, share_count=0, favorite_count=0, tname='动画', cover_url='', duration=60,
+                        pubdate=START, follower_count=0, historical_likes=0, archive_count=0, mid=MID,
+                        author_name='UP', fetched_at=0)
+            for bvid in bvids
+        ]
+
+
+def uploads(count, start=START):
+    """count 个依次晚于 start 的投稿"""
+    return [{'bvid': f'BV{aid}', 'aid': aid, 'created': start + aid} for aid in range(1, count + 1)]
+
+
+def set_cursor(last_pubdate, last_aid=0):
+    db.session.add(UploadCursor(mid=MID, last_pubdate=last_pubdate, last_aid=last_aid))
+    db.session.commit()
+
+
+def test_reads_pages_until_cursor(app):
+    set_cursor(START)
+    crawler = FakeCrawler(uploads(7) + [{'bvid': 'BVold', 'aid': 0, 'created': START - 10}])
+
+    result = discover_new_uploads(crawler, mids=[MID], page_size=3)
+
+    assert crawler.pages == [1, 2, 3]
+    assert sorted(result['added']) == sorted(f'BV{aid}' for aid in range(1, 8))
+    assert Video.query.filter_by(bvid='BVold').count() == 0
+    cursor = db.session.get(UploadCursor, MID)
+    assert (cursor.last_pubdate, cursor.last_aid) == (START + 7, 7)
+
+
+def test_cursor_kept_when_page_limit_reached(app):
+    set_cursor(START)
+    crawler = FakeCrawler(uploads(10))
+
+    result = discover_new_uploads(crawler, mids=[MID], page_size=3, max_pages=2)
+
+    assert crawler.pages == [1, 2]
+    assert len(result['added']) == 6
+    # 更早的新投稿还没有读到，游标停在原处
+    cursor = db.session.get(UploadCursor, MID)
+    assert (cursor.last_pubdate, cursor.last_aid) == (START, 0)
+
+
+def test_cursor_kept_when_page_request_fails(app):
+    set_cursor(START)
+    crawler = FakeCrawler(uploads(5), failing_pages={2})
+
+    discover_new_uploads(crawler, mids=[MID], page_size=3)
+
+    cursor = db.session.get(UploadCursor, MID)
+    assert (cursor.last_pubdate, cursor.last_aid) == (START, 0)
@@ -0,0 +1,55 @@
+"""
+提交通知: 会话事件只注册一次，提交采样后只通知当前应用登记的对象
+"""
+from sqlalchemy import text
+
+from bilibrother_app.backend.api import create_app
+from bilibrother_app.backend.live import notify_on_commit
+from bilibrother_app.backend.models import db, SAMPLES_WRITTEN
+
+
+class Recorder:
+    def __init__(self):
+        self.notified = 0
+
+    def notify(self):
+        self.notified += 1
+
+
+def commit_samples():
+    db.session.info[SAMPLES_WRITTEN] = True
+    db.session.commit()
+
+
+def test_listeners_not_accumulated_across_apps(app, tmp_path):
+    handlers = len(db.session().dispatch.after_commit)
+    for index in range(3):
+        create_app(str(tmp_path / f'other{index}.db'), start_background=False)
+    assert len(db.session().dispatch.after_commit) == handlers
+
+
+def test_commit_notifies_only_current_app(app, tmp_path):
+    other = create_app(str(tmp_path / 'other.db'), start_background=False)
+    recorder, other_recorder = Recorder(), Recorder()
+    notify_on_commit(app, recorder)
+    notify_on_commit(other, other_recorder)
+
+    commit_samples()
+    # 没有写入采样的提交不通知
+    db.session.commit()
+
+    assert recorder.notified == 1
+    assert other_recorder.notified == 0
+
+
+def test_rollback_clears_pending_notification(app):
+    recorder = Recorder()
+    notify_on_commit(app, recorder)
+
+    # 写入采样后事务回滚
+    db.session.execute(text('SELECT 1'))
+    db.session.info[SAMPLES_WRITTEN] = True
+    db.session.rollback()
+    db.session.commit()
+
+    assert recorder.notified == 0
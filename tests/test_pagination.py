@@ -0,0 +1,44 @@
+"""
+列表接口的分页参数: 页码和每页数量超出范围时收敛到有效值
+"""
+import pytest
+
+from bilibrother_app.backend.models import db, Author, Video
+
+
+@pytest.fixture
+def videos(app):
+    db.session.add_all([Video(bvid=f'BV{i}', title=f'测试视频{i}', link='', mid=str(i)) for i in range(3)])
+    db.session.add_all([Author(mid=str(i), name=f'UP主{i}') for i in range(3)])
+    db.session.commit()
+
+
+@pytest.mark.parametrize('page, per_page, expected', [
+    (1, 0, (1, 1, 1)),
+    (1, -5, (1, 1, 1)),
+    (0, 2, (1, 2, 2)),
+    (-3, 2, (1, 2, 2)),
+    (1, 1000, (1, 200, 3)),
+])
+def test_search_pagination_clamped(app, videos, page, per_page, expected):
+    response = app.test_client().get('/api/videos/search', query_string={
+        'q': '测试', 'page': page, 'per_page': per_page})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['total'] == 3
+    assert (body['page'], body['per_page'], len(body['videos'])) == expected
+
+
+@pytest.mark.parametrize('page, per_page, expected', [
+    (1, 0, (1, 1, 1)),
+    (1, -5, (1, 1, 1)),
+    (0, 2, (1, 2, 2)),
+    (-3, 2, (1, 2, 2)),
+    (1, 1000, (1, 500, 3)),
+])
+def test_authors_pagination_clamped(app, videos, page, per_page, expected):
+    response = app.test_client().get('/api/authors', query_string={'page': page, 'per_page': per_page})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['total'] == 3
+    assert (body['page'], body['per_page'], len(body['authors'])) == expected
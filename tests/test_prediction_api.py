@@ -0,0 +1,14 @@
+"""
+预测接口的参数校验
+"""
+
+
+def test_unknown_source_rejected(app):
+    client = app.test_client()
+
+    response = client.get('/api/predict/BV1', query_string={'source': 'remote'})
+    assert response.status_code == 400
+    assert 'remote' in response.get_json()['error']
+
+    response = client.post('/api/predict/jobs', json={'bvid': 'BV1', 'source': 'remote'})
+    assert response.status_code == 400
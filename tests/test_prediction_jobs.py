@@ -0,0 +1,217 @@
+"""
+预测任务队列: 两个进程的工作线程池共用同一个数据库时的领取、租约和重试
+"""
+import threading
+import time
+from datetime import datetime
+
+import pytest
+import requests
+
+from bilibrother_app.backend import prediction_jobs
+from bilibrother_app.backend.models import db, PredictionJob
+from bilibrother_app.backend.prediction_jobs import MAX_ATTEMPTS, PredictionWorkerPool, submit_job
+
+
+def make_pool(app, max_running=2, calls=None):
+    """不启动线程的工作线程池，执行的预测记录在 calls 中"""
+    calls = calls if calls is not None else []
+
+    def run_prediction(bvid, source):
+        calls.append((bvid, source))
+        return {'bvid': bvid, 'source': source, 'predicted_play_count': 1000}
+
+    return PredictionWorkerPool(app, run_prediction, workers=0, max_running=max_running)
+
+
+def expire_lease(job_id):
+    """模拟领取任务的进程崩溃，租约已过期"""
+    PredictionJob.query.filter_by(id=job_id).update({'lease_until': int(time.time()) - 1})
+    db.session.commit()
+
+
+@pytest.fixture
+def pools(app):
+    return make_pool(app), make_pool(app)
+
+
+def test_claim_is_atomic_across_pools(app, pools):
+    first, second = pools
+    job_ids = {submit_job(f'BV{index}', 'viewsight').id for index in range(2)}
+
+    claimed = [first.claim(), second.claim()]
+
+    assert {job_id for job_id, _ in claimed} == job_ids
+    assert claimed[0][1] != claimed[1][1]
+    jobs = PredictionJob.query.all()
+    assert {job.status for job in jobs} == {PredictionJob.RUNNING}
+    assert {job.attempts for job in jobs} == {1}
+
+
+def test_global_running_cap(app, pools):
+    first, second = pools
+    for index in range(3):
+        submit_job(f'BV{index}', 'viewsight')
+
+    assert first.claim() is not None
+    assert second.claim() is not None
+    # 两个进程合计已有 max_running 个运行中任务
+    assert first.claim() is None
+    assert second.claim() is None
+    assert PredictionJob.query.filter_by(status=PredictionJob.QUEUED).count() == 1
+
+
+def test_expired_lease_is_reclaimed(app, pools):
+    first, second = pools
+    job_id = submit_job('BV1', 'viewsight').id
+    first.claim()
+    assert second.claim() is None
+
+    expire_lease(job_id)
+    reclaimed_id, worker = second.claim()
+
+    assert reclaimed_id == job_id
+    job = db.session.get(PredictionJob, job_id)
+    assert job.worker == worker
+    assert job.attempts == 2
+
+
+def test_expired_lease_does_not_count_toward_cap(app):
+    pool = make_pool(app, max_running=1)
+    stuck_id = submit_job('BV1', 'viewsight').id
+    pool.claim()
+    submit_job('BV2', 'viewsight')
+    assert pool.claim() is None
+
+    expire_lease(stuck_id)
+    # 过期的任务不再占用名额，按id顺序先重新领取它
+    assert pool.claim()[0] == stuck_id
+
+
+def test_job_fails_after_max_attempts(app):
+    calls = []
+    pool = make_pool(app, calls=calls)
+    job_id = submit_job('BV1', 'viewsight').id
+    PredictionJob.query.filter_by(id=job_id).update({'attempts': MAX_ATTEMPTS})
+    db.session.commit()
+
+    claimed = pool.claim()
+    pool.execute(*claimed)
+
+    job = db.session.get(PredictionJob, job_id)
+    assert job.status == PredictionJob.FAILED
+    assert job.attempts == MAX_ATTEMPTS + 1
+    assert calls == []
+
+
+def test_finish_ignored_after_lease_stolen(app, pools):
+    first, second = pools
+    job_id = submit_job('BV1', 'viewsight').id
+    _, stale_worker = first.claim()
+    expire_lease(job_id)
+    _, worker = second.claim()
+
+    assert not first._finish(job_id, stale_worker, PredictionJob.FAILED, error='进程已失去租约')
+    job = db.session.get(PredictionJob, job_id)
+    assert job.status == PredictionJob.RUNNING
+    assert job.error is None
+
+    assert second._finish(job_id, worker, PredictionJob.DONE, result={'predicted_play_count': 1})
+    db.session.expire_all()
+    assert db.session.get(PredictionJob, job_id).status == PredictionJob.DONE
+
+
+def test_execute_stores_result(app):
+    calls = []
+    pool = make_pool(app, calls=calls)
+    job_id = submit_job('BV1', 'viewsight').id
+
+    pool.execute(*pool.claim())
+
+    job = db.session.get(PredictionJob, job_id)
+    assert job.status == PredictionJob.DONE
+    assert job.to_dict()['result']['predicted_play_count'] == 1000
+    assert calls == [('BV1', 'viewsight')]
+
+
+def test_callback_not_resent_after_read_timeout(app, monkeypatch):
+    posts = []
+
+    def timing_out_post(url, json=None, timeout=None):
+        posts.append(json['id'])
+        raise requests.exceptions.ReadTimeout('读取超时')
+
+    monkeypatch.setattr(prediction_jobs.requests, 'post', timing_out_post)
+    pool = make_pool(app)
+    job_id = submit_job('BV1', 'viewsight', callback_url='http://127.0.0.1:9/callback').id
+
+    pool.execute(*pool.claim())
+
+    # 接收方可能已经处理了这次回调，不能重复发送
+    assert posts == [job_id]
+    assert db.session.get(PredictionJob, job_id).status == PredictionJob.DONE
+
+
+def test_submit_reuses_active_and_recent_jobs_per_source(app):
+    queued = submit_job('BV1', 'viewsight')
+    assert submit_job('BV1', 'viewsight').id == queued.id
+
+    # 不同来源各自排队
+    auto = submit_job('BV1', 'auto')
+    assert auto.id != queued.id
+
+    PredictionJob.query.filter_by(id=queued.id).update({
+        'status': PredictionJob.DONE, 'result': '{}', 'finished_at': datetime.now()
+    })
+    db.session.commit()
+    assert submit_job('BV1', 'viewsight').id == queued.id
+    assert submit_job('BV1', 'auto').id == auto.id
+    assert submit_job('BV1', 'viewsight', force=True).id not in (queued.id, auto.id)
+
+
+def test_submit_race_returns_existing_job(app, monkeypatch):
+    existing = submit_job('BV1', 'viewsight')
+    real_active_job = prediction_jobs._active_job
+    lookups = []
+
+    def racing_active_job(bvid, source):
+        # 第一次查询时另一个进程尚未提交，插入时撞上唯一索引
+        lookups.append((bvid, source))
+        return None if len(lookups) == 1 else real_active_job(bvid, source)
+
+    monkeypatch.setattr(prediction_jobs, '_active_job', racing_active_job)
+    job = submit_job('BV1', 'viewsight')
+
+    assert job.id == existing.id
+    assert len(lookups) == 2
+    assert PredictionJob.query.count() == 1
+
+
+def test_concurrent_claims_never_share_a_job(app):
+    pools = [make_pool(app, max_running=100) for _ in range(2)]
+    for index in range(20):
+        submit_job(f'BV{index}', 'viewsight')
+    claimed = []
+    errors = []
+
+    def drain(pool):
+        try:
+            with app.app_context():
+                while True:
+                    result = pool.claim()
+                    if result is None:
+                        break
+                    claimed.append(result[0])
+                db.session.remove()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=drain, args=(pools[index % 2],)) for index in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert sorted(claimed) == sorted(set(claimed))
+    assert len(claimed) == 20
@@ -0,0 +1,144 @@
+"""
+刷新写入: 没有变化的抓取结果不写 video/author 表和计数采样，只记录抓取时间；刷新接口的过期阈值参数
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from bilibrother_app.backend.analytics import data_fingerprint
+from bilibrother_app.backend.crawler import BiliCrawler
+from bilibrother_app.backend.models import (
+    db, Video, Author, StatSample, VideoCheck, AuthorCheck, VideoChange, save_video_results, save_video_stats
+)
+from bilibrother_app.backend.records import VideoRecord, StatRecord
+from bilibrother_app.backend.staleness import stale_condition
+from bilibrother_app.backend.trending import compute_trending
+
+
+def make_record(bvid, view_count=100, follower_count=10, title=None):
+    return VideoRecord(
+        bvid=bvid, title=title or f'标题{bvid}', view_count=view_count, danmaku_count=0, coin_count=0,
+        like_count=5, share_count=0, favorite_count=0, tname='动画', cover_url='', duration=60,
+        pubdate=1600000000, follower_count=follower_count, historical_likes=0, archive_count=1,
+        mid='42', author_name='UP', fetched_at=0
+    )
+
+
+def make_stat(bvid, view_count):
+    return StatRecord(bvid=bvid, view_count=view_count, danmaku_count=0, coin_count=0, like_count=5,
+                      share_count=0, favorite_count=0, fetched_at=0)
+
+
+def test_unchanged_refresh_writes_only_check_time(app):
+    first = datetime(2026, 1, 1, 12, 0, 0)
+    save_video_results([make_record('BV1'), make_record('BV2')], first)
+    db.session.commit()
+    fingerprint = data_fingerprint()
+
+    second = first + timedelta(hours=2)
+    save_video_results([make_record('BV1'), make_record('BV2')], second)
+    db.session.commit()
+
+    assert data_fingerprint() == fingerprint
+    assert StatSample.query.count() == 2
+    assert {video.last_updated for video in Video.query.all()} == {first}
+    assert db.session.get(Author, '42').updated_at == first
+    assert {check.checked_at for check in VideoCheck.query.all()} == {second}
+    assert {check.meta_checked_at for check in VideoCheck.query.all()} == {second}
+    assert db.session.get(AuthorCheck, '42').checked_at == second
+
+
+def test_changed_counters_write_sample_and_change(app):
+    first = datetime(2026, 1, 1, 12, 0, 0)
+    save_video_results([make_record('BV1'), make_record('BV2')], first)
+    db.session.commit()
+
+    second = first + timedelta(hours=1)
+    save_video_stats([make_stat('BV1', 150), make_stat('BV2', 100)], second)
+    db.session.commit()
+
+    assert StatSample.query.count() == 3
+    assert Video.query.filter_by(bvid='BV1').one().last_updated == second
+    assert Video.query.filter_by(bvid='BV2').one().last_updated == first
+    # 计数刷新不更新元数据的抓取时间
+    assert {check.meta_checked_at for check in VideoCheck.query.all()} == {first}
+    assert {check.checked_at for check in VideoCheck.query.all()} == {second}
+    assert VideoChange.query.count() == 3
+
+
+def test_author_updated_only_on_change(app):
+    first = datetime(2026, 1, 1, 12, 0, 0)
+    save_video_results([make_record('BV1')], first)
+    db.session.commit()
+
+    second = first + timedelta(days=1)
+    save_video_results([make_record('BV1', follower_count=11)], second)
+    db.session.commit()
+
+    assert db.session.get(Author, '42').updated_at == second
+    assert db.session.get(Author, '42').follower_count == 11
+
+
+def test_stale_condition_uses_check_time(app):
+    first = datetime(2026, 1, 1, 12, 0, 0)
+    save_video_results([make_record('BV1')], first)
+    db.session.commit()
+    save_video_results([make_record('BV1')], first + timedelta(hours=2))
+    db.session.commit()
+
+    now = first + timedelta(hours=2, minutes=30)
+    stale = db.session.query(Video.bvid).filter(stale_condition(3600, now=now)).all()
+    assert stale == []
+    stale = db.session.query(Video.bvid).filter(stale_condition(3600, now=now + timedelta(hours=1))).all()
+    assert [row.bvid for row in stale] == ['BV1']
+
+
+def test_trending_treats_missing_sample_as_no_change():
+    day = 24 * 3600
+    now = 10 * day
+    # 视频1 三天前增长后没有变化，视频2 最近一小时仍在增长
+    video_ids = np.array([1, 1, 2, 2], dtype=np.int64)
+    ts = np.array([now - 4 * day, now - 3 * day, now - 2 * day, now - 1800], dtype=np.int64)
+    views = np.array([100, 500, 100, 300], dtype=np.int64)
+    likes = np.zeros(4, dtype=np.int64)
+
+    metrics = compute_trending(video_ids, ts, views, likes, now=now)
+    assert metrics['view_delta_24h'].tolist() == [0, 200]
+    assert metrics['view_delta_7d'].tolist() == [400, 200]
+    assert metrics['view_rate_24h'][0] == 0
+
+
+def test_added_videos_record_changes(app, monkeypatch):
+    monkeypatch.setattr(BiliCrawler, 'process_video', lambda self, bvid: make_record(bvid))
+    monkeypatch.setattr(BiliCrawler, 'batch_process_videos',
+                        lambda self, bvids, *args, **kwargs: [make_record(bvid) for bvid in bvids])
+    client = app.test_client()
+
+    assert client.post('/api/videos', json={'bvid': 'BV1'}).status_code == 201
+    assert client.post('/api/videos/bulk', json={'bvids': ['BV1', 'BV2', 'BV3']}).status_code == 201
+
+    changes = {change.video_id: change.fields for change in VideoChange.query.all()}
+    video_ids = [video.id for video in Video.query.order_by(Video.id).all()]
+    assert sorted(changes) == video_ids
+    assert set(changes.values()) == {VideoChange.ALL_FIELDS}
+    assert VideoCheck.query.count() == 3
+    assert StatSample.query.count() == 3
+
+
+def test_refresh_stale_after_zero_and_negative(app):
+    save_video_results([make_record('BV1')], datetime.now() - timedelta(minutes=1))
+    db.session.commit()
+    client = app.test_client()
+
+    # 默认阈值内的视频被跳过
+    response = client.post('/api/videos/refresh', json={'only_stale': True, 'queue': True})
+    assert response.status_code == 200
+    assert response.get_json()['skipped'] == 1
+
+    # 显式的0表示全部视为过期
+    response = client.post('/api/videos/refresh', json={'only_stale': True, 'stale_after': 0, 'queue': True})
+    assert response.status_code == 202
+    assert response.get_json()['queued'] == 1
+
+    response = client.post('/api/videos/refresh', json={'only_stale': True, 'stale_after': -1})
+    assert response.status_code == 400
@@ -0,0 +1,58 @@
+"""
+熔断器: 半开状态下只有上游确实返回了响应才恢复，截止时间和解析失败不计入成功
+"""
+import time
+
+import pytest
+import requests
+
+from bilibrother_app.backend.resilience import (
+    CLOSED, HALF_OPEN, OPEN, CircuitOpenError, DeadlineExceeded, Upstream
+)
+
+
+@pytest.fixture
+def upstream():
+    """已熔断且到了试探时间的上游"""
+    upstream = Upstream('test-upstream', attempts=1, base_delay=0, failure_threshold=1, reset_timeout=0.01)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        upstream.call(raising(requests.exceptions.ConnectionError('拒绝连接')))
+    assert upstream.breaker.state == OPEN
+    time.sleep(0.02)
+    return upstream
+
+
+def raising(error):
+    def send(timeout):
+        raise error
+    return send
+
+
+@pytest.mark.parametrize('error', [DeadlineExceeded('请求已超过截止时间'), ValueError('不是JSON')])
+def test_trial_without_response_keeps_breaker_half_open(upstream, error):
+    with pytest.raises(type(error)):
+        upstream.call(raising(error))
+
+    assert upstream.breaker.stats()['state'] == HALF_OPEN
+    # 试探名额已释放，下一次调用仍可以试探
+    assert upstream.call(lambda timeout: 'ok') == 'ok'
+    assert upstream.breaker.state == CLOSED
+
+
+def test_client_error_response_closes_breaker(upstream):
+    response = requests.Response()
+    response.status_code = 404
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        upstream.call(raising(requests.exceptions.HTTPError('404', response=response)))
+
+    assert upstream.breaker.state == CLOSED
+
+
+def test_open_breaker_rejects_calls():
+    upstream = Upstream('test-open', attempts=1, failure_threshold=1, reset_timeout=60)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        upstream.call(raising(requests.exceptions.ConnectionError('拒绝连接')))
+
+    with pytest.raises(CircuitOpenError):
+        upstream.call(lambda timeout: 'ok')
@@ -0,0 +1,25 @@
+"""
+共享缓存的单飞计算: 计算超过等待时间时计算锁仍然有效
+"""
+import time
+
+from bilibrother_app.backend.shared_cache import SharedCache
+
+WAIT = 0.05
+
+
+def test_compute_lock_outlives_wait(tmp_path):
+    cache = SharedCache(str(tmp_path / 'cache.db'))
+    held = []
+
+    def slow_compute():
+        time.sleep(WAIT * 3)
+        # 计算时间超过了等待时间，锁仍然有效，其他请求继续等待而不是开始重复计算
+        held.append(cache.get('k#computing') is not None)
+        return 'value'
+
+    assert cache.get_or_compute('k', slow_compute, wait=WAIT) == 'value'
+    assert held == [True]
+    assert cache.get('k#computing') is None
+    assert cache.get('k') == 'value'
+